@@ -13,9 +13,80 @@ DATA_REPOSITORY = PROJECT_ROOT / "01_data_repository"
 
 # 数据文件
 TEMPLATES_FILE = BACKEND_DIR / "data" / "templates.json"
+SCREENING_RULES_FILE = BACKEND_DIR / "data" / "screening_rules.json"
 PATIENT_RECORDS_DIR = PROJECT_ROOT / "patient_records"  # 所有输出都在这里
 MATCHING_REPORT_FILE = PATIENT_RECORDS_DIR / "matching_report.csv"
 PROCESSED_FILES_FILE = PATIENT_RECORDS_DIR / "processed_files.json"
+COHORT_DB_FILE = PATIENT_RECORDS_DIR / "cohort.sqlite"  # 跨患者查询用的队列数据库
+
+# 队列分析产物（子目录，不会被当作患者 JSON 读取）
+ANALYTICS_DIR = PATIENT_RECORDS_DIR / "analytics"
+SCREENING_FILE = ANALYTICS_DIR / "screening.json"
+BATTERY_FORECAST_FILE = ANALYTICS_DIR / "battery_forecast.json"
+
+# 电池耗竭预测：电压降到 BATTERY_ERI_VOLTAGE 视为到达择期更换（各厂家不同，这里取通用值）
+# 电压回归至少需要 BATTERY_MIN_VISITS 次随访、跨度 BATTERY_MIN_SPAN_YEARS 年；超过 BATTERY_MAX_YEARS 年的外推视为无法预测
+BATTERY_ERI_VOLTAGE = 2.6
+BATTERY_MIN_VISITS = 2
+BATTERY_MIN_SPAN_YEARS = 0.5
+BATTERY_MAX_YEARS = 20
+
+# 缓存目录（隐藏子目录，不会被当作患者 JSON 读取）
+CACHE_DIR = PATIENT_RECORDS_DIR / ".cache"
+EXTRACT_CACHE_FILE = CACHE_DIR / "extract_cache.sqlite"
+EXTRACTION_PLANS_FILE = CACHE_DIR / "extraction_plans.json"
+
+# 提取逻辑版本：提取规则变化时递增，使旧的提取缓存失效
+EXTRACTOR_VERSION = "1"
+
+# 提取记录中已知的测量字段在 ETL 阶段解析为带单位的数值（记录的 normalized 区域），原始字符串保持不变
+NORMALIZE_VALUES = True
+
+# 流式处理（--stream）时提取按批进行：每批查询缓存、并行解析后依次产出记录，内存中只保留一批的结果
+EXTRACT_BATCH_SIZE = 200
+
+# 患者 JSON 输出：compact 为 True 时不缩进（文件更小）；写文件的线程数
+PATIENT_JSON_COMPACT = False
+WRITE_WORKERS = 4
+
+# 序列化：JSON_BACKEND 为 auto 时安装了 orjson 就使用 orjson（更快，输出同为标准 JSON），json 强制使用标准库
+# 提取缓存的存储格式：json（文本）或 binary（压缩的二进制记录：安装 msgpack/zstandard 时为 MessagePack + zstd，否则为 JSON + zlib）
+JSON_BACKEND = "auto"
+EXTRACT_CACHE_FORMAT = "binary"
+
+# 患者文件写出时同步更新队列数据库
+WRITE_COHORT_DB = True
+
+# 流式分组：内存中待分组记录的序列化大小超过预算（字节）时排序后溢写到临时文件
+GROUPING_MEMORY_BUDGET = 256 * 1024 * 1024
+SPILL_DIR = CACHE_DIR / "spill"
+
+# 提取计划：同模板的同一版式出现 PLAN_MIN_SAMPLES 次后按坐标提取；每个模板最多保留的版式候选数
+PLAN_MIN_SAMPLES = 3
+PLAN_CANDIDATES = 4
+
+# 文件哈希：md5（兼容旧索引）、blake2b，或安装 xxhash 后可用更快的 xxh3
+HASH_ALGORITHM = "md5"
+HASH_WORKERS = 8  # 并发计算哈希的线程数
+SCAN_WORKERS = 8  # 并行遍历目录的线程数
+
+# 匹配报告 CSV 只是供人工查看的产物，流水线内部使用内存中的扫描清单
+WRITE_MATCHING_REPORT = True
+
+# 监视模式（main.py --watch）：最后一次文件变化后静默 WATCH_DEBOUNCE 秒再处理，持续变化时最多等待 WATCH_MAX_DELAY 秒；
+# 没有 inotify 时每 WATCH_POLL_INTERVAL 秒按 stat 签名轮询
+WATCH_DEBOUNCE = 2.0
+WATCH_MAX_DELAY = 30.0
+WATCH_POLL_INTERVAL = 3.0
+
+# 本地 HTTP 接口（main.py --serve）：默认只监听本机，病区内共享时用 --host 0.0.0.0（仅限可信内网）
+# 患者文件/静态资源的 LRU 条目数；/patients 每页默认与最大条数；小于 API_GZIP_MIN_BYTES 的响应不压缩
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+API_CACHE_ENTRIES = 512
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+API_GZIP_MIN_BYTES = 1024
 
 # 关键字定义
 KW_BASIC = "基本工作参数"
@@ -3,15 +3,16 @@ Pacemaker Dashboard Backend - Core Module
 """
 
 from .handlers import XlsHandler, XlsxHandler, get_handler
-from .extractors import process_file
+from .extractors import process_file, extract_file, extract_file_planned, build_record
 from .utils import clean_value, clean_label, is_ignored
+from .normalize import normalize_record
 from .grouping import process_and_split_records
 from .file_tracker import build_file_index, get_file_hash
 
 __all__ = [
     'XlsHandler', 'XlsxHandler', 'get_handler',
-    'process_file',
-    'clean_value', 'clean_label', 'is_ignored',
+    'process_file', 'extract_file', 'extract_file_planned', 'build_record',
+    'clean_value', 'clean_label', 'is_ignored', 'normalize_record',
     'process_and_split_records',
     'build_file_index', 'get_file_hash'
 ]
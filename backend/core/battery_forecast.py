@@ -0,0 +1,186 @@
+"""
+电池耗竭预测模块
+从队列数据库载入全部随访的电池电压与预估寿命，一次性为所有患者拟合电压随时间的下降斜率，
+外推到达择期更换电压（ERI）的日期，并给出置信度
+
+预测方法（按优先级）：
+    reached: 最近一次电压已不高于 ERI 电压，日期取首次达到的随访
+    voltage_trend: 电压回归斜率为负，置信度由斜率的相对标准误决定
+    device_estimate: 回归不可用或置信度偏低时，取最近一次随访日期 + 设备给出的预估寿命
+结果写入 analytics/battery_forecast.json（面板加载）和队列数据库 battery_forecast 表（SQL 查询）
+"""
+
+import os
+import json
+import time
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from config import (
+    COHORT_DB_FILE, BATTERY_FORECAST_FILE, BATTERY_ERI_VOLTAGE, BATTERY_MIN_VISITS,
+    BATTERY_MIN_SPAN_YEARS, BATTERY_MAX_YEARS
+)
+from core.cohort_arrays import DAYS_PER_YEAR, load_cohort_arrays, last_per_patient, group_linear_fit
+
+# 只有两次随访时无法估计误差，给一个较低的固定置信度；设备预估寿命的置信度
+TWO_POINT_CONFIDENCE = 0.3
+DEVICE_CONFIDENCE = 0.4
+
+CONFIDENCE_LEVELS = [(0.7, "高"), (0.4, "中"), (0.0, "低")]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS battery_forecast (
+    reg_id TEXT PRIMARY KEY,
+    method TEXT NOT NULL,
+    eri_date TEXT NOT NULL,
+    years_to_eri REAL NOT NULL,
+    confidence REAL NOT NULL,
+    slope REAL,
+    latest_voltage REAL,
+    visit_count INTEGER NOT NULL,
+    computed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_forecast_eri ON battery_forecast (eri_date);
+"""
+
+
+def _years_to_dates(years):
+    """距 1970 年的年数 -> ISO 日期字符串列表"""
+    days = np.round(years * DAYS_PER_YEAR).astype("int64").astype("datetime64[D]")
+    return [str(d) for d in days]
+
+
+def forecast_cohort(arrays, eri_voltage=BATTERY_ERI_VOLTAGE):
+    """
+    批量预测全部患者的 ERI 日期
+    返回 {登记号: {"method", "eri_date", "years_to_eri", "confidence", "level", "slope", "latest_voltage", "visits"}}
+    """
+    count = arrays.patient_count
+    voltage = arrays.fields["battery_voltage"]
+    life = arrays.fields["battery_life"]
+    years = arrays.years
+
+    # 电压回归：只用日期与电压都已知的随访
+    rows = np.flatnonzero(~np.isnan(voltage) & ~np.isnan(years))
+    groups = arrays.pid[rows]
+    slope, intercept, n, slope_se = group_linear_fit(groups, years[rows], voltage[rows], count)
+    first_year = np.full(count, np.inf)
+    last_year = np.full(count, -np.inf)
+    np.minimum.at(first_year, groups, years[rows])
+    np.maximum.at(last_year, groups, years[rows])
+
+    latest_patients, latest_rows = last_per_patient(arrays.pid, rows)
+    latest_voltage = np.full(count, np.nan)
+    latest_voltage[latest_patients] = voltage[latest_rows]
+    base_year = np.full(count, np.nan)  # 以最近一次有电压的随访为起点
+    base_year[latest_patients] = years[latest_rows]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trend_year = (eri_voltage - intercept) / slope
+        trend_conf = np.where(n > 2, np.clip(1 - slope_se / np.abs(slope), 0.05, 0.95), TWO_POINT_CONFIDENCE)
+    trend_ok = (
+        (n >= BATTERY_MIN_VISITS) & (slope < 0) & (last_year - first_year >= BATTERY_MIN_SPAN_YEARS)
+        & (trend_year - base_year <= BATTERY_MAX_YEARS)
+    )
+    # 回归直线可能在最近一次随访之前就已穿过 ERI 电压（而实测仍高于 ERI），此时按最近一次随访处理
+    trend_year = np.maximum(trend_year, base_year)
+
+    # 已到达 ERI：首次不高于 ERI 电压的随访
+    reached_rows = rows[voltage[rows] <= eri_voltage]
+    reached_patients = arrays.pid[reached_rows]
+    is_first = np.r_[True, reached_patients[1:] != reached_patients[:-1]] if len(reached_rows) else np.empty(0, bool)
+    reached_year = np.full(count, np.nan)
+    reached_year[reached_patients[is_first]] = years[reached_rows[is_first]]
+    reached = latest_voltage <= eri_voltage
+
+    # 设备预估寿命：最近一次有寿命值且日期已知的随访
+    life_patients, life_rows = last_per_patient(arrays.pid, np.flatnonzero(~np.isnan(life) & ~np.isnan(years)))
+    device_base = np.full(count, np.nan)
+    device_base[life_patients] = years[life_rows]
+    device_year = np.full(count, np.nan)
+    device_year[life_patients] = years[life_rows] + life[life_rows]
+
+    use_trend = ~reached & trend_ok & ((trend_conf >= DEVICE_CONFIDENCE) | np.isnan(device_year))
+    use_device = ~reached & ~use_trend & ~np.isnan(device_year)
+
+    eri_year = np.select([reached, use_trend, use_device], [reached_year, trend_year, device_year], np.nan)
+    confidence = np.select([reached, use_trend, use_device], [1.0, trend_conf, DEVICE_CONFIDENCE], np.nan)
+    method = np.select([reached, use_trend, use_device], ["reached", "voltage_trend", "device_estimate"], "")
+    start_year = np.where(np.isnan(base_year), device_base, base_year)
+    years_to_eri = np.maximum(eri_year - start_year, 0.0)
+
+    result = {}
+    patients = np.flatnonzero(method != "")
+    dates = _years_to_dates(eri_year[patients])
+    for i, patient in enumerate(patients.tolist()):
+        level = next(name for bound, name in CONFIDENCE_LEVELS if confidence[patient] >= bound)
+        result[arrays.reg_ids[patient]] = {
+            "method": str(method[patient]),
+            "eri_date": dates[i],
+            "years_to_eri": round(float(years_to_eri[patient]), 2),
+            "confidence": round(float(confidence[patient]), 2),
+            "level": level,
+            "slope": None if np.isnan(slope[patient]) else round(float(slope[patient]), 4),
+            "latest_voltage": None if np.isnan(latest_voltage[patient]) else float(latest_voltage[patient]),
+            "visits": int(n[patient]),
+        }
+    return result
+
+
+def save_forecast_table(forecast, computed_at, db_path=COHORT_DB_FILE):
+    """整体替换队列数据库中的 battery_forecast 表"""
+    conn = sqlite3.connect(str(db_path))
+    try:
+        conn.executescript(SCHEMA)
+        with conn:
+            conn.execute("DELETE FROM battery_forecast")
+            conn.executemany(
+                "INSERT INTO battery_forecast VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (reg_id, f["method"], f["eri_date"], f["years_to_eri"], f["confidence"],
+                     f["slope"], f["latest_voltage"], f["visits"], computed_at)
+                    for reg_id, f in forecast.items()
+                ],
+            )
+    finally:
+        conn.close()
+
+
+def run_battery_forecast(db_path=COHORT_DB_FILE, output=BATTERY_FORECAST_FILE):
+    """读取队列数据库，批量预测并写出结果"""
+    start = time.perf_counter()
+    arrays = load_cohort_arrays(["battery_voltage", "battery_life"], db_path)
+    loaded = time.perf_counter()
+    forecast = forecast_cohort(arrays)
+    fitted = time.perf_counter()
+
+    print(f"载入 {arrays.patient_count} 位患者的 {arrays.visit_count} 次随访，用时 {loaded - start:.2f} 秒")
+    print(f"批量拟合电池电压趋势，用时 {(fitted - loaded) * 1000:.1f} 毫秒")
+    methods = {}
+    for f in forecast.values():
+        methods[f["method"]] = methods.get(f["method"], 0) + 1
+    print(f"可预测 {len(forecast)} 位患者："
+          f"已到达 ERI {methods.get('reached', 0)}，电压趋势 {methods.get('voltage_trend', 0)}，"
+          f"设备预估 {methods.get('device_estimate', 0)}")
+
+    computed_at = datetime.now().isoformat(timespec="seconds")
+    save_forecast_table(forecast, computed_at, db_path)
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "generated_at": computed_at,
+        "eri_voltage": BATTERY_ERI_VOLTAGE,
+        "patients": forecast,
+    }
+    tmp_path = output.with_name(f".{output.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output)
+    print(f"预测结果已保存至: {output}（队列数据库 battery_forecast 表同步更新）")
+    return payload
@@ -0,0 +1,124 @@
+"""
+单元格索引模块
+对工作表做一次遍历，建立锚点、标签位置、非空行和蓝色单元格索引，
+供各区域提取器按范围查询，避免重复扫描
+"""
+
+import sys
+from bisect import bisect_left
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import KW_BASIC, KW_ANTITACHY, KW_TEST, KW_EVENT
+from core.utils import clean_label
+
+ANCHOR_KEYWORDS = [("basic", KW_BASIC), ("antitachy", KW_ANTITACHY), ("test", KW_TEST), ("event", KW_EVENT)]
+ANCHOR_COLS = 5  # 锚点关键字只在前 5 列查找
+AT_AF_KEYWORD = "AT/AF事件"
+
+
+class SheetIndex:
+    """工作表单次遍历索引"""
+
+    def __init__(self, handler):
+        self.nrows = handler.nrows
+        self.ncols = handler.ncols
+        self.keyword_rows = {key: [] for key, _ in ANCHOR_KEYWORDS}  # 锚点 -> 出现行（按行序）
+        self.at_af_row = None  # 备选：首个 AT/AF事件行
+        self.labels = {}  # 标签文本 -> [(r, c), ...]（按行优先顺序）
+        self.row_cells = []  # 每行的非空单元格 [(c, 清理后的值), ...]
+        self.row_nonempty = bytearray(self.nrows)  # 每行是否有数据
+        self.blue_cells = []  # 蓝色单元格 [(r, c), ...]（按行优先顺序）
+        self._containing = {}
+
+        grid = handler.grid
+        for r in range(self.nrows):
+            if grid is not None:
+                raw_row, clean_row, blue_row = grid.values[r], grid.cleaned[r], grid.blue[r]
+            else:
+                raw_row = [handler.get_cell_value(r, c) for c in range(self.ncols)]
+                clean_row = [handler.get_clean_value(r, c) for c in range(self.ncols)]
+                blue_row = [handler.is_blue_cell(r, c) for c in range(self.ncols)]
+
+            cells = []
+            for c in range(self.ncols):
+                raw = raw_row[c]
+                label = clean_label(raw)
+                if label:
+                    self.labels.setdefault(label, []).append((r, c))
+                    if c < ANCHOR_COLS:
+                        self._add_anchor(r, label)
+                if clean_row[c]:
+                    cells.append((c, clean_row[c]))
+                if blue_row[c]:
+                    self.blue_cells.append((r, c))
+            self.row_cells.append(cells)
+            if cells:
+                self.row_nonempty[r] = 1
+
+        # next_nonempty[r]: r 及之后第一个有数据的行（没有则为 None）
+        self._next_nonempty = [None] * (self.nrows + 1)
+        for r in range(self.nrows - 1, -1, -1):
+            self._next_nonempty[r] = r if self.row_nonempty[r] else self._next_nonempty[r + 1]
+
+    def _add_anchor(self, r, label):
+        for key, kw in ANCHOR_KEYWORDS:
+            if kw in label:
+                self.keyword_rows[key].append(r)
+                return
+        if self.at_af_row is None and AT_AF_KEYWORD in label:
+            self.at_af_row = r
+
+    def anchors(self):
+        """各锚点取最后一次出现的行；缺少"事件记录"时以 AT/AF事件行代替"""
+        anchors = {key: rows[-1] if rows else None for key, rows in self.keyword_rows.items()}
+        if anchors["event"] is None and self.at_af_row is not None:
+            anchors["event"] = self.at_af_row
+        return anchors
+
+    def positions_containing(self, text):
+        """所有包含 text 的标签位置（按行优先顺序，结果缓存）"""
+        if text not in self._containing:
+            positions = []
+            for label, cells in self.labels.items():
+                if text in label:
+                    positions.extend(cells)
+            positions.sort()
+            self._containing[text] = positions
+        return self._containing[text]
+
+    def positions_equal(self, text):
+        """标签恰好等于 text 的位置"""
+        return self.labels.get(text, [])
+
+    @staticmethod
+    def _first_in(positions, start_row, end_row, max_col=None):
+        i = bisect_left(positions, (start_row, -1))
+        while i < len(positions):
+            r, c = positions[i]
+            if r >= end_row:
+                break
+            if max_col is None or c < max_col:
+                return r, c
+            i += 1
+        return None
+
+    def find_containing(self, text, start_row, end_row, max_col=None):
+        """范围内第一个包含 text 的单元格 (r, c)"""
+        return self._first_in(self.positions_containing(text), start_row, end_row, max_col)
+
+    def find_equal(self, text, start_row, end_row, max_col=None):
+        """范围内第一个等于 text 的单元格 (r, c)"""
+        return self._first_in(self.positions_equal(text), start_row, end_row, max_col)
+
+    def blue_in_rows(self, start_row, end_row):
+        """范围内的蓝色单元格 (r, c)"""
+        lo = bisect_left(self.blue_cells, (start_row, -1))
+        hi = bisect_left(self.blue_cells, (end_row, -1))
+        return self.blue_cells[lo:hi]
+
+    def next_nonempty_row(self, r):
+        """r 及之后第一个有数据的行，没有则返回 None"""
+        if r >= self.nrows:
+            return None
+        return self._next_nonempty[max(r, 0)]
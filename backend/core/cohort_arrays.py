@@ -0,0 +1,155 @@
+"""
+队列数组模块
+从队列数据库一次性载入全部随访的数值字段，组织成按 (登记号, 随访顺序) 排列的 NumPy 数组，
+供筛查、预测等批量计算使用。缺失值为 NaN
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from config import COHORT_DB_FILE
+from core.cohort_store import CHAMBERS, LEAD_NUMERIC
+
+# 字段名 -> (表, 列, 区分列, 区分列取值)；同一张表只查询一次
+FIELD_SOURCES = {}
+for _code in CHAMBERS.values():
+    for _column in LEAD_NUMERIC.values():
+        FIELD_SOURCES[f"{_code}_{_column}"] = ("lead_measurements", _column, "chamber", (_code,))
+FIELD_SOURCES.update({
+    "battery_voltage": ("battery_readings", "voltage", None, ()),
+    "battery_impedance": ("battery_readings", "impedance", None, ()),
+    "battery_life": ("battery_readings", "life_years", None, ()),
+    "lower_rate": ("visits", "lower_rate", None, ()),
+    "upper_rate": ("visits", "upper_rate", None, ()),
+    "ataf_burden": ("events", "value_num", "name", ("AT/AF负荷%", "AT/AF负荷")),
+    "ataf_count": ("events", "value_num", "name", ("AT/AF事件次数",)),
+    "mode_switch_count": ("events", "value_num", "name", ("模式转换次数",)),
+})
+
+DAYS_PER_YEAR = 365.25
+
+
+class CohortArrays:
+    """
+    全部随访的列式数组
+    reg_ids: 患者登记号（P）；pid: 每次随访所属患者的下标（N，同一患者连续且按随访顺序）
+    years: 随访日期（距 1970 年的年数，未知为 NaN）；dates: ISO 日期字符串（未知为 None）
+    fields: 字段名 -> 数值数组（N）
+    """
+
+    def __init__(self, reg_ids, pid, dates, fields):
+        self.reg_ids = reg_ids
+        self.pid = pid
+        self.dates = dates
+        self.fields = fields
+        days = np.array([d or "NaT" for d in dates], dtype="datetime64[D]")
+        self.years = np.where(np.isnat(days), np.nan, days.astype("int64") / DAYS_PER_YEAR)
+
+    @property
+    def patient_count(self):
+        return len(self.reg_ids)
+
+    @property
+    def visit_count(self):
+        return len(self.pid)
+
+    def last_valid(self, values):
+        """每位患者最近一次有值的随访：返回 (患者下标, 随访下标)"""
+        rows = np.flatnonzero(~np.isnan(values))
+        return last_per_patient(self.pid, rows)
+
+
+def last_per_patient(pid, rows):
+    """rows 为升序的随访下标，返回每位患者最后一个下标：(患者下标, 随访下标)"""
+    if len(rows) == 0:
+        return np.empty(0, dtype=np.int64), rows
+    patients = pid[rows]
+    is_last = np.r_[patients[1:] != patients[:-1], True]
+    return patients[is_last], rows[is_last]
+
+
+def group_linear_fit(groups, x, y, group_count):
+    """
+    按组做一元线性回归（向量化，一次完成全部组）
+    返回 (斜率, 截距, 点数, 斜率标准误)，点数不足 2 或 x 无变化的组斜率为 NaN，点数不足 3 的组标准误为 NaN
+    """
+    n = np.bincount(groups, minlength=group_count).astype(float)
+    sx = np.bincount(groups, x, group_count)
+    sy = np.bincount(groups, y, group_count)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mx, my = sx / n, sy / n
+        dx, dy = x - mx[groups], y - my[groups]
+        sxx = np.bincount(groups, dx * dx, group_count)
+        sxy = np.bincount(groups, dx * dy, group_count)
+        slope = np.where(sxx > 0, sxy / sxx, np.nan)
+        intercept = my - slope * mx
+        resid = y - (intercept[groups] + slope[groups] * x)
+        sse = np.bincount(groups, resid * resid, group_count)
+        slope_se = np.where(n > 2, np.sqrt(sse / (n - 2) / sxx), np.nan)
+    return slope, intercept, n.astype(np.int64), slope_se
+
+
+def load_cohort_arrays(fields, db_path=COHORT_DB_FILE):
+    """从队列数据库载入指定字段"""
+    db_path = Path(db_path)
+    if not db_path.exists():
+        raise FileNotFoundError(f"队列数据库不存在: {db_path}（请先运行 main.py 生成）")
+    unknown = [f for f in fields if f not in FIELD_SOURCES]
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(unknown)}")
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        visits = conn.execute("SELECT visit_id, reg_id, visit_date FROM visits ORDER BY reg_id, seq").fetchall()
+        count = len(visits)
+        visit_ids = np.fromiter((v[0] for v in visits), dtype=np.int64, count=count)
+        reg_col = np.array([v[1] for v in visits], dtype=object)
+        new_patient = np.r_[True, reg_col[1:] != reg_col[:-1]] if count else np.empty(0, dtype=bool)
+        pid = np.cumsum(new_patient) - 1
+        reg_ids = reg_col[new_patient]
+        dates = [v[2] for v in visits]
+
+        # visit_id -> 数组下标
+        order = np.argsort(visit_ids)
+        sorted_ids = visit_ids[order]
+
+        # 按表合并查询：每张表取出所需的全部列，再按区分列拆成各字段
+        by_table = {}
+        for name in fields:
+            by_table.setdefault(FIELD_SOURCES[name][0], []).append(name)
+
+        arrays = {}
+        for table, names in by_table.items():
+            key_column = FIELD_SOURCES[names[0]][2]
+            columns = sorted({FIELD_SOURCES[name][1] for name in names})
+            select = ["visit_id"] + ([key_column] if key_column else []) + columns
+            sql = f"SELECT {', '.join(select)} FROM {table}"
+            params = []
+            if key_column:
+                params = sorted({v for name in names for v in FIELD_SOURCES[name][3]})
+                sql += f" WHERE {key_column} IN ({', '.join('?' * len(params))})"
+            result = conn.execute(sql, params).fetchall()
+
+            rows = order[np.searchsorted(sorted_ids, np.fromiter((r[0] for r in result), np.int64, len(result)))]
+            offset = 2 if key_column else 1
+            data = np.array([r[offset:] for r in result], dtype=float).reshape(-1, len(columns))
+            keys = np.array([r[1] for r in result], dtype=object) if key_column else None
+
+            for name in names:
+                _, column, _, key_values = FIELD_SOURCES[name]
+                values = np.full(count, np.nan)
+                column_data = data[:, columns.index(column)]
+                if key_column:
+                    mask = np.isin(keys, key_values)
+                    values[rows[mask]] = column_data[mask]
+                else:
+                    values[rows] = column_data
+                arrays[name] = values
+    finally:
+        conn.close()
+
+    return CohortArrays(reg_ids, pid, dates, arrays)
@@ -0,0 +1,261 @@
+"""
+队列数据库模块
+把患者记录写入本地 SQLite，建立带类型和索引的表，支持跨患者查询
+（如"右心室阻抗 > 1000Ω 的所有患者"），无需逐个读取患者 JSON
+按患者整体替换，内容未变的患者跳过，可随增量更新同步
+"""
+
+import re
+import json
+import hashlib
+import sqlite3
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import COHORT_DB_FILE
+from core.grouping import parse_date
+from core.normalize import parser_for
+
+# 腔室代码：查询时使用 RA / RV / LV
+CHAMBERS = {"心房": "RA", "右心室": "RV", "左心室": "LV"}
+
+# 阈值测试表中的数值列 -> 数据库列名
+LEAD_NUMERIC = {"阈值": "threshold", "脉宽": "pulse_width", "感知": "sensing",
+                "阻抗": "impedance", "起搏比例": "pacing_percent"}
+LEAD_TEXT = {"起搏极性": "pacing_polarity", "感知极性": "sensing_polarity"}
+
+# 已单独成列、不再重复写入 events 表的字段
+VISIT_EVENT_FIELDS = {"结论", "建议下次程控时间"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    reg_id TEXT PRIMARY KEY,
+    name TEXT,
+    sex TEXT,
+    brand TEXT,
+    model TEXT,
+    implant_date TEXT,
+    visit_count INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS visits (
+    visit_id INTEGER PRIMARY KEY,
+    reg_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    visit_date TEXT,
+    visit_date_raw TEXT,
+    filename TEXT,
+    path TEXT,
+    mode TEXT,
+    lower_rate REAL,
+    upper_rate REAL,
+    conclusion TEXT,
+    next_visit TEXT
+);
+CREATE TABLE IF NOT EXISTS lead_measurements (
+    visit_id INTEGER NOT NULL,
+    reg_id TEXT NOT NULL,
+    chamber TEXT NOT NULL,
+    threshold REAL,
+    pulse_width REAL,
+    sensing REAL,
+    impedance REAL,
+    pacing_percent REAL,
+    pacing_polarity TEXT,
+    sensing_polarity TEXT,
+    raw TEXT
+);
+CREATE TABLE IF NOT EXISTS battery_readings (
+    visit_id INTEGER NOT NULL,
+    reg_id TEXT NOT NULL,
+    voltage REAL,
+    impedance REAL,
+    life_years REAL,
+    life_raw TEXT
+);
+CREATE TABLE IF NOT EXISTS events (
+    visit_id INTEGER NOT NULL,
+    reg_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value_raw TEXT,
+    value_num REAL
+);
+CREATE INDEX IF NOT EXISTS idx_visits_reg ON visits (reg_id, seq);
+CREATE INDEX IF NOT EXISTS idx_visits_date ON visits (visit_date);
+CREATE INDEX IF NOT EXISTS idx_lead_reg ON lead_measurements (reg_id);
+CREATE INDEX IF NOT EXISTS idx_lead_chamber_impedance ON lead_measurements (chamber, impedance);
+CREATE INDEX IF NOT EXISTS idx_lead_chamber_threshold ON lead_measurements (chamber, threshold);
+CREATE INDEX IF NOT EXISTS idx_lead_chamber_sensing ON lead_measurements (chamber, sensing);
+CREATE INDEX IF NOT EXISTS idx_battery_reg ON battery_readings (reg_id);
+CREATE INDEX IF NOT EXISTS idx_battery_voltage ON battery_readings (voltage);
+CREATE INDEX IF NOT EXISTS idx_events_reg ON events (reg_id);
+CREATE INDEX IF NOT EXISTS idx_events_name ON events (name, value_num);
+"""
+
+DETAIL_TABLES = ["visits", "lead_measurements", "battery_readings", "events"]
+
+_NUMBER = re.compile(r"[-+]?\d+(?:\.\d+)?")
+
+
+def to_number(value):
+    """取字符串中的第一个数值（"<0.5" -> 0.5，"7年" -> 7.0），没有时返回 None"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value))
+    return float(match.group(0)) if match else None
+
+
+def _find_key(d, prefix):
+    """按标签前缀取标签（"电池电压" 匹配 "电池电压（V）"）"""
+    for key in d:
+        if key.startswith(prefix):
+            return key
+    return None
+
+
+def _numeric(record, section, values, label):
+    """
+    字段的数值：优先使用 ETL 规范化结果（record["normalized"]），
+    没有规范化区域的旧记录或没有对应解析器的标签退回 to_number
+    """
+    if label is None:
+        return None
+    normalized = record.get("normalized")
+    if normalized is None or parser_for(section, label) is None:
+        return to_number(values.get(label))
+    entry = normalized.get(section, {}).get(label)
+    return entry["value"] if entry else None
+
+
+def patient_hash(patient_data):
+    text = json.dumps(patient_data, ensure_ascii=False, sort_keys=True)
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+class CohortStore:
+    """队列数据库：按患者整体写入/删除"""
+
+    def __init__(self, path=COHORT_DB_FILE):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.executescript(SCHEMA)
+        self.updated = 0
+        self.unchanged = 0
+        self.removed = 0
+
+    def _stored_hash(self, reg_id):
+        row = self.conn.execute("SELECT content_hash FROM patients WHERE reg_id = ?", (reg_id,)).fetchone()
+        return row[0] if row else None
+
+    def _delete_rows(self, reg_id):
+        for table in DETAIL_TABLES:
+            self.conn.execute(f"DELETE FROM {table} WHERE reg_id = ?", (reg_id,))
+        self.conn.execute("DELETE FROM patients WHERE reg_id = ?", (reg_id,))
+
+    def upsert_patient(self, patient_data):
+        """写入一位患者（与 write_patient_file 的输入相同）；内容未变时跳过"""
+        reg_id = patient_data["登记号"]
+        content_hash = patient_hash(patient_data)
+        if self._stored_hash(reg_id) == content_hash:
+            self.unchanged += 1
+            return False
+
+        records = patient_data.get("程控记录", [])
+        latest = records[-1].get("header", {}) if records else {}
+        self._delete_rows(reg_id)
+        self.conn.execute(
+            "INSERT INTO patients VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (reg_id, patient_data.get("姓名"), latest.get("性别"), latest.get("品牌"),
+             latest.get("型号"), latest.get("植入日期"), len(records), content_hash),
+        )
+        for seq, record in enumerate(records):
+            self._insert_visit(reg_id, seq, record)
+        self.updated += 1
+        return True
+
+    def _insert_visit(self, reg_id, seq, record):
+        meta = record.get("meta", {})
+        settings = record.get("basic_params", {}).get("settings", {})
+        test = record.get("test_params", {})
+        events = record.get("events_and_footer", {})
+        date_raw = record.get("footer_meta", {}).get("程控日期", "")
+        normalized_date = record.get("normalized", {}).get("footer_meta", {}).get("程控日期")
+        if normalized_date:
+            visit_date = normalized_date["value"]
+        else:
+            parsed = parse_date(date_raw)
+            visit_date = parsed.date().isoformat() if parsed else None
+
+        cur = self.conn.execute(
+            "INSERT INTO visits (reg_id, seq, visit_date, visit_date_raw, filename, path, mode,"
+            " lower_rate, upper_rate, conclusion, next_visit) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (reg_id, seq, visit_date, date_raw,
+             meta.get("filename"), meta.get("path"), settings.get("模式"),
+             _numeric(record, "settings", settings, _find_key(settings, "低限频率")),
+             _numeric(record, "settings", settings, _find_key(settings, "上限跟踪频率")),
+             events.get("结论"), events.get("建议下次程控时间")),
+        )
+        visit_id = cur.lastrowid
+
+        thresholds = test.get("threshold_tests", {})
+        for chamber, code in CHAMBERS.items():
+            raw = {k.split("_", 1)[1]: v for k, v in thresholds.items() if k.startswith(chamber + "_")}
+            if not any(raw.values()):
+                continue
+            self.conn.execute(
+                "INSERT INTO lead_measurements VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (visit_id, reg_id, code,
+                 *(_numeric(record, "threshold_tests", thresholds, f"{chamber}_{label}") for label in LEAD_NUMERIC),
+                 *(raw.get(label) or None for label in LEAD_TEXT),
+                 json.dumps(raw, ensure_ascii=False)),
+            )
+
+        battery = test.get("battery_and_leads", {})
+        voltage_key, impedance_key = _find_key(battery, "电池电压"), _find_key(battery, "电池阻抗")
+        life_key = _find_key(battery, "电池预估寿命") or _find_key(battery, "预估寿命")
+        life = battery.get(life_key) if life_key else None
+        if any(battery.get(k) for k in (voltage_key, impedance_key, life_key) if k):
+            self.conn.execute(
+                "INSERT INTO battery_readings VALUES (?, ?, ?, ?, ?, ?)",
+                (visit_id, reg_id, _numeric(record, "battery_and_leads", battery, voltage_key),
+                 _numeric(record, "battery_and_leads", battery, impedance_key),
+                 _numeric(record, "battery_and_leads", battery, life_key), life),
+            )
+
+        self.conn.executemany(
+            "INSERT INTO events VALUES (?, ?, ?, ?, ?)",
+            [
+                (visit_id, reg_id, name, value, _numeric(record, "events_and_footer", events, name))
+                for name, value in events.items()
+                if name not in VISIT_EVENT_FIELDS and value not in (None, "")
+            ],
+        )
+
+    def remove_patient(self, reg_id):
+        if self._stored_hash(reg_id) is not None:
+            self._delete_rows(reg_id)
+            self.removed += 1
+
+    def retain_only(self, reg_ids):
+        """删除不在 reg_ids 中的患者（全量处理后清理已不存在的患者）"""
+        keep = set(reg_ids)
+        stored = [row[0] for row in self.conn.execute("SELECT reg_id FROM patients")]
+        for reg_id in stored:
+            if reg_id not in keep:
+                self.remove_patient(reg_id)
+
+    def query(self, sql, params=()):
+        return self.conn.execute(sql, params).fetchall()
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def summary(self):
+        return f"队列数据库：更新 {self.updated} 位患者，未变 {self.unchanged} 位，删除 {self.removed} 位"
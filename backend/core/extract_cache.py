@@ -0,0 +1,115 @@
+"""
+提取结果缓存模块
+以 (文件内容哈希, 提取逻辑版本) 为键，持久化 extract_file 的结果，
+内容与提取逻辑都未变化的文件无需重新解析
+结果按 EXTRACT_CACHE_FORMAT 存为 JSON 文本或压缩的二进制记录，读取时两种都识别
+"""
+
+import json
+import hashlib
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import config
+from config import EXTRACT_CACHE_FILE, EXTRACTOR_VERSION, EXTRACT_CACHE_FORMAT
+from core.serialization import dumps, loads
+
+# 参与提取的模块：源码变化即视为提取逻辑变化
+EXTRACTOR_SOURCES = ["extractors.py", "cell_index.py", "handlers.py", "xlsx_stream.py", "utils.py", "plans.py"]
+EXTRACTOR_CONFIG = [
+    "KW_BASIC", "KW_ANTITACHY", "KW_TEST", "KW_EVENT",
+    "ZAT_COL_HEADERS", "ZAT_ROW_HEADERS",
+    "Z2_COL_HEADERS", "Z2_ROW_HEADERS",
+    "Z3_COL_HEADERS", "Z3_ROW_HEADERS",
+    "IGNORE_IN_KV",
+]
+
+_BATCH = 500  # SQLite 参数个数上限以内的批量查询大小
+
+
+def extractor_version():
+    """提取逻辑版本：EXTRACTOR_VERSION + 提取模块源码与关键配置的指纹"""
+    hasher = hashlib.md5()
+    core_dir = Path(__file__).parent
+    for name in EXTRACTOR_SOURCES:
+        hasher.update((core_dir / name).read_bytes())
+    for name in EXTRACTOR_CONFIG:
+        value = getattr(config, name)
+        if isinstance(value, set):
+            value = sorted(value)
+        hasher.update(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+    return f"{EXTRACTOR_VERSION}-{hasher.hexdigest()[:12]}"
+
+
+class ExtractCache:
+    """基于 SQLite 的提取结果缓存"""
+
+    def __init__(self, path=EXTRACT_CACHE_FILE, version=None, fmt=EXTRACT_CACHE_FORMAT):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.version = version or extractor_version()
+        self.fmt = fmt
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            " file_hash TEXT NOT NULL,"
+            " version TEXT NOT NULL,"
+            " sections TEXT NOT NULL,"
+            " created TEXT NOT NULL,"
+            " PRIMARY KEY (file_hash, version))"
+        )
+        self.conn.commit()
+
+    def get_many(self, file_hashes):
+        """批量查询，返回 {file_hash: sections}（只包含命中的哈希；无法解码的条目视为未命中）"""
+        hashes = list(set(file_hashes))
+        found = {}
+        for i in range(0, len(hashes), _BATCH):
+            chunk = hashes[i:i + _BATCH]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT file_hash, sections FROM extractions"
+                f" WHERE version = ? AND file_hash IN ({placeholders})",
+                [self.version] + chunk,
+            )
+            for file_hash, sections in rows:
+                try:
+                    sections = loads(sections)
+                except ValueError:
+                    continue  # 损坏，或由安装了 msgpack/zstandard 的环境写入
+                if "error" not in sections:  # 旧版本写入的失败结果同样重新解析
+                    found[file_hash] = sections
+        return found
+
+    def put_many(self, items):
+        """
+        批量写入 [(file_hash, sections), ...]
+        提取失败的结果（{"error": ...}）不写入：失败可能是文件被占用、被替换或内存不足等临时原因，
+        缓存后会在之后每次运行中被当作命中，文件不变就永远不会重试
+        """
+        now = datetime.now().isoformat()
+        rows = [
+            (file_hash, self.version, self._encode(sections), now)
+            for file_hash, sections in items
+            if "error" not in sections
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO extractions (file_hash, version, sections, created)"
+                " VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def _encode(self, sections):
+        data = dumps(sections, self.fmt)
+        # JSON 仍存为文本，便于用 sqlite3 直接查看
+        return data.decode("utf-8") if self.fmt == "json" else data
+
+    def prune(self):
+        """删除其他提取版本的缓存，返回删除条数"""
+        with self.conn:
+            cur = self.conn.execute("DELETE FROM extractions WHERE version != ?", (self.version,))
+        return cur.rowcount
+
+    def close(self):
+        self.conn.close()
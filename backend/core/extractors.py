@@ -10,73 +10,55 @@ from datetime import datetime, timedelta
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from config import (
-    KW_BASIC, KW_ANTITACHY, KW_TEST, KW_EVENT,
     ZAT_COL_HEADERS, ZAT_ROW_HEADERS,
     Z2_COL_HEADERS, Z2_ROW_HEADERS,
-    Z3_COL_HEADERS, Z3_ROW_HEADERS
+    Z3_COL_HEADERS, Z3_ROW_HEADERS, NORMALIZE_VALUES
 )
 from core.handlers import get_handler
-from core.utils import clean_value, clean_label, is_ignored
+from core.normalize import normalize_record
+from core.plans import apply_plans, compile_layout
+from core import profiling
+from core.utils import clean_label, is_ignored
 
 
 def get_anchors(handler):
     """查找关键区域的锚点行号"""
-    anchors = {"basic": None, "antitachy": None, "test": None, "event": None}
-    at_af_row = None  # 备选：AT/AF事件行
-    
-    for r in range(handler.nrows):
-        for c in range(min(5, handler.ncols)):
-            val = str(handler.get_cell_value(r, c)).strip()
-            if KW_BASIC in val:
-                anchors["basic"] = r
-            elif KW_ANTITACHY in val:
-                anchors["antitachy"] = r
-            elif KW_TEST in val:
-                anchors["test"] = r
-            elif KW_EVENT in val:
-                anchors["event"] = r
-            # 备选：检测AT/AF事件行（用于没有"事件记录"标题的模板）
-            elif at_af_row is None and "AT/AF事件" in val:
-                at_af_row = r
-    
-    # 如果没有找到"事件记录"锚点，使用AT/AF事件行作为备选
-    if anchors["event"] is None and at_af_row is not None:
-        anchors["event"] = at_af_row
-    
-    return anchors
+    return handler.index.anchors()
 
 
 def extract_antitachy_table(handler, start_row, end_row):
     """提取抗心动过速参数表格 (ICD/CRT-D 特有)"""
+    index = handler.index
     data = {}
     col_positions = {}
     
-    for r in range(start_row, min(start_row + 5, end_row)):
-        for c in range(handler.ncols):
-            val = clean_label(handler.get_cell_value(r, c))
-            for h in ZAT_COL_HEADERS:
-                if h in val and h not in col_positions:
-                    col_positions[h] = c
+    for h in ZAT_COL_HEADERS:
+        pos = index.find_containing(h, start_row, min(start_row + 5, end_row))
+        if pos:
+            col_positions[h] = pos[1]
     
-    for r in range(start_row, end_row):
-        for c in range(min(3, handler.ncols)):
-            val = clean_label(handler.get_cell_value(r, c))
-            for rh in ZAT_ROW_HEADERS:
-                if val == rh:
-                    freq_val = ""
-                    treat_val = ""
-                    if "检测频率" in col_positions:
-                        freq_col = col_positions["检测频率"]
-                        freq_val = clean_value(handler.get_cell_value(r, freq_col))
-                        if not freq_val:
-                            freq_val = clean_value(handler.get_cell_value(r, freq_col + 1))
-                    if "治疗" in col_positions:
-                        treat_col = col_positions["治疗"]
-                        treat_val = clean_value(handler.get_cell_value(r, treat_col))
-                        if not treat_val:
-                            treat_val = clean_value(handler.get_cell_value(r, treat_col + 1))
-                    data[f"{rh}_检测频率"] = freq_val
-                    data[f"{rh}_治疗"] = treat_val
+    # 行标题可能重复出现：键按首次出现排序，值取最后一次
+    row_hits = sorted(
+        (r, c, rh)
+        for rh in ZAT_ROW_HEADERS
+        for r, c in index.positions_equal(rh)
+        if start_row <= r < end_row and c < 3
+    )
+    for r, _, rh in row_hits:
+        freq_val = ""
+        treat_val = ""
+        if "检测频率" in col_positions:
+            freq_col = col_positions["检测频率"]
+            freq_val = handler.get_clean_value(r, freq_col)
+            if not freq_val:
+                freq_val = handler.get_clean_value(r, freq_col + 1)
+        if "治疗" in col_positions:
+            treat_col = col_positions["治疗"]
+            treat_val = handler.get_clean_value(r, treat_col)
+            if not treat_val:
+                treat_val = handler.get_clean_value(r, treat_col + 1)
+        data[f"{rh}_检测频率"] = freq_val
+        data[f"{rh}_治疗"] = treat_val
     return data
 
 
@@ -86,7 +68,7 @@ def find_value_smart(handler, r, start_c):
         curr_c = start_c + offset
         if curr_c >= handler.ncols:
             break
-        val = clean_value(handler.get_cell_value(r, curr_c))
+        val = handler.get_clean_value(r, curr_c)
         if handler.is_blue_cell(r, curr_c) and val:
             break
         if val:
@@ -98,34 +80,37 @@ def extract_kv_in_range(handler, start_row, end_row):
     """在指定范围内提取键值对"""
     data = {}
     conclusion_row = None
-    for r in range(start_row, end_row):
-        for c in range(handler.ncols):
-            if handler.is_blue_cell(r, c):
-                label = clean_label(handler.get_cell_value(r, c))
-                if "结论" in label:
-                    conclusion_row = r
-                if label and not is_ignored(label):
-                    data[label] = find_value_smart(handler, r, c)
+    for r, c in handler.index.blue_in_rows(start_row, end_row):
+        label = clean_label(handler.get_cell_value(r, c))
+        if "结论" in label:
+            conclusion_row = r
+        if label and not is_ignored(label):
+            data[label] = find_value_smart(handler, r, c)
     return data, conclusion_row
 
 
 def extract_table_in_range(handler, start_row, end_row, col_headers, row_headers):
     """提取表格数据"""
-    data, f_cols, f_rows = {}, {}, {}
-    for r in range(start_row, end_row):
-        for c in range(handler.ncols):
-            val = clean_label(handler.get_cell_value(r, c))
-            for h in col_headers:
-                if h in val and h not in f_cols:
-                    f_cols[h] = c
-            for h in row_headers:
-                if h == val and h not in f_rows:
-                    f_rows[h] = r
+    index = handler.index
+    data = {}
+    # 列/行标题按首次出现的位置排序，与逐格扫描的发现顺序一致
+    col_hits = []
+    for i, h in enumerate(col_headers):
+        pos = index.find_containing(h, start_row, end_row)
+        if pos:
+            col_hits.append((pos, i, h))
+    row_hits = []
+    for i, h in enumerate(row_headers):
+        pos = index.find_equal(h, start_row, end_row)
+        if pos:
+            row_hits.append((pos, i, h))
+    f_cols = {h: pos[1] for pos, _, h in sorted(col_hits)}
+    f_rows = {h: pos[0] for pos, _, h in sorted(row_hits)}
     for rh, ri in f_rows.items():
         for ch, ci in f_cols.items():
-            val = clean_value(handler.get_cell_value(ri, ci))
+            val = handler.get_clean_value(ri, ci)
             if not val:
-                val = clean_value(handler.get_cell_value(ri, ci + 1))
+                val = handler.get_clean_value(ri, ci + 1)
             data[f"{rh}_{ch}"] = val
     return data
 
@@ -146,26 +131,14 @@ def extract_footer_info(handler, conc_row):
                 pass
         return None
 
-    def has_data_in_rows(start_row, end_row):
-        for r in range(start_row, end_row):
-            row_content = [
-                clean_value(handler.get_cell_value(r, c)) for c in range(handler.ncols)
-            ]
-            line = " ".join([x for x in row_content if x])
-            if line:
-                return True
-        return False
-
-    # 扩大扫描范围：确保能覆盖表格最后50行
+    # 扩大扫描范围：从 2 行起逐步扩展，直到窗口内出现有数据的行（最多扫描50行）
     scan_range = 2
-    max_scan = min(handler.nrows - conc_row, 50)  # 最多扫描50行
+    max_scan = min(handler.nrows - conc_row, 50)
 
-    while scan_range <= max_scan:
-        if has_data_in_rows(conc_row + 1, conc_row + 1 + scan_range):
-            break
-        scan_range += 1
-        if scan_range > 50:  # 扩展到50行
-            break
+    if scan_range <= max_scan:
+        first_data_row = handler.index.next_nonempty_row(conc_row + 1)
+        needed = max(scan_range, first_data_row - conc_row) if first_data_row is not None else None
+        scan_range = needed if needed is not None and needed <= max_scan else max_scan + 1
 
     for r in range(conc_row + 1, min(conc_row + 1 + scan_range, handler.nrows)):
         row_content = []
@@ -178,7 +151,7 @@ def extract_footer_info(handler, conc_row):
                 if excel_date:
                     date_str = excel_date
             
-            cleaned = clean_value(raw_val)
+            cleaned = handler.get_clean_value(r, c)
             if cleaned:
                 row_content.append(cleaned)
         
@@ -197,12 +170,9 @@ def extract_footer_info(handler, conc_row):
 def extract_events_flexible(handler, start_row, end_row):
     """更灵活的事件提取，支持非蓝色单元格"""
     data = {}
-    for r in range(start_row, end_row):
-        row_content = []
-        for c in range(handler.ncols):
-            val = clean_value(handler.get_cell_value(r, c))
-            if val:
-                row_content.append((c, val))
+    index = handler.index
+    for r in range(start_row, min(end_row, index.nrows)):
+        row_content = index.row_cells[r]
         if len(row_content) >= 2:
             for i in range(len(row_content) - 1):
                 c1, v1 = row_content[i]
@@ -249,55 +219,103 @@ def validate_and_fix_header(d_header: dict, filename: str) -> dict:
     return d_header
 
 
-def process_file(filepath, filename):
-    """处理单个文件并返回结构化数据"""
+def extract_sections(handler):
+    """从已加载的处理器中抽取各区域数据（不含文件名相关的校验）"""
+    anchors = profiling.timed("index", get_anchors, handler)
+    
+    rb = anchors["basic"] or handler.nrows
+    rat = anchors["antitachy"]
+    rt = anchors["test"] or handler.nrows
+    re_row = anchors["event"] or handler.nrows
+    basic_end = rat if rat else rt
+
+    d_header, _ = profiling.timed("kv", extract_kv_in_range, handler, 0, rb)
+    
+    d_basic, _ = profiling.timed("kv", extract_kv_in_range, handler, rb, basic_end)
+    d_basic_tbl = profiling.timed("table", extract_table_in_range,
+                                  handler, rb, basic_end, Z2_COL_HEADERS, Z2_ROW_HEADERS)
+
+    d_antitachy = {}
+    if rat:
+        d_antitachy = profiling.timed("antitachy", extract_antitachy_table, handler, rat, rt)
+
+    d_test, _ = profiling.timed("kv", extract_kv_in_range, handler, rt, re_row)
+    d_test_tbl = profiling.timed("table", extract_table_in_range,
+                                 handler, rt, re_row, Z3_COL_HEADERS, Z3_ROW_HEADERS)
+    
+    d_events, conc_row = profiling.timed("kv", extract_kv_in_range, handler, re_row, handler.nrows)
+    d_events_flexible = profiling.timed("events", extract_events_flexible, handler, re_row, handler.nrows)
+    d_events.update(d_events_flexible)
+
+    sig_text, sig_date = ("", "")
+    if conc_row is not None:
+        sig_text, sig_date = profiling.timed("footer", extract_footer_info, handler, conc_row)
+
+    sections = {
+        "header": d_header,
+        "basic_params": {"settings": d_basic, "measurements": d_basic_tbl},
+    }
+    if d_antitachy:
+        sections["antitachy_params"] = d_antitachy
+
+    sections.update({
+        "test_params": {"battery_and_leads": d_test, "threshold_tests": d_test_tbl},
+        "events_and_footer": d_events,
+        "footer_meta": {"签名行内容": sig_text, "程控日期": sig_date},
+    })
+    return sections
+
+
+def extract_file(filepath, handler_options=None):
+    """
+    加载并抽取单个文件
+    结果只取决于文件内容，可按内容哈希缓存；失败时返回 {"error": 错误信息}
+    """
     try:
-        handler = get_handler(filepath)
-        anchors = get_anchors(handler)
-        
-        rb = anchors["basic"] or handler.nrows
-        rat = anchors["antitachy"]
-        rt = anchors["test"] or handler.nrows
-        re_row = anchors["event"] or handler.nrows
-        basic_end = rat if rat else rt
+        handler = profiling.timed("load", get_handler, filepath, **(handler_options or {}))
+        if profiling.ENABLED:
+            profiling.watch_handler(handler)
+        return extract_sections(handler)
+    except Exception as e:
+        return {"error": str(e)}
 
-        d_header, _ = extract_kv_in_range(handler, 0, rb)
-        
-        # 校验并修复 header 数据
-        d_header = validate_and_fix_header(d_header, filename)
-        
-        d_basic, _ = extract_kv_in_range(handler, rb, basic_end)
-        d_basic_tbl = extract_table_in_range(handler, rb, basic_end, Z2_COL_HEADERS, Z2_ROW_HEADERS)
 
-        d_antitachy = {}
-        if rat:
-            d_antitachy = extract_antitachy_table(handler, rat, rt)
+def extract_file_planned(filepath, handler_options=None, layouts=()):
+    """
+    按模板版式提取单个文件
+    layouts: 该模板已验证的版式；校验通过则按坐标建立索引，否则通用扫描
+    返回 (sections, layout)：layout 为通用扫描时学到的本文件版式（按计划提取或失败时为 None）
+    """
+    try:
+        handler = profiling.timed("load", get_handler, filepath, **(handler_options or {}))
+        if profiling.ENABLED:
+            profiling.watch_handler(handler)
+        if profiling.timed("plan", apply_plans, handler, layouts):
+            return extract_sections(handler), None
+        sections = extract_sections(handler)
+        return sections, profiling.timed("layout", compile_layout, handler.index)
+    except Exception as e:
+        return {"error": str(e)}, None
 
-        d_test, _ = extract_kv_in_range(handler, rt, re_row)
-        d_test_tbl = extract_table_in_range(handler, rt, re_row, Z3_COL_HEADERS, Z3_ROW_HEADERS)
-        
-        d_events, conc_row = extract_kv_in_range(handler, re_row, handler.nrows)
-        d_events_flexible = extract_events_flexible(handler, re_row, handler.nrows)
-        d_events.update(d_events_flexible)
-
-        sig_text, sig_date = ("", "")
-        if conc_row is not None:
-            sig_text, sig_date = extract_footer_info(handler, conc_row)
-
-        result = {
-            "meta": {"filename": filename, "path": filepath},
-            "header": d_header,
-            "basic_params": {"settings": d_basic, "measurements": d_basic_tbl},
-        }
-        if d_antitachy:
-            result["antitachy_params"] = d_antitachy
-
-        result.update({
-            "test_params": {"battery_and_leads": d_test, "threshold_tests": d_test_tbl},
-            "events_and_footer": d_events,
-            "footer_meta": {"签名行内容": sig_text, "程控日期": sig_date},
-        })
+
+def build_record(sections, filepath, filename):
+    """组装单个文件的结构化记录，校验修复 header 数据并规范化数值字段（不修改传入的 sections）"""
+    if "error" in sections:
+        return {"meta": {"filename": filename, "error": sections["error"]}}
+    try:
+        result = {"meta": {"filename": filename, "path": filepath}}
+        result.update(sections)
+        result["header"] = validate_and_fix_header(dict(sections["header"]), filename)
+        if NORMALIZE_VALUES:
+            normalize_record(result)
         return result
     except Exception as e:
         return {"meta": {"filename": filename, "error": str(e)}}
 
+
+def process_file(filepath, filename, handler_options=None):
+    """
+    处理单个文件并返回结构化数据
+    handler_options: 传给 get_handler 的处理器选项（如 snapshot）
+    """
+    return build_record(extract_file(filepath, handler_options), filepath, filename)
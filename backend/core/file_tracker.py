@@ -7,19 +7,136 @@ import os
 import json
 import hashlib
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-from config import DATA_REPOSITORY, PROCESSED_FILES_FILE
+from config import DATA_REPOSITORY, PROCESSED_FILES_FILE, HASH_ALGORITHM, HASH_WORKERS, SCAN_WORKERS
+from core.grouping import is_valid_record
 
+HASH_CHUNK_SIZE = 1024 * 1024  # 大块读取，哈希计算期间释放 GIL，便于线程并发
 
-def get_file_hash(filepath):
-    """计算文件的 MD5 哈希值"""
-    hasher = hashlib.md5()
+
+_hash_algorithm = HASH_ALGORITHM
+
+
+def set_hash_algorithm(algorithm):
+    """设置新计算哈希使用的算法（md5 / blake2b / xxh3）"""
+    global _hash_algorithm
+    _new_hasher(algorithm)  # 提前校验算法是否可用
+    _hash_algorithm = algorithm
+
+
+def _new_hasher(algorithm):
+    if algorithm == "md5":
+        return hashlib.md5()
+    if algorithm == "blake2b":
+        return hashlib.blake2b(digest_size=16)
+    if algorithm == "xxh3":
+        try:
+            import xxhash
+        except ImportError:
+            raise ValueError("xxh3 需要安装 xxhash: pip install xxhash")
+        return xxhash.xxh3_128()
+    raise ValueError(f"不支持的哈希算法: {algorithm}")
+
+
+def hash_algorithm_of(file_hash):
+    """哈希值使用的算法：旧索引中的 MD5 没有前缀"""
+    return file_hash.split(":", 1)[0] if ":" in file_hash else "md5"
+
+
+def get_file_hash(filepath, algorithm=None):
+    """
+    计算文件内容哈希
+    MD5 保持原有的纯十六进制格式，其他算法加 "算法:" 前缀
+    """
+    algorithm = algorithm or _hash_algorithm
+    hasher = _new_hasher(algorithm)
     with open(filepath, 'rb') as f:
-        buf = f.read(65536)
+        buf = f.read(HASH_CHUNK_SIZE)
         while len(buf) > 0:
             hasher.update(buf)
-            buf = f.read(65536)
-    return hasher.hexdigest()
+            buf = f.read(HASH_CHUNK_SIZE)
+    if algorithm == "md5":
+        return hasher.hexdigest()
+    return f"{algorithm}:{hasher.hexdigest()}"
+
+
+def file_signature(filepath):
+    """文件的 stat 签名：大小、修改时间（纳秒），以及可用时的 inode"""
+    st = os.stat(filepath)
+    sig = {'size': st.st_size, 'mtime': st.st_mtime_ns}
+    if st.st_ino:
+        sig['inode'] = st.st_ino
+    return sig
+
+
+def signature_matches(entry, sig):
+    """索引记录的 stat 签名是否与当前文件一致（旧索引没有签名，视为不一致）"""
+    return (
+        entry.get('size') == sig['size']
+        and entry.get('mtime') == sig['mtime']
+        and entry.get('inode') == sig.get('inode')
+    )
+
+
+def _unreadable(current, rel_path, entry, error):
+    """
+    遍历之后无法 stat 或读取的文件：已被删除（或改名）的跳过；
+    其他错误（如被占用）沿用索引中的记录，避免被当作删除，没有记录的留待下次扫描
+    """
+    if entry and not isinstance(error, FileNotFoundError):
+        current[rel_path] = {key: entry[key] for key in ('hash', 'size', 'mtime', 'inode') if key in entry}
+
+
+def _hash_or_error(item):
+    full_path, _, algorithm, _ = item
+    try:
+        return get_file_hash(full_path, algorithm)
+    except OSError as e:
+        return e
+
+
+def scan_files(file_list, processed=None, workers=HASH_WORKERS):
+    """
+    获取文件的哈希与 stat 签名，stat 未变化的文件直接复用索引中的哈希
+    file_list: [(完整路径, 文件名, 相对路径)]
+    返回 {相对路径: {'hash', 'size', 'mtime', ['inode']}}；遍历后消失的文件不在结果中
+    """
+    processed = processed or {}
+    current = {}
+    to_hash = []
+    for full_path, _, rel_path in file_list:
+        entry = processed.get(rel_path)
+        try:
+            sig = file_signature(full_path)
+        except OSError as e:
+            _unreadable(current, rel_path, entry, e)
+            continue
+        if entry and signature_matches(entry, sig):
+            current[rel_path] = dict(sig, hash=entry['hash'])
+        else:
+            current[rel_path] = sig
+            # 用旧记录的算法计算，才能与旧哈希比较（便于从 MD5 索引迁移）
+            algorithm = hash_algorithm_of(entry['hash']) if entry else None
+            to_hash.append((full_path, rel_path, algorithm, entry))
+
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            hashes = executor.map(_hash_or_error, to_hash)
+            for (_, rel_path, _, entry), file_hash in zip(to_hash, hashes):
+                if isinstance(file_hash, OSError):
+                    del current[rel_path]
+                    _unreadable(current, rel_path, entry, file_hash)
+                else:
+                    current[rel_path]['hash'] = file_hash
+    return current
+
+
+def lookup_file_hashes(full_paths):
+    """按完整路径批量获取内容哈希（优先复用文件索引中 stat 未变化的记录；已不存在的文件为 None）"""
+    file_list = [(p, os.path.basename(p), to_rel_path(p)) for p in full_paths]
+    current = scan_files(file_list, load_processed_files())
+    return [current.get(rel_path, {}).get('hash') for _, _, rel_path in file_list]
 
 
 def load_processed_files():
@@ -36,44 +153,155 @@ def save_processed_files(data):
         json.dump(data, f, ensure_ascii=False, indent=2)
 
 
-def find_new_or_modified_files():
-    """查找新增或修改的文件"""
-    processed = load_processed_files()
-    new_files = []
-    modified_files = []
-    
-    for root, dirs, files in os.walk(DATA_REPOSITORY):
+def _list_directory(path):
+    """列出一个目录：返回 (文件名列表, 子目录路径列表)，规则与 os.walk 一致（不进入符号链接目录）"""
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    files.append(entry.name)
+                elif not entry.is_symlink():
+                    subdirs.append(entry.path)
+    except OSError:
+        pass
+    return files, subdirs
+
+
+def walk_directory_tree(top, workers=SCAN_WORKERS):
+    """
+    并行遍历目录树（os.scandir + 线程池），目录层级深、在网络共享上时明显快于 os.walk
+    产出 (目录路径, 文件名列表)，顺序与 os.walk(top) 相同
+    """
+    top = os.fspath(top)
+    listings = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = {executor.submit(_list_directory, top): top}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                listings[path] = future.result()
+                for subdir in listings[path][1]:
+                    pending[executor.submit(_list_directory, subdir)] = subdir
+
+    stack = [top]
+    while stack:
+        path = stack.pop()
+        files, subdirs = listings[path]
+        yield path, files
+        stack.extend(reversed(subdirs))
+
+
+def iter_repository_files():
+    """遍历数据仓库中的 Excel 文件，产出 (完整路径, 文件名, 相对路径)"""
+    for root, files in walk_directory_tree(DATA_REPOSITORY):
         for f in files:
             if not f.lower().endswith(('.xls', '.xlsx')):
                 continue
             if f.startswith('~$'):
                 continue
-                
             full_path = os.path.join(root, f)
             rel_path = os.path.relpath(full_path, start=DATA_REPOSITORY.parent)
-            file_hash = get_file_hash(full_path)
-            
-            if rel_path not in processed:
-                new_files.append((rel_path, f, file_hash))
-            elif processed[rel_path]['hash'] != file_hash:
-                modified_files.append((rel_path, f, file_hash))
+            yield full_path, f, rel_path
+
+
+def to_rel_path(full_path):
+    """完整路径 -> 文件索引使用的相对路径"""
+    return os.path.relpath(full_path, start=DATA_REPOSITORY.parent)
+
+
+def to_full_path(rel_path):
+    """文件索引中的相对路径 -> 完整路径"""
+    return os.path.join(str(DATA_REPOSITORY.parent), rel_path)
+
+
+def scan_repository(processed=None):
+    """扫描数据仓库，返回 {相对路径: 哈希与 stat 签名}（stat 未变化的文件不重新计算哈希）"""
+    if processed is None:
+        processed = load_processed_files()
+    return scan_files(list(iter_repository_files()), processed)
+
+
+def detect_changes(processed=None, current=None):
+    """
+    检测新增、修改和删除的文件
+    current: scan_repository 的结果，不传则现场扫描
+    返回 (new, modified, deleted)：new/modified 为 [(rel_path, filename, hash)]，deleted 为 [rel_path]
+    """
+    if processed is None:
+        processed = load_processed_files()
+    if current is None:
+        current = scan_repository(processed)
+    new_files = []
+    modified_files = []
     
+    for rel_path, state in current.items():
+        filename = os.path.basename(rel_path)
+        if rel_path not in processed:
+            new_files.append((rel_path, filename, state['hash']))
+        elif processed[rel_path]['hash'] != state['hash']:
+            modified_files.append((rel_path, filename, state['hash']))
+    
+    deleted_files = [p for p in processed if p not in current]
+    return new_files, modified_files, deleted_files
+
+
+def find_new_or_modified_files():
+    """查找新增或修改的文件"""
+    new_files, modified_files, _ = detect_changes()
     return new_files, modified_files
 
 
-def build_file_index():
-    """建立所有Excel文件的索引"""
+def registration_ids_by_path(records):
+    """从提取记录建立 {相对路径: 登记号}（仅有效记录）"""
+    reg_ids = {}
+    for record in records:
+        path = record.get("meta", {}).get("path")
+        if path and is_valid_record(record):
+            reg_ids[to_rel_path(path)] = record.get("header", {}).get("登记号", "")
+    return reg_ids
+
+
+def build_file_index(records=None, current=None):
+    """
+    建立所有Excel文件的索引
+    records: 本次提取的记录，用于登记每个文件对应的登记号（供增量更新定位患者）
+    current: 已有的扫描结果（如扫描清单的 manifest_state），不传则重新扫描
+    """
+    reg_ids = registration_ids_by_path(records or [])
+    if current is None:
+        current = scan_repository()
+    now = datetime.now().isoformat()
     processed = {}
-    for root, dirs, files in os.walk(DATA_REPOSITORY):
-        for f in files:
-            if not f.lower().endswith(('.xls', '.xlsx')):
-                continue
-            if f.startswith('~$'):
-                continue
-            full_path = os.path.join(root, f)
-            rel_path = os.path.relpath(full_path, start=DATA_REPOSITORY.parent)
-            file_hash = get_file_hash(full_path)
-            processed[rel_path] = {'hash': file_hash, 'last_processed': datetime.now().isoformat()}
+    for rel_path, state in current.items():
+        processed[rel_path] = dict(state, last_processed=now)
+        processed[rel_path]['登记号'] = reg_ids.get(rel_path, "")
     
     save_processed_files(processed)
     return len(processed)
+
+
+def update_file_index(processed, changed, deleted, records, current=None):
+    """
+    增量更新文件索引
+    changed: 新增/修改的 [(rel_path, filename, hash)]；deleted: 已删除的 [rel_path]
+    current: scan_repository 的结果，用于刷新未变化文件的 stat 签名
+    """
+    reg_ids = registration_ids_by_path(records)
+    now = datetime.now().isoformat()
+    for rel_path in deleted:
+        processed.pop(rel_path, None)
+    for rel_path, state in (current or {}).items():
+        if rel_path in processed:
+            processed[rel_path].update(state)
+    for rel_path, _, file_hash in changed:
+        entry = dict((current or {}).get(rel_path, {}), hash=file_hash, last_processed=now)
+        entry['登记号'] = reg_ids.get(rel_path, "")
+        processed[rel_path] = entry
+    save_processed_files(processed)
+    return len(processed)
@@ -3,13 +3,25 @@
 负责按登记号对患者记录进行分组、排序和拆分输出
 """
 
+import os
 import re
+import sys
 import json
+import heapq
+import hashlib
+import secrets
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from collections import defaultdict
+from itertools import groupby
 from pathlib import Path
 
-from config import PATIENT_RECORDS_DIR
+from config import (
+    PATIENT_RECORDS_DIR, GROUPING_MEMORY_BUDGET, SPILL_DIR, PATIENT_JSON_COMPACT, WRITE_WORKERS
+)
+from core import profiling
+from core.serialization import dumps_json, loads_json
 
 
 def parse_date(date_str: str):
@@ -89,24 +101,303 @@ def group_by_registration_id(data: list) -> dict:
 
 
 def sort_by_date(records: list) -> list:
-    """按程控日期排序（从早到晚）"""
-    def get_date(record):
+    """
+    按程控日期排序（从早到晚），同一日期按源文件路径排序
+    顺序只取决于记录本身，与遍历顺序、增量更新时新旧记录的先后无关
+    """
+    def sort_key(record):
         date_str = record.get("footer_meta", {}).get("程控日期", "")
         parsed = parse_date(date_str)
-        return parsed if parsed else datetime.max
+        return parsed if parsed else datetime.max, record.get("meta", {}).get("path", "")
     
-    return sorted(records, key=get_date)
+    return sorted(records, key=sort_key)
+
+
+def patient_file_path(reg_id: str) -> Path:
+    """登记号对应的患者 JSON 文件路径"""
+    # 确保文件名安全
+    safe_filename = "".join([c for c in reg_id if c.isalnum() or c in (' ', '.', '_')]).strip()
+    return PATIENT_RECORDS_DIR / f"{safe_filename}.json"
+
+
+def record_fingerprint(record: dict) -> str:
+    """记录除 meta（文件名、路径）以外内容的指纹"""
+    content = {key: value for key, value in record.items() if key != "meta"}
+    text = json.dumps(content, ensure_ascii=False, sort_keys=True)
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+def record_sources(record: dict) -> list:
+    """记录的全部来源文件 [{"filename", "path"}]：主文件在前，其后为内容相同的副本"""
+    meta = record.get("meta", {})
+    return [{"filename": meta.get("filename", ""), "path": meta.get("path", "")}] + meta.get("duplicates", [])
+
+
+def collapse_duplicate_visits(records: list) -> list:
+    """
+    合并同一份报告的多个副本（复制到不同目录的同一文件）：
+    程控日期与内容（meta 以外）都相同的记录只保留第一条，其余副本的文件名与路径记入其 meta.duplicates（按路径排序）
+    只有同一日期出现多条记录时才计算内容指纹；传入按 sort_by_date 排好的记录时，保留的是路径最小的副本
+    """
+    dates = defaultdict(int)
+    for record in records:
+        dates[record.get("footer_meta", {}).get("程控日期", "")] += 1
+    if all(count == 1 for count in dates.values()):
+        return records
+
+    result = []
+    kept = {}
+    for record in records:
+        date = record.get("footer_meta", {}).get("程控日期", "")
+        if dates[date] == 1:
+            result.append(record)
+            continue
+        key = (date, record_fingerprint(record))
+        original = kept.get(key)
+        if original is None:
+            kept[key] = record
+            result.append(record)
+            continue
+        meta = original.setdefault("meta", {})
+        duplicates = meta.get("duplicates", []) + record_sources(record)
+        meta["duplicates"] = sorted(duplicates, key=lambda source: source["path"])
+    return result
+
+
+def drop_sources(record: dict, removed_paths: set):
+    """
+    去掉记录中已删除/修改的来源文件（removed_paths 为规范化的完整路径）
+    主文件被去掉时由第一个剩余副本顶替；没有剩余来源时返回 None
+    """
+    sources = record_sources(record)
+    remaining = [s for s in sources if os.path.normpath(s["path"]) not in removed_paths]
+    if len(remaining) == len(sources):
+        return record
+    if not remaining:
+        return None
+    meta = dict(record.get("meta", {}), filename=remaining[0]["filename"], path=remaining[0]["path"])
+    meta.pop("duplicates", None)
+    if len(remaining) > 1:
+        meta["duplicates"] = remaining[1:]
+    return dict(record, meta=meta)
+
+
+def build_patient_data(reg_id: str, records: list) -> dict:
+    """按日期排序、合并重复副本并组装单个患者的输出结构（全量与增量更新的结果相同）"""
+    sorted_records = collapse_duplicate_visits(sort_by_date(records))
+    return {
+        "登记号": reg_id,
+        "姓名": sorted_records[0].get("header", {}).get("姓名", "未知"),
+        "程控次数": len(sorted_records),
+        "程控记录": sorted_records
+    }
+
+
+def _create_temp_file(directory: Path, stem: str):
+    """
+    在 directory 中独占创建临时文件，返回 (fd, 路径)
+    以 0o666 创建，由内核按 umask 得到与普通 open 相同的权限（mkstemp 固定为 0600）
+    """
+    while True:
+        tmp_path = directory / f".{stem}-{secrets.token_hex(4)}.tmp"
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+        except FileExistsError:
+            continue
+        return fd, tmp_path
+
+
+def serialize_patient(patient_data: dict, compact: bool = PATIENT_JSON_COMPACT) -> bytes:
+    """序列化患者数据：默认缩进 2 格，compact 时去掉缩进与空格"""
+    return dumps_json(patient_data, pretty=not compact)
+
+
+def write_patient_file(patient_data: dict, compact: bool = PATIENT_JSON_COMPACT) -> bool:
+    """
+    写出单个患者的 JSON 文件
+    内容与磁盘上的文件相同时跳过（不改变 mtime）；需要写入时先写临时文件再原子替换
+    返回是否实际写入
+    """
+    file_path = patient_file_path(patient_data["登记号"])
+    content = profiling.timed("serialize", serialize_patient, patient_data, compact)
+    try:
+        if file_path.stat().st_size == len(content):
+            with open(file_path, 'rb') as f:
+                if f.read() == content:
+                    return False
+    except FileNotFoundError:
+        pass
+
+    # 临时文件以 "." 开头、不以 .json 结尾，不会被当作患者文件读取
+    fd, tmp_path = _create_temp_file(file_path.parent, file_path.stem)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+class PatientWriter:
+    """
+    线程池写出患者文件，统计实际写入与内容未变而跳过的数量
+    在途任务数有上限，流式处理时不会积压大量待写患者
+    store: 可选的队列数据库（CohortStore），在主线程中同步写入同一份患者数据
+    """
+
+    def __init__(self, workers: int = WRITE_WORKERS, compact: bool = PATIENT_JSON_COMPACT, store=None):
+        self.compact = compact
+        self.store = store
+        self.written = 0
+        self.skipped = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._max_pending = max(1, workers) * 4
+        self._pending = set()
+
+    def submit(self, patient_data: dict):
+        if len(self._pending) >= self._max_pending:
+            done, self._pending = wait(self._pending, return_when=FIRST_COMPLETED)
+            self._collect(done)
+        self._pending.add(self._executor.submit(profiling.timed, "write_patient", write_patient_file,
+                                                patient_data, self.compact))
+        if self.store is not None:
+            profiling.timed("cohort_db", self.store.upsert_patient, patient_data)
+
+    def _collect(self, futures):
+        for future in futures:
+            if future.result():
+                self.written += 1
+            else:
+                self.skipped += 1
+
+    def close(self):
+        """等待全部写完，返回 (写入数, 跳过数)"""
+        try:
+            done, _ = wait(self._pending)
+            self._pending = set()
+            self._collect(done)
+        finally:
+            self._executor.shutdown()
+            if self.store is not None:
+                self.store.commit()
+        return self.written, self.skipped
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def load_patient_records(reg_id: str) -> list:
+    """读取患者现有的程控记录（文件不存在时返回空列表）"""
+    file_path = patient_file_path(reg_id)
+    if not file_path.exists():
+        return []
+    with open(file_path, 'rb') as f:
+        return loads_json(f.read()).get("程控记录", [])
+
+
+def find_registration_ids_by_paths(paths: set) -> set:
+    """扫描患者文件，找出包含指定源文件路径的登记号（用于缺少登记号索引的旧记录）"""
+    reg_ids = set()
+    for file_path in PATIENT_RECORDS_DIR.glob("*.json"):
+        try:
+            with open(file_path, 'rb') as f:
+                patient = loads_json(f.read())
+        except (OSError, ValueError):
+            continue
+        if not isinstance(patient, dict) or "程控记录" not in patient:
+            continue
+        for record in patient["程控记录"]:
+            if any(os.path.normpath(source["path"]) in paths for source in record_sources(record)):
+                reg_ids.add(patient.get("登记号", ""))
+                break
+    reg_ids.discard("")
+    return reg_ids
 
 
-def process_and_split_records(data: list):
+def update_patient_records(new_data: list, removed_paths: set, affected_ids: set,
+                           compact: bool = PATIENT_JSON_COMPACT, store=None):
+    """
+    增量更新：只重写受影响患者的 JSON 文件
+    new_data: 新增/修改文件的提取记录；removed_paths: 需移除其旧记录的源文件完整路径
+    affected_ids: 需重写的登记号（旧记录所属患者 + 新记录所属患者）
+    store: 可选的队列数据库，随患者文件同步更新/删除
+    返回 (重写患者数, 删除患者数)
+    """
+    removed_paths = {os.path.normpath(p) for p in removed_paths}
+    grouped = group_by_registration_id(new_data)
+    affected_ids = set(affected_ids) | set(grouped)
+
+    deleted = 0
+    with PatientWriter(compact=compact, store=store) as writer:
+        for reg_id in sorted(affected_ids):
+            records = []
+            for record in load_patient_records(reg_id):
+                record = drop_sources(record, removed_paths)
+                if record is not None:
+                    records.append(record)
+            records.extend(grouped.get(reg_id, []))
+
+            if records:
+                writer.submit(build_patient_data(reg_id, records))
+            else:
+                if store is not None:
+                    store.remove_patient(reg_id)
+                file_path = patient_file_path(reg_id)
+                if file_path.exists():
+                    file_path.unlink()
+                    deleted += 1
+
+    print(f"已重写 {writer.written} 位患者（内容未变跳过 {writer.skipped} 位），删除 {deleted} 位患者的记录文件")
+    return writer.written, deleted
+
+
+def remove_stale_patients(keep_ids, store=None) -> int:
+    """
+    全量处理后删除本次未出现的患者：patient_records 中的患者文件与队列数据库中的行一起删除，两者保持一致
+    本次没有任何患者时（如数据仓库未挂载）不删除
+    返回删除的患者文件数
+    """
+    if not keep_ids:
+        return 0
+    if store is not None:
+        store.retain_only(keep_ids)
+    keep = {patient_file_path(reg_id).name for reg_id in keep_ids}
+    removed = 0
+    for file_path in PATIENT_RECORDS_DIR.glob("*.json"):
+        # 隐藏的临时文件不处理；processed_files.json 等登记文件没有程控记录，不会被删除
+        if file_path.name in keep or file_path.name.startswith("."):
+            continue
+        try:
+            with open(file_path, 'rb') as f:
+                patient = loads_json(f.read())
+        except (OSError, ValueError):
+            continue
+        if isinstance(patient, dict) and "程控记录" in patient:
+            file_path.unlink()
+            removed += 1
+    return removed
+
+
+def process_and_split_records(data: list, compact: bool = PATIENT_JSON_COMPACT, store=None):
     """
     内存管道处理：分组 + 排序 + 拆分输出
-    直接从提取的数据列表生成患者独立JSON文件
+    直接从提取的数据列表生成患者独立JSON文件（内容未变的患者不重写）
+    store: 可选的队列数据库，写入同一批患者
+    本次未出现的患者的文件（及队列数据库中的行）会被删除
+    返回 (写入数, 跳过数)
     """
     print(f"总记录数: {len(data)}")
     
     # 按登记号分组
-    grouped = group_by_registration_id(data)
+    grouped = profiling.timed("group", group_by_registration_id, data)
     print(f"唯一患者数（按登记号）: {len(grouped)}")
     
     # 创建输出目录
@@ -115,29 +406,151 @@ def process_and_split_records(data: list):
     count = 0
     multi_visit_count = 0
     
-    for reg_id, records in grouped.items():
-        sorted_records = sort_by_date(records)
-        
-        patient_data = {
-            "登记号": reg_id,
-            "姓名": sorted_records[0].get("header", {}).get("姓名", "未知"),
-            "程控次数": len(sorted_records),
-            "程控记录": sorted_records
-        }
-        
-        if len(sorted_records) > 1:
-            multi_visit_count += 1
-        
-        # 确保文件名安全
-        safe_filename = "".join([c for c in reg_id if c.isalnum() or c in (' ', '.', '_')]).strip()
-        file_path = PATIENT_RECORDS_DIR / f"{safe_filename}.json"
-        
-        with open(file_path, 'w', encoding='utf-8') as outfile:
-            json.dump(patient_data, outfile, ensure_ascii=False, indent=2)
-        
-        count += 1
-        if count % 100 == 0:
-            print(f"已处理 {count}/{len(grouped)} 条记录...")
+    with PatientWriter(compact=compact, store=store) as writer:
+        for reg_id, records in grouped.items():
+            patient_data = profiling.timed("build_patient", build_patient_data, reg_id, records)
+            
+            if patient_data["程控次数"] > 1:
+                multi_visit_count += 1
+            
+            writer.submit(patient_data)
+            
+            count += 1
+            if count % 100 == 0:
+                print(f"已处理 {count}/{len(grouped)} 条记录...")
     
+    removed = remove_stale_patients(grouped, store)
+    if store is not None:
+        store.commit()
+
+    print(f"多次程控患者数: {multi_visit_count}")
+    print(f"已拆分 {count} 条患者记录至: {PATIENT_RECORDS_DIR}")
+    print(f"写入 {writer.written} 位患者，内容未变跳过 {writer.skipped} 位")
+    if removed:
+        print(f"删除 {removed} 位已不存在的患者的记录文件")
+    return writer.written, writer.skipped
+
+
+class SpillGrouper:
+    """
+    外存分组：记录以紧凑 JSON（字节）的形式缓存在内存中，超过内存预算时按 (登记号, 序号) 排序溢写为有序段，
+    最后多路归并，逐个患者产出记录。序号保证同一患者的记录顺序与输入顺序一致
+    """
+
+    def __init__(self, memory_budget=GROUPING_MEMORY_BUDGET, spill_dir=SPILL_DIR):
+        self.memory_budget = memory_budget
+        self.spill_dir = Path(spill_dir)
+        self._tmp = None
+        self._buffer = []  # [(登记号, 序号, 记录 JSON)]
+        self._buffer_bytes = 0
+        self._runs = []
+        self._seq = 0
+
+    def add(self, reg_id, record):
+        line = dumps_json(record)
+        self._buffer.append((reg_id, self._seq, line))
+        self._seq += 1
+        self._buffer_bytes += sys.getsizeof(line)
+        if self._buffer_bytes >= self.memory_budget:
+            self._spill()
+
+    def _spill(self):
+        if self._tmp is None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            self._tmp = tempfile.TemporaryDirectory(prefix="group-", dir=self.spill_dir)
+        self._buffer.sort(key=lambda item: item[:2])
+        run_path = Path(self._tmp.name) / f"run-{len(self._runs):05d}.jsonl"
+        # 紧凑 JSON 中的换行与制表符都已转义，每条记录占一行
+        with open(run_path, "wb") as f:
+            for reg_id, seq, line in self._buffer:
+                f.write(b"%s\t%d\t%s\n" % (dumps_json(reg_id), seq, line))
+        self._runs.append(run_path)
+        self._buffer = []
+        self._buffer_bytes = 0
+
+    @staticmethod
+    def _read_run(run_path):
+        with open(run_path, "rb") as f:
+            for row in f:
+                reg_id, seq, line = row.rstrip(b"\n").split(b"\t", 2)
+                yield loads_json(reg_id), int(seq), line
+
+    @property
+    def spilled_runs(self):
+        return len(self._runs)
+
+    def groups(self):
+        """按登记号产出 (登记号, 记录列表)"""
+        self._buffer.sort(key=lambda item: item[:2])
+        sources = [self._read_run(p) for p in self._runs] + [iter(self._buffer)]
+        merged = heapq.merge(*sources, key=lambda item: item[:2])
+        try:
+            for reg_id, items in groupby(merged, key=lambda item: item[0]):
+                yield reg_id, [loads_json(line) for _, _, line in items]
+        finally:
+            self.close()
+
+    def close(self):
+        self._buffer = []
+        if self._tmp is not None:
+            self._tmp.cleanup()
+            self._tmp = None
+
+
+def process_records_streaming(records, memory_budget=GROUPING_MEMORY_BUDGET,
+                              compact: bool = PATIENT_JSON_COMPACT, store=None):
+    """
+    流式管道处理：逐条接收提取记录，按登记号外存分组后逐个患者写出
+    内存占用由 memory_budget 决定，与记录总数无关
+    store: 可选的队列数据库，写入同一批患者；本次未出现的患者的文件与数据库行会被删除
+    返回每条有效记录的最小摘要（路径、文件名、姓名、登记号），供建立文件索引
+    """
+    PATIENT_RECORDS_DIR.mkdir(parents=True, exist_ok=True)
+    grouper = SpillGrouper(memory_budget)
+    summaries = []
+    total = invalid_count = 0
+
+    for record in records:
+        total += 1
+        if not is_valid_record(record):
+            invalid_count += 1
+            continue
+        header = record.get("header", {})
+        reg_id = header.get("登记号", "")
+        summaries.append({
+            "meta": {"filename": record["meta"].get("filename", ""), "path": record["meta"].get("path", "")},
+            "header": {"姓名": header.get("姓名", ""), "登记号": reg_id},
+        })
+        if reg_id:
+            grouper.add(reg_id, record)
+
+    print(f"总记录数: {total}")
+    print(f"过滤脏数据: {invalid_count}条")
+    if grouper.spilled_runs:
+        print(f"超出内存预算，已溢写 {grouper.spilled_runs} 个有序段")
+
+    count = 0
+    multi_visit_count = 0
+    seen_ids = set()
+    with PatientWriter(compact=compact, store=store) as writer:
+        for reg_id, patient_records in grouper.groups():
+            seen_ids.add(reg_id)
+            patient_data = profiling.timed("build_patient", build_patient_data, reg_id, patient_records)
+            if patient_data["程控次数"] > 1:
+                multi_visit_count += 1
+            writer.submit(patient_data)
+            count += 1
+            if count % 100 == 0:
+                print(f"已处理 {count} 位患者...")
+
+    removed = remove_stale_patients(seen_ids, store)
+    if store is not None:
+        store.commit()
+
+    print(f"唯一患者数（按登记号）: {count}")
     print(f"多次程控患者数: {multi_visit_count}")
     print(f"已拆分 {count} 条患者记录至: {PATIENT_RECORDS_DIR}")
+    print(f"写入 {writer.written} 位患者，内容未变跳过 {writer.skipped} 位")
+    if removed:
+        print(f"删除 {removed} 位已不存在的患者的记录文件")
+    return summaries
@@ -6,42 +6,178 @@ Excel 文件处理器模块
 import xlrd
 import openpyxl
 
+from core.utils import clean_value
+from core.cell_index import SheetIndex
+from core.xlsx_stream import read_active_sheet
 
-class XlsHandler:
+
+class SheetGrid:
+    """
+    首个工作表的内存快照
+    一次性物化原始值、清理后的值 (clean_value) 和蓝色标签掩码，
+    之后所有单元格访问都是纯列表索引
+    """
+
+    __slots__ = ("nrows", "ncols", "values", "cleaned", "blue", "empty")
+
+    def __init__(self, values, blue, nrows, ncols, empty=""):
+        self.nrows = nrows
+        self.ncols = ncols
+        self.values = values
+        self.cleaned = [[clean_value(v) for v in row] for row in values]
+        self.blue = blue
+        self.empty = empty  # 越界访问时返回的值，与原处理器保持一致
+
+    def get_value(self, r, c):
+        if r < self.nrows and c < self.ncols:
+            return self.values[r][c]
+        return self.empty
+
+    def get_clean_value(self, r, c):
+        if r < self.nrows and c < self.ncols:
+            return self.cleaned[r][c]
+        return ""
+
+    def is_blue(self, r, c):
+        if r < self.nrows and c < self.ncols:
+            return bool(self.blue[r][c])
+        return False
+
+
+class BaseHandler:
+    """处理器公共接口：有快照时从快照读取，否则直接访问工作簿"""
+
+    grid = None
+    _index = None
+
+    @property
+    def index(self):
+        """单元格索引（首次访问时单次遍历建立）"""
+        if self._index is None:
+            self._index = SheetIndex(self)
+        return self._index
+
+    def get_cell_value(self, r, c):
+        if self.grid is not None:
+            return self.grid.get_value(r, c)
+        return self._read_value(r, c)
+
+    def get_clean_value(self, r, c):
+        if self.grid is not None:
+            return self.grid.get_clean_value(r, c)
+        return clean_value(self._read_value(r, c))
+
+    def is_blue_cell(self, r, c):
+        if self.grid is not None:
+            return self.grid.is_blue(r, c)
+        return self._read_blue(r, c)
+
+    def count_reads(self):
+        """
+        剖析用：在本实例上包装单元格访问方法，按方法计数读取次数
+        返回计数字典（随读取更新）；未调用时访问路径不变
+        """
+        counts = {}
+        for name in ("get_cell_value", "get_clean_value", "is_blue_cell"):
+            counts[name] = 0
+
+            def counted(r, c, _name=name, _read=getattr(self, name)):
+                counts[_name] += 1
+                return _read(r, c)
+            setattr(self, name, counted)
+        return counts
+
+
+class XlsHandler(BaseHandler):
     """处理旧版 .xls 格式文件"""
     
-    def __init__(self, filepath):
+    def __init__(self, filepath, snapshot=True):
         self.book = xlrd.open_workbook(filepath, formatting_info=True)
         self.sheet = self.book.sheet_by_index(0)
         self.nrows = self.sheet.nrows
         self.ncols = self.sheet.ncols
+        if snapshot:
+            self.grid = self._materialize()
 
-    def get_cell_value(self, r, c):
+    def _materialize(self):
+        blue_xf = {
+            i for i, xf in enumerate(self.book.xf_list)
+            if xf.background.pattern_colour_index == 31
+        }
+        values = [self.sheet.row_values(r) for r in range(self.nrows)]
+        blue = []
+        for r in range(self.nrows):
+            mask = bytearray(self.ncols)
+            for c in range(self.ncols):
+                if self.sheet.cell_xf_index(r, c) in blue_xf:
+                    mask[c] = 1
+            blue.append(mask)
+        return SheetGrid(values, blue, self.nrows, self.ncols, empty="")
+
+    def _read_value(self, r, c):
         return self.sheet.cell_value(r, c) if r < self.nrows and c < self.ncols else ""
 
-    def is_blue_cell(self, r, c):
+    def _read_blue(self, r, c):
         if r >= self.nrows or c >= self.ncols:
             return False
         xf_idx = self.sheet.cell_xf_index(r, c)
         return self.book.xf_list[xf_idx].background.pattern_colour_index == 31
 
 
-class XlsxHandler:
-    """处理新版 .xlsx 格式文件"""
+class XlsxHandler(BaseHandler):
+    """
+    处理新版 .xlsx 格式文件
+    streaming=True 时先用流式读取器直接构建快照，失败再回退到 openpyxl
+    """
     
-    def __init__(self, filepath):
+    def __init__(self, filepath, snapshot=True, streaming=False):
+        if streaming:
+            try:
+                values, blue, nrows, ncols = read_active_sheet(filepath)
+            except Exception:
+                pass  # 回退到 openpyxl 完整加载
+            else:
+                self.wb = self.sheet = None
+                self.nrows, self.ncols = nrows, ncols
+                self.grid = SheetGrid(values, blue, nrows, ncols, empty=None)
+                return
+
         self.wb = openpyxl.load_workbook(filepath, data_only=True)
         self.sheet = self.wb.active
         self.nrows = self.sheet.max_row
         self.ncols = self.sheet.max_column
+        if snapshot:
+            self.grid = self._materialize()
 
-    def get_cell_value(self, r, c):
+    def _materialize(self):
+        blue_fills = set()
+        for i, fill in enumerate(self.wb._fills):
+            try:
+                if fill.fgColor.type == "theme" and fill.fgColor.theme == 4:
+                    blue_fills.add(i)
+            except AttributeError:
+                continue
+
+        values = [[None] * self.ncols for _ in range(self.nrows)]
+        blue = [bytearray(self.ncols) for _ in range(self.nrows)]
+        # 只遍历实际存在的单元格，避免 sheet.cell() 为空位置创建新对象
+        for (row, col), cell in self.sheet._cells.items():
+            r, c = row - 1, col - 1
+            if r >= self.nrows or c >= self.ncols:
+                continue
+            values[r][c] = cell.value
+            style = cell._style  # 新建的空单元格尚无样式数组，即默认填充 0
+            if (style.fillId if style else 0) in blue_fills:
+                blue[r][c] = 1
+        return SheetGrid(values, blue, self.nrows, self.ncols, empty=None)
+
+    def _read_value(self, r, c):
         try:
             return self.sheet.cell(row=r + 1, column=c + 1).value
         except:
             return ""
 
-    def is_blue_cell(self, r, c):
+    def _read_blue(self, r, c):
         try:
             cell = self.sheet.cell(row=r + 1, column=c + 1)
             return cell.fill.fgColor.type == "theme" and cell.fill.fgColor.theme == 4
@@ -49,8 +185,12 @@ class XlsxHandler:
             return False
 
 
-def get_handler(filepath):
-    """根据文件扩展名返回对应的处理器"""
+def get_handler(filepath, snapshot=True, streaming=False):
+    """
+    根据文件扩展名返回对应的处理器
+    snapshot: 是否在加载后物化 SheetGrid 快照（False 时逐次访问工作簿）
+    streaming: .xlsx 是否使用流式读取器（低内存，失败自动回退 openpyxl）
+    """
     if filepath.lower().endswith(".xls"):
-        return XlsHandler(filepath)
-    return XlsxHandler(filepath)
+        return XlsHandler(filepath, snapshot=snapshot)
+    return XlsxHandler(filepath, snapshot=snapshot, streaming=streaming)
@@ -0,0 +1,424 @@
+"""
+本地 HTTP 接口模块（asyncio，仅标准库）
+GET /patients             患者索引：分页（offset/limit）、按关键字 q 及品牌/型号过滤
+GET /patients/{登记号}    单个患者的完整记录（patient_records 中的 JSON 原样返回）
+GET /其他路径             dashboard_ui 静态资源（含生成的 data/ 脚本），"/" 为 index.html
+
+患者文件经内存 LRU 读取，按 (mtime, 大小) 失效；索引在 patient_records 目录的 mtime 变化时
+增量刷新（患者文件都是写临时文件后原子替换，每次写出都会改变目录 mtime），只重新读取变化的文件
+所有响应带 ETag，支持 If-None-Match 返回 304；客户端接受 gzip 时压缩（压缩结果随缓存复用）
+"""
+
+import os
+import sys
+import gzip
+import asyncio
+import hashlib
+import mimetypes
+import threading
+from time import time_ns
+from collections import OrderedDict
+from email.utils import formatdate
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs, unquote
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import (
+    PROJECT_ROOT, PATIENT_RECORDS_DIR, API_HOST, API_PORT, API_CACHE_ENTRIES, API_PAGE_SIZE, API_MAX_PAGE_SIZE,
+    API_GZIP_MIN_BYTES
+)
+from core.grouping import patient_file_path
+from core.serialization import dumps_json, loads_json
+
+DASHBOARD_DIR = PROJECT_ROOT / "dashboard_ui"
+COMPRESSIBLE = ("text/", "application/json", "application/javascript")
+KEEP_ALIVE_TIMEOUT = 15  # 空闲长连接的超时秒数
+MAX_HEADER_LINES = 100
+
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class Payload:
+    """一个可发送的响应体：原始字节、ETag、内容类型，gzip 结果按需生成一次"""
+
+    __slots__ = ("body", "etag", "content_type", "_gzipped", "_lock")
+
+    def __init__(self, body, etag, content_type):
+        self.body = body
+        self.etag = etag
+        self.content_type = content_type
+        self._gzipped = None
+        self._lock = threading.Lock()
+
+    @property
+    def compressible(self):
+        return len(self.body) >= API_GZIP_MIN_BYTES and self.content_type.startswith(COMPRESSIBLE)
+
+    def gzipped(self):
+        with self._lock:
+            if self._gzipped is None:
+                self._gzipped = gzip.compress(self.body, compresslevel=6, mtime=0)
+            return self._gzipped
+
+
+def json_payload(data):
+    body = dumps_json(data)
+    return Payload(body, f'"{hashlib.md5(body).hexdigest()}"', "application/json; charset=utf-8")
+
+
+class FileCache:
+    """
+    文件内容 LRU：每次访问 stat 一次，(mtime, 大小) 未变时直接返回缓存的 Payload
+    线程安全（读文件在线程池中进行）
+    """
+
+    def __init__(self, max_entries=API_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # 路径 -> ((mtime_ns, size), Payload)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, content_type):
+        """返回文件的 Payload；文件不存在时返回 None"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.discard(path)
+            return None
+        sig = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == sig:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+        except OSError:
+            self.discard(path)
+            return None
+        payload = Payload(body, f'"{sig[1]:x}-{sig[0]:x}"', content_type)
+        with self._lock:
+            self._entries[path] = (sig, payload)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return payload
+
+    def discard(self, path):
+        with self._lock:
+            self._entries.pop(path, None)
+
+
+def index_row(data):
+    """患者 JSON -> 索引行（字段名与面板 data/index.js 一致）"""
+    records = data.get("程控记录") or [{}]
+    header = records[-1].get("header", {})
+    return {
+        "id": str(data.get("登记号", "")),
+        "name": data.get("姓名", ""),
+        "count": data.get("程控次数", 0),
+        "brand": header.get("品牌", ""),
+        "model": header.get("型号", ""),
+        "implant_date": header.get("植入日期", ""),
+        "last_visit": records[-1].get("footer_meta", {}).get("程控日期", "").strip(),
+    }
+
+
+class PatientIndex:
+    """
+    patient_records 的患者索引，按登记号排序
+    目录 mtime 未变时不重新扫描；扫描时只重新解析 (mtime, 大小) 变化的文件
+    """
+
+    def __init__(self, records_dir=PATIENT_RECORDS_DIR):
+        self.records_dir = Path(records_dir)
+        self.rows = []
+        self.version = 0  # 每次内容变化递增，用于缓存分页结果
+        self._files = {}  # 文件名 -> ((mtime_ns, size), 索引行)
+        self._dir_mtime = None
+        self._scanned_at = 0
+        self._lock = threading.Lock()
+
+    def _stale(self):
+        try:
+            dir_mtime = os.stat(self.records_dir).st_mtime_ns
+        except OSError:
+            return self._dir_mtime is not None, None
+        # 目录在上次扫描开始前后 1 秒内变化过时，同一时间戳内可能还有未看到的写入，再扫描一次
+        racy = self._dir_mtime is not None and self._dir_mtime >= self._scanned_at - 1_000_000_000
+        return dir_mtime != self._dir_mtime or racy, dir_mtime
+
+    def refresh(self):
+        """需要时重新扫描目录，返回当前索引行"""
+        with self._lock:
+            stale, dir_mtime = self._stale()
+            if not stale:
+                return self.rows
+            scanned_at = time_ns()
+            files = {}
+            changed = False
+            try:
+                entries = list(os.scandir(self.records_dir))
+            except OSError:
+                entries = []
+            for entry in entries:
+                # 隐藏的临时文件、processed_files.json 等不是患者文件
+                if not entry.name.endswith(".json") or entry.name.startswith("."):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                sig = (st.st_mtime_ns, st.st_size)
+                old = self._files.get(entry.name)
+                if old is not None and old[0] == sig:
+                    files[entry.name] = old
+                    continue
+                changed = True
+                try:
+                    with open(entry.path, "rb") as f:
+                        data = loads_json(f.read())
+                except (OSError, ValueError):
+                    continue
+                if isinstance(data, dict) and "程控记录" in data:
+                    files[entry.name] = (sig, index_row(data))
+            if changed or files.keys() != self._files.keys():
+                self._files = files
+                self.rows = sorted((row for _, row in files.values()), key=lambda row: row["id"])
+                self.version += 1
+            self._dir_mtime = dir_mtime
+            self._scanned_at = scanned_at
+            return self.rows
+
+    def contains(self, file_name):
+        """file_name 是否为患者文件（含程控记录的 JSON，不含 processed_files.json 等登记文件）"""
+        self.refresh()
+        with self._lock:
+            return file_name in self._files
+
+
+def filter_rows(rows, query):
+    """按查询参数过滤：q 在姓名/登记号/品牌/型号中做不区分大小写的子串匹配，brand/model 为子串匹配"""
+    term = query.get("q", "").strip().lower()
+    brand = query.get("brand", "").strip()
+    model = query.get("model", "").strip()
+    result = []
+    for row in rows:
+        if brand and brand not in row["brand"]:
+            continue
+        if model and model not in row["model"]:
+            continue
+        if term and not any(term in str(row[key]).lower() for key in ("name", "id", "brand", "model")):
+            continue
+        result.append(row)
+    return result
+
+
+def _int_param(query, name, default, lo, hi):
+    try:
+        value = int(query.get(name, default))
+    except ValueError:
+        raise ValueError(f"参数 {name} 应为整数")
+    return min(max(value, lo), hi)
+
+
+class PatientApi:
+    """路由与数据访问（与网络层分离，便于在线程池中执行）"""
+
+    def __init__(self, records_dir=PATIENT_RECORDS_DIR, static_dir=DASHBOARD_DIR,
+                 cache_entries=API_CACHE_ENTRIES):
+        self.static_dir = Path(static_dir).resolve()
+        self.files = FileCache(cache_entries)
+        self.index = PatientIndex(records_dir)
+        self._pages = OrderedDict()  # (索引版本, 查询) -> Payload
+        self._pages_lock = threading.Lock()
+
+    def handle(self, path, query):
+        """返回 (状态码, Payload)"""
+        if path == "/patients" or path == "/patients/":
+            return self.patients(query)
+        if path.startswith("/patients/"):
+            return self.patient(path[len("/patients/"):])
+        return self.static(path)
+
+    def patients(self, query):
+        try:
+            offset = _int_param(query, "offset", 0, 0, sys.maxsize)
+            limit = _int_param(query, "limit", API_PAGE_SIZE, 1, API_MAX_PAGE_SIZE)
+        except ValueError as e:
+            return 400, json_payload({"error": str(e)})
+        rows = self.index.refresh()
+        key = (self.index.version, tuple(sorted(query.items())), offset, limit)
+        with self._pages_lock:
+            payload = self._pages.get(key)
+            if payload is not None:
+                self._pages.move_to_end(key)
+                return 200, payload
+
+        matched = filter_rows(rows, query)
+        payload = json_payload({
+            "total": len(matched),
+            "offset": offset,
+            "limit": limit,
+            "items": matched[offset:offset + limit],
+        })
+        with self._pages_lock:
+            self._pages[key] = payload
+            while len(self._pages) > API_CACHE_ENTRIES:
+                self._pages.popitem(last=False)
+        return 200, payload
+
+    def patient(self, reg_id):
+        reg_id = reg_id.strip("/")
+        if not reg_id:
+            return 404, json_payload({"error": "缺少登记号"})
+        file_path = patient_file_path(reg_id)
+        # 只提供索引中的患者文件：processed_files.json 等同目录文件含有全部报告路径，不对外提供
+        payload = None
+        if self.index.contains(file_path.name):
+            payload = self.files.get(str(file_path), "application/json; charset=utf-8")
+        if payload is None:
+            return 404, json_payload({"error": f"患者不存在: {reg_id}"})
+        return 200, payload
+
+    def static(self, path):
+        relative = path.lstrip("/") or "index.html"
+        target = (self.static_dir / relative).resolve()
+        # 不允许通过 .. 等访问 dashboard_ui 之外的文件（如患者 JSON 目录）
+        if self.static_dir not in target.parents or not target.is_file():
+            return 404, json_payload({"error": "Not Found"})
+        content_type = mimetypes.guess_type(target.name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        payload = self.files.get(str(target), content_type)
+        if payload is None:
+            return 404, json_payload({"error": "Not Found"})
+        return 200, payload
+
+
+async def _read_request(reader):
+    """读取请求行与请求头，连接关闭时返回 None"""
+    line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+    if not line:
+        return None
+    # 按字节拆分：未编码的 UTF-8 路径中可能含有 latin-1 视为空白的字节
+    parts = line.rstrip(b"\r\n").split(b" ")
+    if len(parts) != 3:
+        raise ValueError("请求行格式错误")
+    method = parts[0].decode("ascii", "replace")
+    target = parts[1].decode("utf-8", "replace")
+    version = parts[2].decode("ascii", "replace")
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        raw = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+        if raw in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = raw.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise ValueError("请求头过多")
+    return method, target, version, headers
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def _response(status, payload, headers, method, keep_alive):
+    """组装响应字节：处理 If-None-Match 与 gzip"""
+    lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+             f"Date: {formatdate(usegmt=True)}",
+             "Server: pacemaker-dashboard",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    body = b""
+    if status == 200 and _etag_matches(headers.get("if-none-match"), payload.etag):
+        status = 304
+        lines[0] = f"HTTP/1.1 304 {STATUS_TEXT[304]}"
+    if status in (200, 304):
+        lines += [f"ETag: {payload.etag}", "Cache-Control: no-cache"]
+    if payload.compressible:
+        lines.append("Vary: Accept-Encoding")
+    if status != 304:
+        body = payload.body
+        if payload.compressible and "gzip" in headers.get("accept-encoding", ""):
+            body = payload.gzipped()
+            lines.append("Content-Encoding: gzip")
+        lines += [f"Content-Type: {payload.content_type}", f"Content-Length: {len(body)}"]
+    if method == "HEAD":
+        body = b""
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+class PatientServer:
+    """asyncio HTTP/1.1 服务（GET/HEAD，支持长连接）"""
+
+    def __init__(self, api=None, host=API_HOST, port=API_PORT):
+        self.api = api or PatientApi()
+        self.host = host
+        self.port = port
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except (asyncio.TimeoutError, ConnectionError):
+                    break
+                except ValueError as e:
+                    writer.write(_response(400, json_payload({"error": str(e)}), {}, "GET", False))
+                    break
+                if request is None:
+                    break
+                method, target, version, headers = request
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                if method not in ("GET", "HEAD"):
+                    status, payload = 405, json_payload({"error": "只支持 GET/HEAD"})
+                else:
+                    url = urlsplit(target)
+                    query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                    try:
+                        # 索引刷新、读文件、压缩都是阻塞操作，放到线程池中执行
+                        status, payload = await asyncio.to_thread(self.api.handle, unquote(url.path), query)
+                        if status == 200 and payload.compressible and "gzip" in headers.get("accept-encoding", ""):
+                            await asyncio.to_thread(payload.gzipped)
+                    except Exception as e:
+                        status, payload = 500, json_payload({"error": str(e)})
+                writer.write(_response(status, payload, headers, method, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self):
+        # 启动时建立一次索引，首个请求无需等待全量扫描
+        rows = await asyncio.to_thread(self.api.index.refresh)
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        print(f"已载入 {len(rows)} 位患者，服务地址: http://{self.host}:{self.port}/  （Ctrl+C 退出）")
+        async with server:
+            await server.serve_forever()
+
+
+def run_server(host=API_HOST, port=API_PORT):
+    """阻塞运行服务直到 Ctrl+C"""
+    try:
+        asyncio.run(PatientServer(host=host, port=port).serve())
+    except KeyboardInterrupt:
+        print()
+        print("服务已停止。")
@@ -0,0 +1,56 @@
+"""
+扫描清单模块
+对数据仓库只遍历一次，得到每个文件的路径、大小、修改时间和内容哈希；
+模板匹配、文件追踪和数据提取都使用这份内存清单，不再各自遍历目录
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.file_tracker import iter_repository_files, load_processed_files, scan_files
+
+# 清单行与匹配报告行使用相同的键，匹配后直接补充 Detected Brand 等列
+STATE_KEYS = {"Hash": "hash", "Size": "size", "Mtime": "mtime", "Inode": "inode"}
+
+
+def build_manifest(processed=None, hash_files=True):
+    """
+    扫描数据仓库，返回清单行列表（顺序与 os.walk 相同）
+    processed: 文件索引，stat 未变化的文件直接复用其中的哈希
+    hash_files: 为 False 时只遍历目录、不取 stat 与哈希（只做模板匹配时只需要文件名与路径）
+    """
+    files = list(iter_repository_files())
+    if not hash_files:
+        return [{"Filename": filename, "Full Path": full_path, "Rel Path": rel_path}
+                for full_path, filename, rel_path in files]
+    if processed is None:
+        processed = load_processed_files()
+    current = scan_files(files, processed)
+
+    manifest = []
+    for full_path, filename, rel_path in files:
+        state = current.get(rel_path)
+        if state is None:
+            continue  # 遍历后被删除或改名
+        row = {"Filename": filename, "Full Path": full_path, "Rel Path": rel_path}
+        for key, state_key in STATE_KEYS.items():
+            if state_key in state:
+                row[key] = state[state_key]
+        manifest.append(row)
+    return manifest
+
+
+def manifest_state(manifest):
+    """清单 -> {相对路径: 哈希与 stat 签名}，供 detect_changes / 文件索引使用"""
+    current = {}
+    for row in manifest:
+        current[row["Rel Path"]] = {
+            state_key: row[key] for key, state_key in STATE_KEYS.items() if key in row
+        }
+    return current
+
+
+def matched_rows(manifest):
+    """清单中匹配到模板的行"""
+    return [row for row in manifest if "Match" in row.get("Status", "")]
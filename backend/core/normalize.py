@@ -0,0 +1,177 @@
+"""
+数值规范化模块
+提取结果中的值都是字符串（"0.75"、"520"、"3.01V"、"<0.5"），每个使用方都要重新解析
+这里在 ETL 阶段把已知的测量字段一次性解析为带单位的数值，写入记录的 normalized 区域，原始字符串保持不变：
+    {"value": 0.5, "unit": "V", "raw": "<0.5", "op": "<"}
+解析器按 (区域, 标签) 分派，分派结果按标签缓存；相同的 (值, 单位) 也只解析一次
+（缓存中是不可变的元组，每次返回新的字典，各记录的 normalized 互不共享）
+"""
+
+import re
+import sys
+from datetime import datetime, timedelta
+from functools import lru_cache, wraps
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.grouping import parse_date
+
+# 表格列 -> 单位（threshold_tests / measurements 的标签为 "腔室_列名"）
+THRESHOLD_UNITS = {"阈值": "V", "脉宽": "ms", "感知": "mV", "阻抗": "Ω", "起搏比例": "%"}
+OUTPUT_UNITS = {"输出电压": "V", "输出脉宽": "ms", "感知灵敏度": "mV"}
+
+# 需要规范化的区域路径 -> 区域名
+SECTIONS = [
+    (("header",), "header"),
+    (("basic_params", "settings"), "settings"),
+    (("basic_params", "measurements"), "measurements"),
+    (("test_params", "battery_and_leads"), "battery_and_leads"),
+    (("test_params", "threshold_tests"), "threshold_tests"),
+    (("events_and_footer",), "events_and_footer"),
+    (("footer_meta",), "footer_meta"),
+]
+
+_NUMBER = re.compile(r"^(<=|>=|≤|≥|<|>)?\s*([-+]?\d+(?:\.\d+)?)\s*([A-Za-zΩμ%/次分秒]*)$")
+_LABEL_UNIT = re.compile(r"[（(]([^（()）]+)[)）]\s*$")
+_LIFE = re.compile(r"^(?:(<|>|≤|≥)\s*)?(?:(\d+(?:\.\d+)?)\s*年)?\s*(?:(\d+(?:\.\d+)?)\s*个?月)?$")
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)\s*(小时|h|分钟|分|min|秒|s|天|d)$", re.IGNORECASE)
+_DURATION_SECONDS = {"小时": 3600, "h": 3600, "分钟": 60, "分": 60, "min": 60, "秒": 1, "s": 1, "天": 86400, "d": 86400}
+_EXCEL_SERIAL = re.compile(r"^\d{5}(?:\.0+)?$")
+
+_FULLWIDTH = str.maketrans({"＜": "<", "＞": ">", "．": ".", "％": "%", "\u2126": "\u03a9"})  # 欧姆符号统一为希腊字母 Ω
+
+
+def _cached(maxsize):
+    """按参数缓存解析结果：缓存 (键, 值) 元组，调用时返回新的字典，修改一条记录不会影响其他记录"""
+    def decorate(func):
+        @lru_cache(maxsize=maxsize)
+        def cached(*args):
+            result = func(*args)
+            return None if result is None else tuple(result.items())
+
+        @wraps(func)
+        def wrapper(*args):
+            items = cached(*args)
+            return None if items is None else dict(items)
+        wrapper.cache_info = cached.cache_info
+        return wrapper
+    return decorate
+
+
+@_cached(maxsize=65536)
+def parse_number(raw, unit=""):
+    """"<0.5" / "3.01V" / "520" -> {"value", "unit", "raw"[, "op"]}；值中自带单位时优先使用"""
+    match = _NUMBER.match(raw.strip().translate(_FULLWIDTH))
+    if not match:
+        return None
+    op, number, suffix = match.groups()
+    result = {"value": float(number), "unit": suffix or unit, "raw": raw}
+    if op:
+        result["op"] = op
+    return result
+
+
+@_cached(maxsize=65536)
+def parse_count(raw, unit="次"):
+    result = parse_number(raw, unit)
+    if result is None or not result["value"].is_integer():
+        return result
+    return {**result, "value": int(result["value"])}
+
+
+@_cached(maxsize=16384)
+def parse_date_value(raw, unit="date"):
+    """中文/斜杠/点分隔日期或 Excel 日期序列号 -> ISO 日期"""
+    text = raw.strip()
+    if _EXCEL_SERIAL.match(text):
+        serial = float(text)
+        if 20000 < serial < 60000:
+            date = datetime(1899, 12, 30) + timedelta(days=serial)
+            return {"value": date.date().isoformat(), "unit": unit, "raw": raw}
+        return None
+    date = parse_date(text)
+    if date is None:
+        return None
+    return {"value": date.date().isoformat(), "unit": unit, "raw": raw}
+
+
+@_cached(maxsize=4096)
+def parse_life_years(raw, unit="年"):
+    """"7年" / "7年6个月" / "90个月" / "<3个月" -> 年数"""
+    match = _LIFE.match(raw.strip().translate(_FULLWIDTH))
+    if match and (match.group(2) or match.group(3)):
+        years = float(match.group(2) or 0) + float(match.group(3) or 0) / 12
+        result = {"value": round(years, 3), "unit": unit, "raw": raw}
+        if match.group(1):
+            result["op"] = match.group(1)
+        return result
+    return parse_number(raw, unit)
+
+
+@_cached(maxsize=4096)
+def parse_duration(raw, unit="s"):
+    """"2小时" / "35分钟" -> 秒"""
+    match = _DURATION.match(raw.strip())
+    if not match:
+        return None
+    number, suffix = match.groups()
+    return {"value": float(number) * _DURATION_SECONDS[suffix.lower()], "unit": unit, "raw": raw}
+
+
+def _resolve(section, label):
+    """(区域, 标签) -> (解析器, 默认单位)；不需要规范化时返回 None"""
+    if section in ("threshold_tests", "measurements"):
+        column = label.split("_", 1)[-1]
+        units = THRESHOLD_UNITS if section == "threshold_tests" else OUTPUT_UNITS
+        return (parse_number, units[column]) if column in units else None
+    if "日期" in label:
+        return parse_date_value, "date"
+    if "预估寿命" in label:
+        return parse_life_years, "年"
+    if label.startswith("持续"):
+        return parse_duration, "s"
+    match = _LABEL_UNIT.search(label)
+    if match:
+        return parse_number, match.group(1).strip()
+    if label.endswith("%"):
+        return parse_number, "%"
+    if label.endswith("次数"):
+        return parse_count, "次"
+    return None
+
+
+_dispatch = {}
+
+
+def parser_for(section, label):
+    """按标签缓存的分派表：每个 (区域, 标签) 只判断一次"""
+    key = (section, label)
+    if key not in _dispatch:
+        _dispatch[key] = _resolve(section, label)
+    return _dispatch[key]
+
+
+def normalize_record(record):
+    """为单条记录生成 normalized 区域（只含解析成功的字段），原地修改并返回记录"""
+    normalized = {}
+    for path, section in SECTIONS:
+        values = record
+        for key in path:
+            values = values.get(key) if isinstance(values, dict) else None
+        if not isinstance(values, dict):
+            continue
+        parsed = {}
+        for label, raw in values.items():
+            if not raw or not isinstance(raw, str):
+                continue
+            entry = parser_for(section, label)
+            if entry is None:
+                continue
+            parser, unit = entry
+            value = parser(raw, unit)
+            if value is not None:
+                parsed[label] = value
+        if parsed:
+            normalized[section] = parsed
+    record["normalized"] = normalized
+    return record
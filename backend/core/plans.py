@@ -0,0 +1,224 @@
+"""
+提取计划模块
+同一模板的报告版式基本固定：从已验证的文件中学习"结构单元格"（锚点、表头、行标题）
+和蓝色标签的坐标，之后同模板的文件先校验版式，通过则直接按坐标建立索引，
+不再建立完整的 SheetIndex（逐格分类、按标签建倒排表）并搜索关键字；版式有变化时自动回退通用扫描
+校验仍需遍历一次快照：只核对版式中的坐标无法发现新增的结构单元格或蓝色标签，而它们会改变提取结果。
+因此计划省去的是建索引与关键字搜索，整体仍与单元格数成正比，并非常数时间；
+每行非空单元格按需计算，只处理提取器实际读取的行
+"""
+
+import json
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import (
+    EXTRACTION_PLANS_FILE, PLAN_MIN_SAMPLES, PLAN_CANDIDATES,
+    ZAT_COL_HEADERS, ZAT_ROW_HEADERS,
+    Z2_COL_HEADERS, Z2_ROW_HEADERS,
+    Z3_COL_HEADERS, Z3_ROW_HEADERS
+)
+from core.cell_index import SheetIndex, ANCHOR_KEYWORDS, ANCHOR_COLS, AT_AF_KEYWORD
+from core.utils import clean_label
+
+# 提取器会查询的标签：按"包含"查找的列标题、按"相等"查找的行标题、前几列中的锚点关键字
+CONTAIN_TEXTS = list(dict.fromkeys(ZAT_COL_HEADERS + Z2_COL_HEADERS + Z3_COL_HEADERS))
+EQUAL_TEXTS = set(ZAT_ROW_HEADERS + Z2_ROW_HEADERS + Z3_ROW_HEADERS)
+ANCHOR_TEXTS = [kw for _, kw in ANCHOR_KEYWORDS] + [AT_AF_KEYWORD]
+
+_label_info = {}  # 原始字符串 -> (标签, 是否被表头查询命中, 是否含锚点关键字)
+_LABEL_INFO_LIMIT = 100000  # 缓存上限，避免长时间运行时随患者姓名等取值无限增长
+
+
+def _classify(label):
+    queried = label in EQUAL_TEXTS or any(t in label for t in CONTAIN_TEXTS)
+    anchor = any(k in label for k in ANCHOR_TEXTS)
+    return label, queried, anchor
+
+
+def _structural_label(raw, c):
+    """单元格是结构单元格时返回其标签，否则返回 None"""
+    if raw is None:
+        return None
+    if type(raw) is str:
+        info = _label_info.get(raw)
+        if info is None:
+            if len(_label_info) >= _LABEL_INFO_LIMIT:
+                _label_info.clear()
+            info = _label_info[raw] = _classify(clean_label(raw))
+    else:
+        info = _classify(clean_label(raw))
+    label, queried, anchor = info
+    if queried or (anchor and c < ANCHOR_COLS):
+        return label
+    return None
+
+
+def compile_layout(index):
+    """
+    从完整的 SheetIndex 提取版式：结构单元格 [(r, c, 标签)] 与蓝色单元格 [(r, c)]
+    只保存坐标与标签，可 JSON 序列化
+    """
+    structural = []
+    for label, positions in index.labels.items():
+        for r, c in positions:
+            if _structural_label(label, c) is not None:
+                structural.append([r, c, label])
+    structural.sort()
+    return {
+        "structural": structural,
+        "blue": [[r, c] for r, c in index.blue_cells],
+    }
+
+
+def verify_layout(grid, layout):
+    """
+    校验快照是否符合版式：结构单元格的坐标与标签完全一致、蓝色单元格完全一致
+    两者一致时，提取器的所有索引查询结果都与通用扫描相同
+    需要遍历全部单元格（版式之外多出的结构单元格也要发现），但每格只有一次缓存查询
+    """
+    expected = {(r, c): label for r, c, label in layout["structural"]}
+    found = 0
+    for r, row in enumerate(grid.values):
+        for c, raw in enumerate(row):
+            if raw is None:
+                continue
+            label = _structural_label(raw, c)
+            if label is None:
+                continue
+            if expected.get((r, c)) != label:
+                return False
+            found += 1
+    if found != len(expected):
+        return False
+
+    blue = []
+    for r, row in enumerate(grid.blue):
+        c = row.find(1)
+        while c != -1:
+            blue.append([r, c])
+            c = row.find(1, c + 1)
+    return blue == layout["blue"]
+
+
+class _RowCells:
+    """每行的非空单元格 [(c, 清理后的值), ...]，首次读取某行时计算"""
+
+    def __init__(self, cleaned):
+        self._cleaned = cleaned
+        self._rows = {}
+
+    def __len__(self):
+        return len(self._cleaned)
+
+    def __getitem__(self, r):
+        cells = self._rows.get(r)
+        if cells is None:
+            cells = self._rows[r] = [(c, v) for c, v in enumerate(self._cleaned[r]) if v]
+        return cells
+
+
+class PlannedIndex(SheetIndex):
+    """
+    按版式直接建立的索引
+    结构查询来自版式坐标；依赖单元格值的部分（每行非空单元格、下一个有数据的行）按需从快照计算
+    """
+
+    def __init__(self, handler, layout):
+        self._handler = handler
+        self._full = None
+        self.nrows = handler.nrows
+        self.ncols = handler.ncols
+        self.keyword_rows = {key: [] for key, _ in ANCHOR_KEYWORDS}
+        self.at_af_row = None
+        self.labels = {}
+        self.blue_cells = [tuple(p) for p in layout["blue"]]
+        self._containing = {text: [] for text in CONTAIN_TEXTS}
+
+        for r, c, label in layout["structural"]:
+            if label in EQUAL_TEXTS:
+                self.labels.setdefault(label, []).append((r, c))
+            for text in CONTAIN_TEXTS:
+                if text in label:
+                    self._containing[text].append((r, c))
+            if c < ANCHOR_COLS:
+                self._add_anchor(r, label)
+
+        self.row_cells = _RowCells(handler.grid.cleaned)
+
+    def next_nonempty_row(self, r):
+        for row in range(max(r, 0), self.nrows):
+            if self.row_cells[row]:
+                return row
+        return None
+
+    def _fallback(self):
+        # 查询了版式之外的标签：退回完整索引
+        if self._full is None:
+            self._full = SheetIndex(self._handler)
+        return self._full
+
+    def positions_containing(self, text):
+        if text in self._containing:
+            return self._containing[text]
+        return self._fallback().positions_containing(text)
+
+    def positions_equal(self, text):
+        if text in EQUAL_TEXTS:
+            return self.labels.get(text, [])
+        return self._fallback().positions_equal(text)
+
+
+def apply_plans(handler, layouts):
+    """依次尝试各版式，校验通过时为处理器装上 PlannedIndex 并返回 True"""
+    if handler.grid is None:
+        return False
+    for layout in layouts:
+        if verify_layout(handler.grid, layout):
+            handler._index = PlannedIndex(handler, layout)
+            return True
+    return False
+
+
+class PlanStore:
+    """
+    各模板的版式候选及出现次数，持久化为 JSON
+    同一版式出现 PLAN_MIN_SAMPLES 次后才作为计划使用；每个模板最多保留 PLAN_CANDIDATES 个候选
+    """
+
+    def __init__(self, version, path=EXTRACTION_PLANS_FILE):
+        self.path = Path(path)
+        self.version = version
+        self.templates = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            if data.get("version") == version:
+                self.templates = data.get("templates", {})
+
+    def active(self, template):
+        """模板已验证的版式（出现次数多的优先）"""
+        candidates = self.templates.get(template, [])
+        return [c["layout"] for c in candidates if c["count"] >= PLAN_MIN_SAMPLES]
+
+    def observe(self, template, layout):
+        """记录一次通用扫描得到的版式"""
+        candidates = self.templates.setdefault(template, [])
+        for candidate in candidates:
+            if candidate["layout"] == layout:
+                candidate["count"] += 1
+                break
+        else:
+            if len(candidates) >= PLAN_CANDIDATES:
+                candidates.pop()  # 淘汰出现次数最少的候选
+            candidates.append({"layout": layout, "count": 1})
+        candidates.sort(key=lambda c: -c["count"])
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "templates": self.templates}, f, ensure_ascii=False)
@@ -0,0 +1,181 @@
+"""
+性能剖析模块
+main.py --profile 时记录流水线各阶段耗时、主进程内的子步骤耗时，以及每个文件各提取步骤的耗时
+和单元格读取次数，汇总为按模板的统计表与最慢文件列表
+未启用时各计时点只多一次布尔判断，处理器的单元格访问路径不变
+"""
+
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+ENABLED = False
+
+# 单文件提取步骤（按执行顺序，用于报告列顺序）
+FILE_STEPS = ["load", "plan", "index", "kv", "table", "antitachy", "events", "footer", "layout"]
+
+_stages = []  # [(阶段名, 秒)]，按执行顺序
+_steps = defaultdict(lambda: [0.0, 0])  # 主进程子步骤 -> [累计秒数, 次数]（写文件线程也会计入）
+_files = []  # 每个被解析文件的剖析数据
+_lock = threading.Lock()
+_local = threading.local()  # current: 本线程正在提取的文件的剖析数据
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+def reset():
+    _stages.clear()
+    _steps.clear()
+    _files.clear()
+
+
+@contextmanager
+def stage(name):
+    """计时流水线的一个阶段"""
+    if not ENABLED:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        _stages.append((name, perf_counter() - start))
+
+
+def timed(step, func, *args, **kwargs):
+    """
+    计时调用 func：提取文件期间计入该文件的步骤，否则累计到主进程子步骤
+    未启用时直接调用
+    """
+    if not ENABLED:
+        return func(*args, **kwargs)
+    start = perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        elapsed = perf_counter() - start
+        current = getattr(_local, "current", None)
+        if current is not None:
+            current["steps"][step] = current["steps"].get(step, 0.0) + elapsed
+        else:
+            with _lock:
+                entry = _steps[step]
+                entry[0] += elapsed
+                entry[1] += 1
+
+
+def begin_file():
+    """开始剖析当前线程中的一个文件（提取子进程中调用，会同时启用剖析）"""
+    enable()
+    _local.current = {"start": perf_counter(), "steps": {}, "cells": 0}
+
+
+def watch_handler(handler):
+    """记录当前文件的工作表大小，并让处理器计数单元格读取"""
+    current = getattr(_local, "current", None)
+    if current is None:
+        return
+    current["cells"] = handler.nrows * handler.ncols
+    current["reads_of"] = handler.count_reads()
+
+
+def end_file():
+    """结束当前文件的剖析，返回可跨进程传递的剖析数据"""
+    current = _local.current
+    _local.current = None
+    reads = current.pop("reads_of", None)
+    return {
+        "seconds": perf_counter() - current.pop("start"),
+        "steps": current["steps"],
+        "cells": current["cells"],
+        "reads": sum(reads.values()) if reads else 0,
+    }
+
+
+def record_file(file, profile):
+    """主进程中登记一个文件的剖析数据（file 为扫描清单/匹配报告行）"""
+    if profile is None:
+        return
+    template = file.get("Matched Template", "N/A")
+    profile.update(filename=file["Filename"], template=template if template != "N/A" else "(未匹配)")
+    _files.append(profile)
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.1f}"
+
+
+def template_summary():
+    """按模板汇总：文件数、总耗时、平均/最大耗时、各步骤平均耗时、平均读取次数"""
+    groups = defaultdict(list)
+    for profile in _files:
+        groups[profile["template"]].append(profile)
+    rows = []
+    for template, profiles in groups.items():
+        n = len(profiles)
+        total = sum(p["seconds"] for p in profiles)
+        rows.append({
+            "template": template,
+            "files": n,
+            "seconds": total,
+            "mean": total / n,
+            "max": max(p["seconds"] for p in profiles),
+            "steps": {step: sum(p["steps"].get(step, 0.0) for p in profiles) / n for step in FILE_STEPS},
+            "reads": sum(p["reads"] for p in profiles) / n,
+            "cells": sum(p["cells"] for p in profiles) / n,
+        })
+    rows.sort(key=lambda row: -row["seconds"])
+    return rows
+
+
+def slowest_files(top):
+    return sorted(_files, key=lambda p: -p["seconds"])[:top]
+
+
+def print_report(top=20):
+    """打印阶段耗时、主进程子步骤、按模板汇总与最慢的 top 个文件"""
+    print("=" * 50)
+    print("性能剖析")
+    print("=" * 50)
+
+    if _stages:
+        total = sum(seconds for _, seconds in _stages) or 1
+        print(f"{'阶段':<16} {'耗时(s)':>9} {'占比':>7}")
+        for name, seconds in _stages:
+            print(f"{name:<16} {seconds:>9.2f} {seconds / total:>7.1%}")
+        print()
+
+    if _steps:
+        print(f"{'子步骤':<16} {'耗时(s)':>9} {'次数':>8} {'平均(ms)':>9}")
+        for name, (seconds, calls) in sorted(_steps.items(), key=lambda item: -item[1][0]):
+            print(f"{name:<16} {seconds:>9.2f} {calls:>8} {_ms(seconds / calls):>9}")
+        print("（write_patient 含 serialize，在线程池中进行，为各线程耗时之和）")
+        print()
+
+    if not _files:
+        print("本次没有解析文件（全部命中缓存或没有待提取文件），无单文件剖析数据。")
+        return
+
+    steps = [step for step in FILE_STEPS if any(step in p["steps"] for p in _files)]
+    print(f"按模板汇总（{len(_files)} 个解析文件，耗时单位 ms，步骤为每文件平均）")
+    header = f"{'模板':<28} {'文件':>6} {'合计(s)':>8} {'平均':>7} {'最大':>7}"
+    header += "".join(f" {step:>8}" for step in steps) + f" {'读取':>7} {'单元格':>7}"
+    print(header)
+    for row in template_summary():
+        line = (f"{row['template'][:28]:<28} {row['files']:>6} {row['seconds']:>8.2f} "
+                f"{_ms(row['mean']):>7} {_ms(row['max']):>7}")
+        line += "".join(f" {_ms(row['steps'][step]):>8}" for step in steps)
+        line += f" {row['reads']:>7.0f} {row['cells']:>7.0f}"
+        print(line)
+    print()
+
+    print(f"最慢的 {min(top, len(_files))} 个文件（ms）")
+    for profile in slowest_files(top):
+        slowest = max(profile["steps"].items(), key=lambda item: item[1], default=("-", 0.0))
+        print(f"{_ms(profile['seconds']):>8}  最慢步骤 {slowest[0]} {_ms(slowest[1])}  "
+              f"读取 {profile['reads']}  单元格 {profile['cells']}  "
+              f"{profile['template']}  {profile['filename']}")
@@ -0,0 +1,171 @@
+"""
+队列筛查模块
+把全部随访的导线、电池、AT/AF 负荷数值载入 NumPy 数组，按规则文件一次性批量筛查所有患者，
+输出带标记的患者列表供面板加载
+
+规则类型（data/screening_rules.json）：
+    range: 数值超出 [min, max]（inclusive 为 true 时边界值也算异常）；scope 为 latest 只看最近一次，any 看全部随访
+    delta: 相邻两次随访的变化超过 max_change（relative 为 true 时按比例）；direction 为 up / down / both
+    trend: 按随访日期回归的年变化率超过 max_slope 或低于 min_slope，至少 min_visits 次随访
+"""
+
+import os
+import json
+import time
+import sys
+from datetime import datetime
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from config import SCREENING_RULES_FILE, SCREENING_FILE, COHORT_DB_FILE
+from core.cohort_arrays import FIELD_SOURCES, load_cohort_arrays, last_per_patient, group_linear_fit
+
+RULE_TYPES = ("range", "delta", "trend")
+
+
+def load_rules(path=SCREENING_RULES_FILE):
+    """读取并校验筛查规则"""
+    with open(path, "r", encoding="utf-8") as f:
+        rules = json.load(f)["rules"]
+    for rule in rules:
+        rule_id = rule.get("id", "?")
+        if rule.get("type") not in RULE_TYPES:
+            raise ValueError(f"筛查规则 {rule_id}: 未知类型 {rule.get('type')}")
+        if rule.get("field") not in FIELD_SOURCES:
+            raise ValueError(f"筛查规则 {rule_id}: 未知字段 {rule.get('field')}")
+        rule.setdefault("label", rule_id)
+    return rules
+
+
+def _range_rule(arrays, rule):
+    values = arrays.fields[rule["field"]]
+    low, high = rule.get("min"), rule.get("max")
+    inclusive = rule.get("inclusive", False)
+    flagged = np.zeros(arrays.visit_count, dtype=bool)
+    if low is not None:
+        flagged |= (values <= low) if inclusive else (values < low)
+    if high is not None:
+        flagged |= (values >= high) if inclusive else (values > high)
+
+    if rule.get("scope", "latest") == "latest":
+        patients, rows = arrays.last_valid(values)
+        keep = flagged[rows]
+        return patients[keep], values[rows[keep]], rows[keep]
+    patients, rows = last_per_patient(arrays.pid, np.flatnonzero(flagged))
+    return patients, values[rows], rows
+
+
+def _delta_rule(arrays, rule):
+    values = arrays.fields[rule["field"]]
+    rows = np.flatnonzero(~np.isnan(values))
+    patients = arrays.pid[rows]
+    series = values[rows]
+    same = patients[1:] == patients[:-1]
+    change = series[1:] - series[:-1]
+    if rule.get("relative", False):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = change / np.abs(series[:-1])
+
+    limit = rule["max_change"]
+    direction = rule.get("direction", "both")
+    if direction == "up":
+        flagged = change > limit
+    elif direction == "down":
+        flagged = change < -limit
+    else:
+        flagged = np.abs(change) > limit
+    flagged &= same
+    if rule.get("scope", "any") == "latest":
+        # 只看每位患者最近的一对随访
+        flagged &= np.r_[patients[1:] != patients[:-1], True][1:]
+
+    # 第 k 对随访以较晚的 rows[k + 1] 记录
+    pair_rows = rows[1:]
+    hit = np.flatnonzero(flagged)
+    flagged_patients, last_rows = last_per_patient(arrays.pid, pair_rows[hit])
+    last_pairs = hit[np.searchsorted(pair_rows[hit], last_rows)]
+    return flagged_patients, change[last_pairs], last_rows
+
+
+def _trend_rule(arrays, rule):
+    values = arrays.fields[rule["field"]]
+    rows = np.flatnonzero(~np.isnan(values) & ~np.isnan(arrays.years))
+    slope, _, n, _ = group_linear_fit(arrays.pid[rows], arrays.years[rows], values[rows], arrays.patient_count)
+
+    flagged = n >= rule.get("min_visits", 3)
+    bound = np.zeros(arrays.patient_count, dtype=bool)
+    if rule.get("max_slope") is not None:
+        bound |= slope > rule["max_slope"]
+    if rule.get("min_slope") is not None:
+        bound |= slope < rule["min_slope"]
+    patients = np.flatnonzero(flagged & bound)
+
+    # 以参与回归的最近一次随访作为日期
+    last_patients, last_rows = last_per_patient(arrays.pid, rows)
+    row_of = np.full(arrays.patient_count, -1)
+    row_of[last_patients] = last_rows
+    return patients, slope[patients], row_of[patients]
+
+
+RULE_EVALUATORS = {"range": _range_rule, "delta": _delta_rule, "trend": _trend_rule}
+
+
+def _json_number(value):
+    value = float(value)
+    return round(value, 4) if np.isfinite(value) else None
+
+
+def screen_cohort(arrays, rules):
+    """
+    对全部患者批量执行筛查规则
+    返回 {"rules": [...含命中人数], "flags": {登记号: [{"rule", "value", "date"}]}}
+    """
+    flags = {}
+    summary = []
+    for rule in rules:
+        patients, values, rows = RULE_EVALUATORS[rule["type"]](arrays, rule)
+        summary.append({
+            "id": rule["id"], "label": rule["label"], "type": rule["type"],
+            "field": rule["field"], "count": int(len(patients)),
+        })
+        for patient, value, row in zip(patients.tolist(), values.tolist(), rows.tolist()):
+            flags.setdefault(arrays.reg_ids[patient], []).append({
+                "rule": rule["id"],
+                "value": _json_number(value),
+                "date": arrays.dates[row] if row >= 0 else None,
+            })
+    return {"rules": summary, "flags": dict(sorted(flags.items()))}
+
+
+def run_screening(rules_path=SCREENING_RULES_FILE, db_path=COHORT_DB_FILE, output=SCREENING_FILE):
+    """读取队列数据库与规则，批量筛查并写出结果 JSON"""
+    rules = load_rules(rules_path)
+    fields = sorted({rule["field"] for rule in rules})
+
+    start = time.perf_counter()
+    arrays = load_cohort_arrays(fields, db_path)
+    loaded = time.perf_counter()
+    result = screen_cohort(arrays, rules)
+    screened = time.perf_counter()
+
+    print(f"载入 {arrays.patient_count} 位患者的 {arrays.visit_count} 次随访，用时 {loaded - start:.2f} 秒")
+    print(f"执行 {len(rules)} 条筛查规则，用时 {(screened - loaded) * 1000:.1f} 毫秒")
+    for rule in result["rules"]:
+        print(f"  {rule['label']}: {rule['count']} 位患者")
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "patient_count": arrays.patient_count,
+        "visit_count": arrays.visit_count,
+        **result,
+    }
+    tmp_path = output.with_name(f".{output.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output)
+    print(f"标记患者 {len(result['flags'])} 位，结果已保存至: {output}")
+    return payload
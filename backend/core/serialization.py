@@ -0,0 +1,144 @@
+"""
+序列化模块
+患者文件、分组溢写段、提取缓存与 HTTP 接口共用的编码/解码：
+- JSON：安装 orjson 时使用 orjson（编码/解码快数倍，输出同为 UTF-8 标准 JSON），否则使用标准库 json；
+  pretty 为缩进 2 格，否则为不含空格的紧凑格式
+- 二进制：带格式头的压缩记录，供后端内部存储（提取缓存）使用；安装 msgpack 时载荷为 MessagePack，
+  否则为紧凑 JSON；安装 zstandard 时用 zstd 压缩，否则用 zlib（与 gzip 同为 deflate）
+  格式头记录了载荷与压缩方式，读取时不依赖写入时的配置
+面板读取的患者文件与面板数据始终为 JSON
+"""
+
+import sys
+import json
+import zlib
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import JSON_BACKEND
+
+try:
+    import orjson  # 可选：更快的 JSON 编码/解码
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack  # 可选：二进制格式的载荷
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard  # 可选：二进制格式的压缩
+except ImportError:
+    zstandard = None
+
+if JSON_BACKEND not in ("auto", "orjson", "json"):
+    raise ValueError(f"未知的 JSON_BACKEND: {JSON_BACKEND}")
+if JSON_BACKEND == "orjson" and orjson is None:
+    raise ImportError("JSON_BACKEND = 'orjson' 需要安装 orjson（pip install orjson）")
+
+USE_ORJSON = orjson is not None and JSON_BACKEND != "json"
+
+# 二进制格式头：魔数 + 载荷类型（m: MessagePack，j: JSON）+ 压缩方式（z: zstd，d: zlib）
+BINARY_MAGIC = b"\x89PMR"
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+if USE_ORJSON:
+    _PRETTY = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+    _COMPACT = orjson.OPT_NON_STR_KEYS
+
+
+def json_backend() -> str:
+    return "orjson" if USE_ORJSON else "json"
+
+
+def binary_codec() -> str:
+    """当前环境写二进制格式使用的载荷与压缩方式（如 msgpack+zstd）"""
+    return f"{'msgpack' if msgpack else 'json'}+{'zstd' if zstandard else 'zlib'}"
+
+
+def dumps_json(obj, pretty: bool = False) -> bytes:
+    """编码为 UTF-8 JSON 字节：pretty 时缩进 2 格，否则紧凑输出"""
+    if USE_ORJSON:
+        return orjson.dumps(obj, option=_PRETTY if pretty else _COMPACT)
+    if pretty:
+        text = json.dumps(obj, ensure_ascii=False, indent=2)
+    else:
+        text = json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+    return text.encode('utf-8')
+
+
+def loads_json(data):
+    """解码 JSON（bytes 或 str），格式错误时抛出 ValueError"""
+    if USE_ORJSON:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode('utf-8')
+    return json.loads(data)
+
+
+def dumps_binary(obj) -> bytes:
+    """编码为压缩的二进制记录"""
+    if msgpack is not None:
+        kind, payload = b"m", msgpack.packb(obj, use_bin_type=True)
+    else:
+        kind, payload = b"j", dumps_json(obj)
+    if zstandard is not None:
+        return BINARY_MAGIC + kind + b"z" + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+    return BINARY_MAGIC + kind + b"d" + zlib.compress(payload, ZLIB_LEVEL)
+
+
+def loads_binary(data: bytes):
+    """
+    解码 dumps_binary 的输出
+    格式头不符、数据损坏或缺少对应的库时抛出 ValueError
+    """
+    data = bytes(data)
+    if not data.startswith(BINARY_MAGIC) or len(data) < len(BINARY_MAGIC) + 2:
+        raise ValueError("不是二进制记录")
+    offset = len(BINARY_MAGIC)
+    kind, compression = data[offset:offset + 1], data[offset + 1:offset + 2]
+    body = data[offset + 2:]
+
+    if compression == b"z":
+        if zstandard is None:
+            raise ValueError("读取 zstd 压缩的记录需要安装 zstandard")
+        try:
+            payload = zstandard.ZstdDecompressor().decompress(body)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"zstd 解压失败: {e}") from e
+    elif compression == b"d":
+        try:
+            payload = zlib.decompress(body)
+        except zlib.error as e:
+            raise ValueError(f"zlib 解压失败: {e}") from e
+    else:
+        raise ValueError(f"未知的压缩方式: {compression!r}")
+
+    if kind == b"m":
+        if msgpack is None:
+            raise ValueError("读取 MessagePack 记录需要安装 msgpack")
+        try:
+            return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+        except Exception as e:
+            raise ValueError(f"MessagePack 解码失败: {e}") from e
+    if kind == b"j":
+        return loads_json(payload)
+    raise ValueError(f"未知的载荷类型: {kind!r}")
+
+
+def dumps(obj, fmt: str = "json") -> bytes:
+    """按存储格式编码：json（紧凑 JSON）或 binary"""
+    if fmt == "binary":
+        return dumps_binary(obj)
+    if fmt == "json":
+        return dumps_json(obj)
+    raise ValueError(f"未知的存储格式: {fmt}")
+
+
+def loads(data):
+    """解码 dumps 的输出：按格式头识别二进制记录，其余按 JSON 解码（兼容旧的 JSON 文本）"""
+    if isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:len(BINARY_MAGIC)]) == BINARY_MAGIC:
+        return loads_binary(data)
+    return loads_json(data)
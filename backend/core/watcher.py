@@ -0,0 +1,222 @@
+"""
+数据仓库监视模块
+监视 DATA_REPOSITORY 中报告文件的新增、修改、删除：Linux 上使用 inotify（ctypes 调用，无额外依赖），
+其他平台或 inotify 不可用时按 file_tracker 的 stat 签名轮询
+一批连续的保存在最后一次变化后静默 debounce 秒才交给调用方，持续变化时最多等待 max_delay 秒
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import DATA_REPOSITORY, WATCH_DEBOUNCE, WATCH_MAX_DELAY, WATCH_POLL_INTERVAL
+from core.file_tracker import walk_directory_tree, file_signature
+
+# inotify 事件掩码（linux/inotify.h）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def is_report_file(name):
+    """是否为需要处理的报告文件（Excel 打开时生成的 ~$ 锁文件除外）"""
+    return name.lower().endswith((".xls", ".xlsx")) and not name.startswith("~$")
+
+
+class InotifySource:
+    """inotify 事件源：递归监视目录树，新建的子目录自动加入监视"""
+
+    mode = "inotify"
+
+    def __init__(self, root):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify 仅在 Linux 上可用")
+        if not os.path.isdir(root):
+            raise OSError(errno.ENOENT, f"数据仓库不存在: {root}")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.root = os.fspath(root)
+        self.dirs = {}  # wd -> 目录路径
+        try:
+            self._add_tree(self.root)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def _add_tree(self, top):
+        for path, subdirs, _ in os.walk(top):
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOENT:
+                    continue  # 遍历期间被删除的目录
+                # ENOSPC：超出 fs.inotify.max_user_watches
+                raise OSError(err, f"无法监视目录 {path}: {os.strerror(err)}")
+            self.dirs[wd] = path
+
+    def read(self, timeout):
+        """等待至多 timeout 秒（None 为一直等待），返回发生变化的报告路径集合"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changes = set()
+        offset = 0
+        while offset < len(buf):
+            wd, mask, _, length = _EVENT.unpack_from(buf, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(buf[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                changes.add(self.root)  # 事件丢失：交给增量流程全量比对
+                continue
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            parent = self.dirs.get(wd)
+            if parent is None:
+                continue
+            path = os.path.join(parent, name) if name else parent
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # 新目录（或整体移入的目录）中可能已有报告
+                    self._add_tree(path)
+                    changes.add(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    changes.add(path)
+            elif mask & IN_DELETE_SELF:
+                changes.add(path)
+            elif is_report_file(name) and mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE):
+                changes.add(path)
+        return changes
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingSource:
+    """轮询事件源：定期遍历数据仓库，与上次的 stat 签名比较"""
+
+    mode = "polling"
+
+    def __init__(self, root, interval=WATCH_POLL_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        if not os.path.isdir(self.root):
+            return snapshot
+        for path, files in walk_directory_tree(self.root):
+            for name in files:
+                if not is_report_file(name):
+                    continue
+                full_path = os.path.join(path, name)
+                try:
+                    snapshot[full_path] = file_signature(full_path)
+                except OSError:
+                    continue  # 遍历后被删除
+        return snapshot
+
+    def read(self, timeout):
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        current = self._scan()
+        changes = {path for path, sig in current.items() if self.snapshot.get(path) != sig}
+        changes |= self.snapshot.keys() - current.keys()
+        self.snapshot = current
+        return changes
+
+    def close(self):
+        pass
+
+
+class RepositoryWatcher:
+    """
+    去抖后的变化批次：wait_for_changes() 阻塞到一批保存结束，返回其中的路径集合
+    use_inotify=False 或 inotify 不可用时使用轮询；运行中 inotify 出错（如新目录超出 max_user_watches）时
+    改为轮询，记录 fallback_reason，并把数据仓库根目录作为变化返回，由增量流程全量比对
+    """
+
+    def __init__(self, root=DATA_REPOSITORY, debounce=WATCH_DEBOUNCE, max_delay=WATCH_MAX_DELAY,
+                 poll_interval=WATCH_POLL_INTERVAL, use_inotify=True):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.max_delay = max(max_delay, debounce)
+        self.fallback_reason = None
+        self.source = None
+        if use_inotify:
+            try:
+                self.source = InotifySource(root)
+            except (OSError, AttributeError) as e:
+                self.fallback_reason = str(e)
+        if self.source is None:
+            self.source = PollingSource(root, poll_interval)
+
+    @property
+    def mode(self):
+        return self.source.mode
+
+    def wait_for_changes(self):
+        pending = set()
+        first = last = None
+        while True:
+            if pending:
+                now = time.monotonic()
+                deadline = min(last + self.debounce, first + self.max_delay)
+                if now >= deadline:
+                    return pending
+                timeout = deadline - now
+            else:
+                timeout = None
+            changes = self._read(timeout)
+            if changes:
+                now = time.monotonic()
+                pending |= changes
+                last = now
+                if first is None:
+                    first = now
+
+    def _read(self, timeout):
+        try:
+            return self.source.read(timeout)
+        except OSError as e:
+            if isinstance(self.source, PollingSource):
+                raise
+            self.fallback_reason = str(e)
+            self.source.close()
+            self.source = PollingSource(self.root, self.poll_interval)
+            # 出错前后的事件可能已丢失
+            return {os.fspath(self.root)}
+
+    def close(self):
+        self.source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,276 @@
+"""
+.xlsx 流式读取模块
+直接解析压缩包内的工作表 XML 与样式表，只保留单元格值和"蓝色标签"标记，
+不构建 openpyxl 的完整对象模型。结果与 openpyxl.load_workbook(data_only=True)
+的活动工作表一致；遇到无法处理的结构时抛出 StreamingUnsupported，由调用方回退
+"""
+
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+
+from openpyxl.styles.numbers import builtin_format_code, is_date_format, is_timedelta_format
+from openpyxl.utils.cell import coordinate_to_tuple, range_boundaries
+from openpyxl.utils.datetime import from_excel, from_ISO8601, CALENDAR_WINDOWS_1900, CALENDAR_MAC_1904
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+SHARED_STRINGS_CT = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+STYLES_PART = "xl/styles.xml"  # openpyxl 同样固定读取该路径
+
+SI_TAG = f"{{{MAIN_NS}}}si"
+T_TAG = f"{{{MAIN_NS}}}t"
+RUN_TAG = f"{{{MAIN_NS}}}r"
+ROW_TAG = f"{{{MAIN_NS}}}row"
+CELL_TAG = f"{{{MAIN_NS}}}c"
+VALUE_TAG = f"{{{MAIN_NS}}}v"
+INLINE_TAG = f"{{{MAIN_NS}}}is"
+MERGE_TAG = f"{{{MAIN_NS}}}mergeCell"
+HYPERLINK_TAG = f"{{{MAIN_NS}}}hyperlink"
+
+
+class StreamingUnsupported(Exception):
+    """工作簿包含流式读取器不处理的结构"""
+
+
+def _cast_number(value):
+    """与 openpyxl 相同：含小数点或指数时为 float，否则为 int"""
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+def _read_rels(archive, part):
+    """读取某个部件的关系表：rId -> (Type, 目标部件路径)"""
+    folder, name = posixpath.split(part)
+    rels_path = posixpath.join(folder, "_rels", name + ".rels")
+    if rels_path not in archive.namelist():
+        return {}
+    rels = {}
+    for rel in ET.fromstring(archive.read(rels_path)).iter(f"{{{PKG_REL_NS}}}Relationship"):
+        target = rel.get("Target", "")
+        if rel.get("TargetMode") == "External":
+            continue
+        if target.startswith("/"):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join(folder, target))
+        rels[rel.get("Id")] = (rel.get("Type", ""), target)
+    return rels
+
+
+def _find_workbook_part(archive):
+    for rel_type, target in _read_rels(archive, "").values():
+        if rel_type.endswith("/officeDocument"):
+            return target
+    return "xl/workbook.xml"
+
+
+def _find_shared_strings(archive):
+    types = ET.fromstring(archive.read("[Content_Types].xml"))
+    for override in types.iter(f"{{{CT_NS}}}Override"):
+        if override.get("ContentType") == SHARED_STRINGS_CT:
+            return override.get("PartName", "").lstrip("/")
+    return None
+
+
+def _is_blue_fill(fill):
+    """等价于 openpyxl 的 fill.fgColor.type == "theme" and fill.fgColor.theme == 4"""
+    pattern = fill.find(f"{{{MAIN_NS}}}patternFill")
+    if pattern is None:
+        return False
+    color = pattern.find(f"{{{MAIN_NS}}}fgColor")
+    if color is None or color.get("indexed") is not None or color.get("index") is not None:
+        return False
+    return color.get("theme") is not None and int(color.get("theme")) == 4
+
+
+def _load_styles(archive):
+    """
+    解析样式表，只取单元格样式的填充与数字格式
+    返回 (样式数, 蓝色样式集合, 默认填充是否蓝色, 日期样式集合, 时长样式集合)
+    """
+    if STYLES_PART not in archive.namelist():
+        raise StreamingUnsupported("缺少样式表")
+    root = ET.fromstring(archive.read(STYLES_PART))
+
+    custom = {}
+    num_fmts = root.find(f"{{{MAIN_NS}}}numFmts")
+    if num_fmts is not None:
+        for fmt in num_fmts.iter(f"{{{MAIN_NS}}}numFmt"):
+            custom[int(fmt.get("numFmtId"))] = fmt.get("formatCode")
+
+    blue_fills = set()
+    fills = root.find(f"{{{MAIN_NS}}}fills")
+    if fills is not None:
+        for i, fill in enumerate(fills.iter(f"{{{MAIN_NS}}}fill")):
+            if _is_blue_fill(fill):
+                blue_fills.add(i)
+
+    blue_styles, date_formats, timedelta_formats = set(), set(), set()
+    n_styles = 0
+    cell_xfs = root.find(f"{{{MAIN_NS}}}cellXfs")
+    if cell_xfs is not None:
+        for idx, xf in enumerate(cell_xfs.iter(f"{{{MAIN_NS}}}xf")):
+            n_styles += 1
+            if int(xf.get("fillId", 0)) in blue_fills:
+                blue_styles.add(idx)
+            num_fmt_id = int(xf.get("numFmtId", 0))
+            fmt = custom[num_fmt_id] if num_fmt_id in custom else builtin_format_code(num_fmt_id)
+            if is_date_format(fmt):
+                date_formats.add(idx)
+            if is_timedelta_format(fmt):
+                timedelta_formats.add(idx)
+    return n_styles, blue_styles, 0 in blue_fills, date_formats, timedelta_formats
+
+
+def _read_shared_strings(archive, part):
+    """共享字符串：拼接 si 下的 t 与各富文本段的 t（忽略注音），与 openpyxl 一致"""
+    strings = []
+    with archive.open(part) as src:
+        for _, element in ET.iterparse(src):
+            if element.tag == SI_TAG:
+                strings.append(_text_content(element).replace("x005F_", ""))
+                element.clear()
+    return strings
+
+
+def _text_content(node):
+    snippets = [child.text or "" for child in node.findall(T_TAG)]
+    for run in node.findall(RUN_TAG):
+        snippets.extend(t.text or "" for t in run.findall(T_TAG))
+    return "".join(snippets)
+
+
+def _active_sheet_part(archive, workbook_part):
+    """返回 (活动工作表部件路径, 日期纪元)"""
+    root = ET.fromstring(archive.read(workbook_part))
+    epoch = CALENDAR_WINDOWS_1900
+    props = root.find(f"{{{MAIN_NS}}}workbookPr")
+    if props is not None and props.get("date1904") in ("1", "true"):
+        epoch = CALENDAR_MAC_1904
+
+    active = 0
+    for view in root.iter(f"{{{MAIN_NS}}}workbookView"):
+        if view.get("activeTab") is not None:
+            active = int(view.get("activeTab"))
+            break
+
+    rels = _read_rels(archive, workbook_part)
+    sheets = []
+    for sheet in root.iter(f"{{{MAIN_NS}}}sheet"):
+        rel = rels.get(sheet.get(f"{{{REL_NS}}}id"))
+        if rel is None:
+            raise StreamingUnsupported("工作表缺少关系定义")
+        sheets.append(rel)
+    if not 0 <= active < len(sheets):
+        raise StreamingUnsupported("活动工作表索引越界")
+    rel_type, target = sheets[active]
+    if not rel_type.endswith("/worksheet"):
+        raise StreamingUnsupported("活动工作表不是普通工作表")
+    return target, epoch
+
+
+def read_active_sheet(filepath):
+    """流式读取活动工作表，返回 (values, blue, nrows, ncols)，供构建 SheetGrid"""
+    with zipfile.ZipFile(filepath) as archive:
+        workbook_part = _find_workbook_part(archive)
+        sheet_part, epoch = _active_sheet_part(archive, workbook_part)
+        for rel_type, _ in _read_rels(archive, sheet_part).values():
+            if rel_type.endswith("/comments"):
+                raise StreamingUnsupported("工作表包含批注")
+
+        n_styles, blue_styles, default_blue, date_formats, timedelta_formats = _load_styles(archive)
+        strings_part = _find_shared_strings(archive)
+        shared_strings = _read_shared_strings(archive, strings_part) if strings_part else []
+
+        cells = {}  # (row, col) -> (值, 是否蓝色)
+        merges = []
+        links = []
+        row_counter = 0
+        with archive.open(sheet_part) as src:
+            for _, element in ET.iterparse(src):
+                tag = element.tag
+                if tag == ROW_TAG:
+                    if "r" in element.attrib:
+                        row_number = float(element.get("r"))
+                        if not row_number.is_integer():
+                            raise StreamingUnsupported("行号不是整数")
+                        row_counter = int(row_number)
+                    else:
+                        row_counter += 1
+                    col_counter = 0
+                    for cell in element.iter(CELL_TAG):
+                        coordinate = cell.get("r")
+                        if coordinate:
+                            row, col = coordinate_to_tuple(coordinate)
+                            col_counter = col
+                        else:
+                            col_counter += 1
+                            row, col = row_counter, col_counter
+                        style_id = int(cell.get("s", 0) or 0)
+                        if style_id >= n_styles:
+                            raise StreamingUnsupported("样式索引越界")
+                        cells[row, col] = (
+                            _parse_value(cell, style_id, shared_strings, epoch, date_formats, timedelta_formats),
+                            style_id in blue_styles,
+                        )
+                    element.clear()
+                elif tag == MERGE_TAG:
+                    merges.append(element.get("ref"))
+                elif tag == HYPERLINK_TAG:
+                    links.append(element.get("ref"))
+
+    # 合并区域：左上角缺失时补空单元格，其余位置替换为无值、默认填充的 MergedCell
+    for ref in merges:
+        min_col, min_row, max_col, max_row = range_boundaries(ref)
+        cells.setdefault((min_row, min_col), (None, default_blue))
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                if (row, col) != (min_row, min_col):
+                    cells[row, col] = (None, default_blue)
+    # 超链接会让 openpyxl 在引用位置创建单元格
+    for ref in links:
+        min_col, min_row, max_col, max_row = range_boundaries(ref)
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                cells.setdefault((row, col), (None, default_blue))
+
+    nrows = max((row for row, _ in cells), default=1)
+    ncols = max((col for _, col in cells), default=1)
+    values = [[None] * ncols for _ in range(nrows)]
+    blue = [bytearray(ncols) for _ in range(nrows)]
+    for (row, col), (value, is_blue) in cells.items():
+        values[row - 1][col - 1] = value
+        if is_blue:
+            blue[row - 1][col - 1] = 1
+    return values, blue, nrows, ncols
+
+
+def _parse_value(cell, style_id, shared_strings, epoch, date_formats, timedelta_formats):
+    """按 openpyxl (data_only=True) 的规则解析单元格值"""
+    data_type = cell.get("t", "n")
+    if data_type == "inlineStr":
+        child = cell.find(INLINE_TAG)
+        return _text_content(child) if child is not None else None
+
+    value = cell.findtext(VALUE_TAG, None) or None
+    if value is None:
+        return None
+    if data_type == "n":
+        value = _cast_number(value)
+        if style_id in date_formats:
+            try:
+                return from_excel(value, epoch, timedelta=style_id in timedelta_formats)
+            except (OverflowError, ValueError):
+                return "#VALUE!"
+        return value
+    if data_type == "s":
+        return shared_strings[int(value)]
+    if data_type == "b":
+        return bool(int(value))
+    if data_type == "d":
+        return from_ISO8601(value)
+    return value
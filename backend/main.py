@@ -5,49 +5,315 @@ Pacemaker Dashboard Backend - 主入口
 用法:
     python main.py            # 全量处理
     python main.py --update   # 增量更新
+    python main.py -w 8       # 8 进程并行提取
+    python main.py --stream-xlsx  # .xlsx 使用流式低内存读取器
+    python main.py --no-cache     # 忽略提取缓存，重新解析全部文件
+    python main.py --no-report    # 不写出 matching_report.csv
+    python main.py --no-plans     # 不使用按模板学习的提取计划
+    python main.py --stream --memory-budget 64  # 流式处理，分组内存上限 64MB
+    python main.py --compact      # 患者 JSON 不缩进输出
+    python main.py --hash blake2b # 文件哈希使用 blake2b（旧的 MD5 索引仍可读取）
+    python main.py --no-cohort-db # 不更新队列数据库 cohort.sqlite
+    python main.py --screen       # 按 data/screening_rules.json 批量筛查全部患者（需要 numpy）
+    python main.py --forecast     # 批量预测全部患者的电池 ERI 日期（需要 numpy）
+    python main.py --profile      # 输出各阶段耗时、按模板汇总与最慢文件列表
+    python main.py --profile --profile-dump run.prof  # 同时保存主进程的 cProfile 数据
+    python main.py --watch        # 监视数据仓库，新报告落地后自动增量更新并刷新面板数据
+    python main.py --serve        # 启动本地 HTTP 接口（/patients、/patients/<登记号> 与面板页面）
 """
 
+import os
+import time
+import signal
 import argparse
+import cProfile
 import warnings
+import importlib.util
 import sys
 from pathlib import Path
 
 # 确保导入路径正确
 sys.path.insert(0, str(Path(__file__).parent))
 
-from scripts.match_templates import match_all_files
-from scripts.extract_data import extract_all_data
-from core.grouping import process_and_split_records
-from core.file_tracker import build_file_index
+from config import (
+    PROJECT_ROOT, DATA_REPOSITORY, WRITE_MATCHING_REPORT, GROUPING_MEMORY_BUDGET, PATIENT_JSON_COMPACT,
+    WRITE_COHORT_DB, WATCH_DEBOUNCE, API_HOST, API_PORT
+)
+from scripts.match_templates import match_all_files, match_manifest, update_matching_report
+from scripts.extract_data import extract_all_data, iter_extracted_data, print_extract_stats
+from core.grouping import (
+    process_and_split_records, process_records_streaming, update_patient_records,
+    find_registration_ids_by_paths
+)
+from core.file_tracker import (
+    build_file_index, detect_changes, load_processed_files, update_file_index, to_full_path,
+    set_hash_algorithm
+)
+from core.manifest import build_manifest, manifest_state, matched_rows
+from core.cohort_store import CohortStore
+from core import profiling
 
 
-def full_process():
-    """全量处理：匹配模板 + 提取数据 + 分组拆分"""
+def full_process(workers=1, handler_options=None, use_cache=True, write_report=WRITE_MATCHING_REPORT,
+                 use_plans=True, stream=False, memory_budget=GROUPING_MEMORY_BUDGET,
+                 compact=PATIENT_JSON_COMPACT, cohort_db=WRITE_COHORT_DB):
+    """
+    全量处理：扫描并匹配模板 + 提取数据 + 分组拆分
+    stream: 流式处理，提取记录逐批交给外存分组，内存占用不随报告总数增长
+    compact: 患者 JSON 不缩进输出
+    cohort_db: 同步写入队列数据库（未变化的患者跳过）
+    """
     print("=" * 50)
     print("Pacemaker Dashboard 后端数据处理")
     print("=" * 50)
     print()
     
-    print("[1/3] 匹配模板...")
-    match_all_files()
+    print("[1/3] 扫描数据仓库并匹配模板...")
+    with profiling.stage("scan_match"):
+        manifest = build_manifest()
+        match_all_files(manifest, write_report=write_report)
     print()
     
-    print("[2/3] 提取数据...")
-    data = extract_all_data()
-    print()
-    
-    print("[3/3] 按患者分组并拆分...")
-    process_and_split_records(data)
-    print()
+    if stream:
+        files = matched_rows(manifest)
+        print(f"[2/3] 流式提取 {len(files)} 个文件并按患者分组...")
+        stats = {}
+        records = iter_extracted_data(files, workers=workers, handler_options=handler_options,
+                                      use_cache=use_cache, use_plans=use_plans, stats=stats)
+        store = CohortStore() if cohort_db else None
+        try:
+            with profiling.stage("extract+group"):
+                data = process_records_streaming(records, memory_budget, compact=compact, store=store)
+        finally:
+            if store is not None:
+                store.close()
+        print_extract_stats(stats, use_cache, use_plans)
+        print()
+        print("[3/3] 患者文件已在流式分组中写出")
+        if store is not None:
+            print(store.summary())
+        print()
+    else:
+        print("[2/3] 提取数据...")
+        with profiling.stage("extract"):
+            data = extract_all_data(workers=workers, handler_options=handler_options, use_cache=use_cache,
+                                    files=matched_rows(manifest), use_plans=use_plans)
+        print()
+
+        print("[3/3] 按患者分组并拆分...")
+        store = CohortStore() if cohort_db else None
+        try:
+            with profiling.stage("group_write"):
+                process_and_split_records(data, compact=compact, store=store)
+        finally:
+            if store is not None:
+                store.close()
+        if store is not None:
+            print(store.summary())
+        print()
     
     # 建立文件索引（用于增量更新）
     print("建立文件索引...")
-    count = build_file_index()
+    with profiling.stage("file_index"):
+        count = build_file_index(data, manifest_state(manifest))
     print(f"文件索引已建立，共 {count} 个文件。")
     print()
     print("全量处理完成！")
 
 
+def incremental_process(workers=1, handler_options=None, use_cache=True, write_report=WRITE_MATCHING_REPORT,
+                        use_plans=True, compact=PATIENT_JSON_COMPACT, cohort_db=WRITE_COHORT_DB):
+    """增量处理：只提取新增/修改的文件，只重写受影响的患者"""
+    print("=" * 50)
+    print("Pacemaker Dashboard 增量更新")
+    print("=" * 50)
+    print()
+
+    print("[1/4] 检测文件变化...")
+    with profiling.stage("scan"):
+        processed = load_processed_files()
+    if not processed:
+        print("尚未建立文件索引，执行全量处理。")
+        print()
+        full_process(workers=workers, handler_options=handler_options, use_cache=use_cache,
+                     write_report=write_report, use_plans=use_plans, compact=compact,
+                     cohort_db=cohort_db)
+        return
+    with profiling.stage("scan"):
+        manifest = build_manifest(processed)
+        current = manifest_state(manifest)
+        new_files, modified_files, deleted_files = detect_changes(processed, current)
+    print(f"新增 {len(new_files)}，修改 {len(modified_files)}，删除 {len(deleted_files)}")
+    if not (new_files or modified_files or deleted_files):
+        print("没有需要处理的文件。")
+        # 仍然保存刷新后的 stat 签名，下次无需重新计算哈希
+        update_file_index(processed, [], [], [], current)
+        return
+    print()
+
+    changed = new_files + modified_files
+    changed_rel = {rel for rel, _, _ in changed}
+    changed_rows = [row for row in manifest if row["Rel Path"] in changed_rel]
+    removed_rel = [rel for rel, _, _ in modified_files] + deleted_files
+    removed_paths = {to_full_path(rel) for rel in removed_rel}
+
+    print("[2/4] 匹配变化的文件...")
+    with profiling.stage("match"):
+        match_manifest(changed_rows)
+        if write_report:
+            update_matching_report(changed_rows, removed_paths)
+    matched = matched_rows(changed_rows)
+    print(f"匹配成功 {len(matched)}/{len(changed_rows)}")
+    print()
+
+    print("[3/4] 提取变化的文件...")
+    with profiling.stage("extract"):
+        data = extract_all_data(workers=workers, handler_options=handler_options,
+                                use_cache=use_cache, files=matched, use_plans=use_plans)
+    print()
+
+    print("[4/4] 更新受影响的患者...")
+    # 旧记录所属患者：优先取文件索引中登记的登记号，旧索引缺少时扫描患者文件
+    affected_ids = set()
+    unknown = set()
+    for rel in removed_rel:
+        reg_id = processed.get(rel, {}).get("登记号")
+        if reg_id:
+            affected_ids.add(reg_id)
+        elif reg_id is None:
+            unknown.add(os.path.normpath(to_full_path(rel)))
+    if unknown:
+        affected_ids |= find_registration_ids_by_paths(unknown)
+    store = CohortStore() if cohort_db else None
+    try:
+        with profiling.stage("group_write"):
+            update_patient_records(data, removed_paths, affected_ids, compact=compact, store=store)
+    finally:
+        if store is not None:
+            store.close()
+    if store is not None:
+        print(store.summary())
+    print()
+
+    with profiling.stage("file_index"):
+        count = update_file_index(processed, changed, deleted_files, data, current)
+    print(f"文件索引已更新，共 {count} 个文件。")
+    print()
+    print("增量更新完成！")
+
+
+def load_dashboard_generator():
+    """加载 dashboard_ui/scripts/generate_data.py（面板数据生成脚本，不在 backend 包内）"""
+    path = PROJECT_ROOT / "dashboard_ui" / "scripts" / "generate_data.py"
+    spec = importlib.util.spec_from_file_location("generate_data", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def watch_process(workers=1, handler_options=None, use_cache=True, write_report=WRITE_MATCHING_REPORT,
+                  use_plans=True, compact=PATIENT_JSON_COMPACT, cohort_db=WRITE_COHORT_DB,
+                  debounce=WATCH_DEBOUNCE, polling=False):
+    """
+    监视模式：启动时先做一次增量更新，之后数据仓库中每批报告保存结束（去抖）后
+    只提取变化的文件、重写受影响的患者，并增量刷新面板数据（只重写这些患者所在的分块）
+    polling: 不使用 inotify，按 stat 签名轮询
+    """
+    from core.watcher import RepositoryWatcher
+
+    generate_data = load_dashboard_generator()
+    options = dict(workers=workers, handler_options=handler_options, use_cache=use_cache,
+                   write_report=write_report, use_plans=use_plans, compact=compact, cohort_db=cohort_db)
+
+    def refresh():
+        start = time.perf_counter()
+        try:
+            incremental_process(**options)
+            print()
+            generate_data.generate_bundle()
+        except Exception as e:
+            # 常驻进程不因单次失败退出（例如文件仍在写入），下一批变化时重试
+            print(f"处理失败: {e}")
+            return
+        print(f"本批处理用时 {time.perf_counter() - start:.2f} 秒")
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # 作为服务运行时由 SIGTERM 停止，与 Ctrl+C 一样正常退出
+    signal.signal(signal.SIGTERM, stop)
+
+    # 先开始监视再做首次更新，更新期间落地的报告不会遗漏
+    with RepositoryWatcher(debounce=debounce, use_inotify=not polling) as watcher:
+        if watcher.fallback_reason:
+            print(f"inotify 不可用（{watcher.fallback_reason}），改为轮询")
+        refresh()
+        print()
+        print(f"正在监视 {DATA_REPOSITORY}（{watcher.mode}），按 Ctrl+C 退出")
+        try:
+            while True:
+                mode = watcher.mode
+                changes = watcher.wait_for_changes()
+                print()
+                if watcher.mode != mode:
+                    print(f"inotify 失效（{watcher.fallback_reason}），改为轮询，本批全量比对")
+                names = sorted(os.path.basename(path) for path in changes)
+                shown = "、".join(names[:5]) + (f" 等 {len(names)} 个" if len(names) > 5 else "")
+                print(f"[{time.strftime('%H:%M:%S')}] 检测到变化: {shown}")
+                refresh()
+        except KeyboardInterrupt:
+            print()
+            print("已停止监视。")
+
+
+def run(args, parser, handler_options):
+    """按命令行参数运行对应的处理流程"""
+    write_report = WRITE_MATCHING_REPORT and not args.no_report
+    cohort_db = WRITE_COHORT_DB and not args.no_cohort_db
+    if args.serve:
+        from core.http_api import run_server
+        try:
+            run_server(host=args.host, port=args.port)
+        except OSError as e:
+            parser.error(f"无法监听 {args.host}:{args.port}（{e.strerror or e}）")
+    elif args.watch:
+        watch_process(workers=args.workers, handler_options=handler_options,
+                      use_cache=not args.no_cache, write_report=write_report,
+                      use_plans=not args.no_plans, compact=args.compact, cohort_db=cohort_db,
+                      debounce=args.debounce, polling=args.poll)
+    elif args.update:
+        incremental_process(workers=args.workers, handler_options=handler_options,
+                            use_cache=not args.no_cache, write_report=write_report,
+                            use_plans=not args.no_plans, compact=args.compact, cohort_db=cohort_db)
+    elif args.match:
+        match_all_files()
+    elif args.screen or args.forecast:
+        # numpy 只有队列分析需要，按需导入
+        try:
+            from core.screening import run_screening
+            from core.battery_forecast import run_battery_forecast
+        except ImportError as e:
+            parser.error(f"队列分析需要安装 numpy: pip install numpy（{e}）")
+        try:
+            if args.screen:
+                run_screening()
+            if args.forecast:
+                run_battery_forecast()
+        except FileNotFoundError as e:
+            parser.error(str(e))
+    elif args.extract:
+        with profiling.stage("extract"):
+            data = extract_all_data(workers=args.workers, handler_options=handler_options,
+                                    use_cache=not args.no_cache, use_plans=not args.no_plans)
+        print(f"提取了 {len(data)} 条记录")
+    else:
+        full_process(workers=args.workers, handler_options=handler_options,
+                     use_cache=not args.no_cache, write_report=write_report,
+                     use_plans=not args.no_plans, stream=args.stream,
+                     memory_budget=args.memory_budget * 1024 * 1024, compact=args.compact,
+                     cohort_db=cohort_db)
+
+
 def main():
     parser = argparse.ArgumentParser(description='Pacemaker Dashboard 后端数据处理')
     parser.add_argument('--update', '-u', action='store_true', 
@@ -56,22 +322,76 @@ def main():
                         help='仅运行模板匹配')
     parser.add_argument('--extract', '-e', action='store_true',
                         help='仅运行数据提取')
+    parser.add_argument('--screen', action='store_true',
+                        help='仅运行队列筛查（读取 cohort.sqlite，结果写入 analytics/screening.json）')
+    parser.add_argument('--forecast', action='store_true',
+                        help='仅运行电池耗竭预测（读取 cohort.sqlite，结果写入 analytics/battery_forecast.json）')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='数据提取的并行进程数（默认 1，即单进程）')
+    parser.add_argument('--stream-xlsx', action='store_true',
+                        help='.xlsx 使用流式读取器（更省内存，无法解析时自动回退 openpyxl）')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='不使用提取缓存，重新解析全部文件')
+    parser.add_argument('--stream', action='store_true',
+                        help='流式全量处理：边提取边分组，超出内存预算时溢写临时文件')
+    parser.add_argument('--memory-budget', type=int, default=GROUPING_MEMORY_BUDGET // (1024 * 1024),
+                        help='流式分组的内存预算（MB，默认 %(default)s）')
+    parser.add_argument('--compact', action=argparse.BooleanOptionalAction, default=PATIENT_JSON_COMPACT,
+                        help='患者 JSON 不缩进输出（文件更小）；--no-compact 缩进输出（默认取 config.PATIENT_JSON_COMPACT）')
+    parser.add_argument('--no-plans', action='store_true',
+                        help='不使用按模板学习的提取计划，全部文件走通用扫描')
+    parser.add_argument('--no-report', action='store_true',
+                        help='不写出匹配报告 CSV（流水线内部使用内存中的扫描清单）')
+    parser.add_argument('--hash', choices=['md5', 'blake2b', 'xxh3'],
+                        help='新计算的文件哈希使用的算法（默认取 config.HASH_ALGORITHM；xxh3 需安装 xxhash）')
+    parser.add_argument('--no-cohort-db', action='store_true',
+                        help='不更新队列数据库 patient_records/cohort.sqlite')
+    parser.add_argument('--watch', action='store_true',
+                        help='常驻监视数据仓库：新增/修改/删除报告后自动增量更新患者文件并刷新面板数据')
+    parser.add_argument('--poll', action='store_true',
+                        help='监视时不使用 inotify，按文件 stat 签名轮询（网络共享等 inotify 收不到事件的场景）')
+    parser.add_argument('--debounce', type=float, default=WATCH_DEBOUNCE,
+                        help='监视时最后一次文件变化后等待的秒数（默认 %(default)s）')
+    parser.add_argument('--serve', action='store_true',
+                        help='启动本地 HTTP 接口：/patients（分页、过滤）、/patients/<登记号> 与 dashboard_ui 静态页面')
+    parser.add_argument('--host', default=API_HOST,
+                        help='HTTP 接口监听地址（默认 %(default)s；病区共享时用 0.0.0.0，仅限可信内网）')
+    parser.add_argument('--port', type=int, default=API_PORT, help='HTTP 接口端口（默认 %(default)s）')
+    parser.add_argument('--profile', action='store_true',
+                        help='剖析本次运行：各阶段耗时、按模板汇总的提取步骤耗时与单元格读取次数、最慢文件列表')
+    parser.add_argument('--profile-top', type=int, default=20,
+                        help='剖析报告列出的最慢文件数（默认 %(default)s）')
+    parser.add_argument('--profile-dump', metavar='PATH',
+                        help='同时用 cProfile 剖析主进程并保存到 PATH（可用 pstats/snakeviz 查看；多进程提取时不含子进程）')
     
     args = parser.parse_args()
+    if args.hash:
+        try:
+            set_hash_algorithm(args.hash)
+        except ValueError as e:
+            parser.error(str(e))
+    handler_options = {"streaming": True} if args.stream_xlsx else None
     
+    if args.profile or args.profile_dump:
+        profiling.enable()
+    profiler = cProfile.Profile() if args.profile_dump else None
+
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
-        
-        if args.update:
-            print("增量更新模式暂时禁用，请使用全量处理。")
-            # TODO: 重构增量更新逻辑以适配新的内存管道
-        elif args.match:
-            match_all_files()
-        elif args.extract:
-            data = extract_all_data()
-            print(f"提取了 {len(data)} 条记录")
-        else:
-            full_process()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            run(args, parser, handler_options)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(args.profile_dump)
+
+    if profiling.ENABLED:
+        print()
+        profiling.print_report(top=args.profile_top)
+        if profiler is not None:
+            print(f"cProfile 数据已保存到: {args.profile_dump}")
 
 
 if __name__ == "__main__":
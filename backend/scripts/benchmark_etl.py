@@ -0,0 +1,243 @@
+"""
+ETL 端到端基准脚本
+在隔离的工作目录中按指定规模生成合成报告（scripts/generate_reports.py），复制当前代码后依次计时
+扫描与模板匹配、数据提取、分组写出、面板数据生成四个阶段，记录吞吐量与内存峰值，
+结果追加到 JSON 文件，便于比较不同提交的性能
+
+每个规模一个工作目录（<workdir>/<文件数>/，结构与项目根目录相同），生成的报告按参数复用；
+各阶段在子进程中运行，代码取自当前检出的版本，输出目录每次清空，提取不使用缓存
+
+用法:
+    python scripts/benchmark_etl.py                            # 1000 个文件
+    python scripts/benchmark_etl.py --sizes 1000 10000 50000 -w 8
+    python scripts/benchmark_etl.py --label "批量提取" --output results.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import subprocess
+import tempfile
+import warnings
+import contextlib
+import importlib.util
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource  # 仅 Unix；其他平台不记录内存峰值
+except ImportError:
+    resource = None
+
+# 添加 backend 目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import BACKEND_DIR, PROJECT_ROOT
+
+DEFAULT_WORKDIR = Path(tempfile.gettempdir()) / "pacemaker_etl_bench"
+DEFAULT_OUTPUT = PROJECT_ROOT / "benchmark_results.json"
+CORPUS_MARKER = "corpus.json"
+RESULT_PREFIX = "BENCHMARK_RESULT "
+
+
+# --- 子进程：在工作目录的代码副本中计时各阶段 ---
+
+def _peak_rss_mb():
+    """(本进程, 已结束子进程) 的常驻内存峰值（MB）"""
+    if resource is None:
+        return None, None
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # macOS 单位为字节，Linux 为 KB
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return round(own / 1024 / 1024, 1), round(children / 1024 / 1024, 1)
+
+
+def _stage(results, name, items, func, *args, **kwargs):
+    """运行一个阶段（屏蔽其输出），记录耗时、吞吐量与运行后的内存峰值"""
+    start = time.perf_counter()
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        value = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    count = items(value) if callable(items) else items
+    peak, peak_children = _peak_rss_mb()
+    results[name] = {
+        "seconds": round(elapsed, 3),
+        "items": count,
+        "per_second": round(count / elapsed, 1) if elapsed > 0 else None,
+        "peak_rss_mb": peak,
+        "peak_children_rss_mb": peak_children,
+    }
+    return value
+
+
+def run_stages(workers):
+    """在当前（工作目录中的）代码副本上依次运行流水线各阶段，返回各阶段结果"""
+    from config import WRITE_COHORT_DB, PATIENT_RECORDS_DIR
+    from scripts.match_templates import match_all_files
+    from scripts.extract_data import extract_all_data
+    from core.manifest import build_manifest, matched_rows
+    from core.grouping import process_and_split_records
+    from core.cohort_store import CohortStore
+
+    spec = importlib.util.spec_from_file_location(
+        "generate_data", PROJECT_ROOT / "dashboard_ui" / "scripts" / "generate_data.py")
+    generate_data = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(generate_data)
+
+    def group(data):
+        store = CohortStore() if WRITE_COHORT_DB else None
+        try:
+            process_and_split_records(data, store=store)
+        finally:
+            if store is not None:
+                store.close()
+
+    stages = {}
+    manifest = _stage(stages, "scan_match", len, lambda: match_all_files(build_manifest(), write_report=False))
+    files = matched_rows(manifest)
+    data = _stage(stages, "extract", len(files), extract_all_data,
+                  workers=workers, use_cache=False, files=files)
+    _stage(stages, "group", len(data), group, data)
+    patients = sum(1 for p in PATIENT_RECORDS_DIR.glob("*.json") if p.name != "processed_files.json")
+    _stage(stages, "bundle", patients, generate_data.generate_bundle, full=True)
+    return {"files": len(manifest), "matched": len(files), "patients": patients, "stages": stages}
+
+
+# --- 主进程：准备工作目录、调用子进程、汇总结果 ---
+
+def _git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_corpus(root, files, seed, xls_ratio, workers):
+    """生成（或复用）root/01_data_repository 下的合成报告，返回生成耗时（复用时为 None）"""
+    from scripts.generate_reports import generate_corpus
+
+    params = {"files": files, "seed": seed, "xls_ratio": xls_ratio}
+    marker = root / CORPUS_MARKER
+    corpus = root / "01_data_repository"
+    if marker.exists() and corpus.exists():
+        with open(marker, "r", encoding="utf-8") as f:
+            if json.load(f) == params:
+                return None
+
+    if corpus.exists():
+        shutil.rmtree(corpus)
+    start = time.perf_counter()
+    generate_corpus(corpus, files=files, seed=seed, xls_ratio=xls_ratio, workers=workers)
+    elapsed = time.perf_counter() - start
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump(params, f)
+    return round(elapsed, 2)
+
+
+def prepare_code(root):
+    """复制当前代码到工作目录，清空上次运行的输出"""
+    ignore = shutil.ignore_patterns("__pycache__")
+    for target in (root / "backend", root / "dashboard_ui", root / "patient_records"):
+        if target.exists():
+            shutil.rmtree(target)
+    shutil.copytree(BACKEND_DIR, root / "backend", ignore=ignore)
+    shutil.copytree(PROJECT_ROOT / "dashboard_ui" / "scripts", root / "dashboard_ui" / "scripts", ignore=ignore)
+
+
+def corpus_bytes(corpus):
+    return sum(p.stat().st_size for p in corpus.rglob("*") if p.is_file())
+
+
+def benchmark_size(workdir, files, seed, xls_ratio, workers):
+    root = workdir / str(files)
+    root.mkdir(parents=True, exist_ok=True)
+    print(f"[{files}] 准备合成报告...")
+    generated = prepare_corpus(root, files, seed, xls_ratio, workers)
+    print(f"[{files}] " + (f"生成用时 {generated:.1f} 秒" if generated is not None else "复用已生成的报告"))
+    prepare_code(root)
+
+    script = root / "backend" / "scripts" / Path(__file__).name
+    proc = subprocess.run([sys.executable, str(script), "--run-stages", "--workers", str(workers)],
+                          capture_output=True, text=True, encoding="utf-8")
+    lines = [line for line in proc.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"基准子进程失败（退出码 {proc.returncode}）:\n{proc.stderr[-2000:]}")
+
+    result = json.loads(lines[-1][len(RESULT_PREFIX):])
+    result["corpus_mb"] = round(corpus_bytes(root / "01_data_repository") / 1024 / 1024, 1)
+    result["generate_seconds"] = generated
+    result["total_seconds"] = round(sum(s["seconds"] for s in result["stages"].values()), 3)
+    return result
+
+
+def print_result(result):
+    print(f"  文件 {result['files']}（匹配 {result['matched']}，{result['corpus_mb']} MB），患者 {result['patients']}")
+    print(f"  {'阶段':<12} {'耗时(s)':>9} {'数量':>8} {'每秒':>10} {'内存峰值(MB)':>13}")
+    for name, stage in result["stages"].items():
+        peak = stage["peak_rss_mb"]
+        if stage["peak_children_rss_mb"]:
+            peak = f"{peak}/{stage['peak_children_rss_mb']}"
+        print(f"  {name:<12} {stage['seconds']:>9.2f} {stage['items']:>8} {stage['per_second'] or 0:>10.1f} {str(peak):>13}")
+    print(f"  合计 {result['total_seconds']:.2f} 秒")
+
+
+def save_run(output, run):
+    """追加到结果文件（JSON 数组，每次运行一项）"""
+    runs = []
+    if output.exists():
+        with open(output, "r", encoding="utf-8") as f:
+            runs = json.load(f)
+    runs.append(run)
+    tmp_path = output.with_name(f".{output.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(runs, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ETL 端到端基准（合成报告）")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000],
+                        help="语料规模（文件数），可给多个，如 1000 10000 50000")
+    parser.add_argument("--workers", "-w", type=int, default=1, help="提取与生成的并行进程数（默认 1）")
+    parser.add_argument("--seed", type=int, default=7, help="合成报告随机种子")
+    parser.add_argument("--xls-ratio", type=float, default=0.5, help=".xls 文件所占比例（默认 %(default)s）")
+    parser.add_argument("--workdir", type=Path, default=DEFAULT_WORKDIR, help="工作目录（默认 %(default)s）")
+    parser.add_argument("--output", "-o", type=Path, default=DEFAULT_OUTPUT, help="结果文件（默认 %(default)s）")
+    parser.add_argument("--label", default="", help="本次运行的说明，写入结果文件")
+    parser.add_argument("--run-stages", action="store_true", help=argparse.SUPPRESS)  # 子进程入口
+    args = parser.parse_args()
+
+    if args.run_stages:
+        result = run_stages(args.workers)
+        print(RESULT_PREFIX + json.dumps(result, ensure_ascii=False))
+        return
+
+    run = {
+        "label": args.label,
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "workers": args.workers,
+        "results": [],
+    }
+    for files in args.sizes:
+        result = benchmark_size(args.workdir, files, args.seed, args.xls_ratio, args.workers)
+        print_result(result)
+        run["results"].append(result)
+    save_run(args.output, run)
+    print(f"结果已追加到: {args.output}")
+
+
+if __name__ == "__main__":
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        main()
@@ -0,0 +1,163 @@
+"""
+处理器基准脚本
+逐文件对比直接访问工作簿与 SheetGrid 快照两种模式的单元格访问开销，
+以及 .xlsx 的 openpyxl 完整加载与流式读取器的加载耗时和内存峰值
+
+用法:
+    python scripts/benchmark_handlers.py                # 使用匹配报告中的文件
+    python scripts/benchmark_handlers.py a.xlsx b.xls   # 指定文件
+"""
+
+import os
+import csv
+import time
+import tracemalloc
+import warnings
+import sys
+from pathlib import Path
+
+# 添加 backend 目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import MATCHING_REPORT_FILE
+from core.handlers import get_handler
+from core.cell_index import SheetIndex
+from core.extractors import extract_sections
+
+
+class CountingHandler:
+    """包装处理器，统计单元格访问次数"""
+
+    def __init__(self, handler):
+        self._handler = handler
+        self.nrows = handler.nrows
+        self.ncols = handler.ncols
+        self.reads = 0
+
+    @property
+    def grid(self):
+        return self._handler.grid
+
+    @property
+    def index(self):
+        if self._handler._index is None:
+            self._handler._index = SheetIndex(self)  # 建索引时的访问同样计数
+        return self._handler._index
+
+    def get_cell_value(self, r, c):
+        self.reads += 1
+        return self._handler.get_cell_value(r, c)
+
+    def get_clean_value(self, r, c):
+        self.reads += 1
+        return self._handler.get_clean_value(r, c)
+
+    def is_blue_cell(self, r, c):
+        self.reads += 1
+        return self._handler.is_blue_cell(r, c)
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _list_files():
+    if len(sys.argv) > 1:
+        return [(p, os.path.basename(p)) for p in sys.argv[1:]]
+    if not MATCHING_REPORT_FILE.exists():
+        print(f"错误: 匹配报告不存在 ({MATCHING_REPORT_FILE})")
+        return []
+    with open(MATCHING_REPORT_FILE, "r", encoding="utf-8-sig") as f:
+        return [
+            (r["Full Path"], r["Filename"]) for r in csv.DictReader(f)
+            if "Match" in r["Status"] and not r["Filename"].startswith("~$")
+        ]
+
+
+def benchmark_file(filepath):
+    """返回单文件的访问次数与各阶段耗时（秒）"""
+    handler = get_handler(filepath, snapshot=False)
+    counting = CountingHandler(handler)
+    direct, t_direct = _timed(extract_sections, counting)
+
+    grid, t_build = _timed(handler._materialize)
+    handler.grid = grid
+    handler._index = None
+    snapshot, t_grid = _timed(extract_sections, handler)
+    return {
+        "reads": counting.reads,
+        "direct_access": t_direct,
+        "grid_build": t_build,
+        "grid_access": t_grid,
+        "identical": direct == snapshot,
+    }
+
+
+def benchmark_reader(filepath):
+    """对比 .xlsx 两种读取方式的加载耗时（秒）与 Python 内存峰值（字节）"""
+    results = {}
+    for name, streaming in (("openpyxl", False), ("streaming", True)):
+        tracemalloc.start()
+        handler, elapsed = _timed(get_handler, filepath, streaming=streaming)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = (elapsed, peak, handler.grid)
+    full, stream = results["openpyxl"][2], results["streaming"][2]
+    identical = full.values == stream.values and full.blue == stream.blue
+    return results["openpyxl"][:2], results["streaming"][:2], identical
+
+
+def main():
+    files = _list_files()
+    if not files:
+        return
+
+    print(f"{'文件':<40} {'访问次数':>8} {'直接访问(ms)':>12} {'快照构建(ms)':>12} {'快照访问(ms)':>12} 一致")
+    totals = {"direct_access": 0.0, "grid_build": 0.0, "grid_access": 0.0}
+    mismatches = 0
+    for filepath, filename in files:
+        res = benchmark_file(filepath)
+        for key in totals:
+            totals[key] += res[key]
+        if not res["identical"]:
+            mismatches += 1
+        print(
+            f"{filename[:40]:<40} {res['reads']:>8} "
+            f"{res['direct_access'] * 1000:>12.2f} {res['grid_build'] * 1000:>12.2f} "
+            f"{res['grid_access'] * 1000:>12.2f} {'是' if res['identical'] else '否'}"
+        )
+
+    grid_total = totals["grid_build"] + totals["grid_access"]
+    print()
+    print(f"共 {len(files)} 个文件，输出不一致: {mismatches}")
+    print(f"直接访问合计: {totals['direct_access']:.3f}s")
+    print(f"快照合计 (构建+访问): {grid_total:.3f}s")
+    if grid_total > 0:
+        print(f"单元格访问开销降低: {totals['direct_access'] / grid_total:.1f}x")
+
+    xlsx_files = [p for p, _ in files if p.lower().endswith(".xlsx")]
+    if not xlsx_files:
+        return
+    print()
+    print(f"{'文件':<40} {'openpyxl(ms)':>12} {'峰值(KB)':>10} {'流式(ms)':>10} {'峰值(KB)':>10} 一致")
+    load_totals = [0.0, 0, 0.0, 0]
+    for filepath in xlsx_files:
+        (t_full, m_full), (t_stream, m_stream), identical = benchmark_reader(filepath)
+        load_totals[0] += t_full
+        load_totals[1] = max(load_totals[1], m_full)
+        load_totals[2] += t_stream
+        load_totals[3] = max(load_totals[3], m_stream)
+        print(
+            f"{os.path.basename(filepath)[:40]:<40} {t_full * 1000:>12.2f} {m_full / 1024:>10.0f} "
+            f"{t_stream * 1000:>10.2f} {m_stream / 1024:>10.0f} {'是' if identical else '否'}"
+        )
+    print()
+    print(f"加载合计: openpyxl {load_totals[0]:.3f}s / 流式 {load_totals[2]:.3f}s")
+    print(f"单文件内存峰值: openpyxl {load_totals[1] / 1024:.0f}KB / 流式 {load_totals[3] / 1024:.0f}KB")
+
+
+if __name__ == "__main__":
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        main()
@@ -0,0 +1,156 @@
+"""
+序列化基准脚本
+对比患者文件与提取缓存在各格式下的总大小、编码与解码耗时：
+标准库 json / orjson 的缩进与紧凑输出，以及二进制记录（JSON/MessagePack 载荷 + zlib/zstd 压缩）
+未安装的库对应的格式跳过；每种格式取 3 次中最快的一次
+
+用法:
+    python scripts/benchmark_serialization.py                 # 使用 patient_records 与提取缓存
+    python scripts/benchmark_serialization.py a.json b.json   # 指定患者文件
+"""
+
+import json
+import time
+import zlib
+import sqlite3
+import sys
+from pathlib import Path
+
+# 添加 backend 目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import PATIENT_RECORDS_DIR, EXTRACT_CACHE_FILE
+from core import serialization
+from core.serialization import orjson, msgpack, zstandard, ZLIB_LEVEL, ZSTD_LEVEL
+
+REPEAT = 3
+
+
+def _stdlib_pretty(obj):
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def _stdlib_compact(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _stdlib_loads(data):
+    return json.loads(data.decode("utf-8"))
+
+
+def _compressed(encode, decode, compress, decompress):
+    return (lambda obj: compress(encode(obj))), (lambda data: decode(decompress(data)))
+
+
+def _formats():
+    """[(名称, 编码函数, 解码函数)]，只包含当前环境可用的格式"""
+    formats = [
+        ("json 缩进", _stdlib_pretty, _stdlib_loads),
+        ("json 紧凑", _stdlib_compact, _stdlib_loads),
+    ]
+    compact, loads = _stdlib_compact, _stdlib_loads
+    if orjson is not None:
+        formats.append(("orjson 缩进", lambda obj: orjson.dumps(obj, option=orjson.OPT_INDENT_2), orjson.loads))
+        formats.append(("orjson 紧凑", orjson.dumps, orjson.loads))
+        compact, loads = orjson.dumps, orjson.loads
+
+    payloads = [("json", compact, loads)]
+    if msgpack is not None:
+        payloads.append(("msgpack", lambda obj: msgpack.packb(obj, use_bin_type=True),
+                         lambda data: msgpack.unpackb(data, raw=False, strict_map_key=False)))
+    compressions = [("zlib", lambda data: zlib.compress(data, ZLIB_LEVEL), zlib.decompress)]
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        decompressor = zstandard.ZstdDecompressor()
+        compressions.append(("zstd", compressor.compress, decompressor.decompress))
+    for payload_name, encode, decode in payloads:
+        for compression_name, compress, decompress in compressions:
+            formats.append((f"{payload_name}+{compression_name}",
+                            *_compressed(encode, decode, compress, decompress)))
+    return formats
+
+
+def _best_of(func, items):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        results = [func(item) for item in items]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return results, best
+
+
+def benchmark(objects):
+    """返回每种格式的 (名称, 总字节数, 编码秒数, 解码秒数, 往返是否一致)"""
+    rows = []
+    for name, encode, decode in _formats():
+        encoded, t_dump = _best_of(encode, objects)
+        decoded, t_load = _best_of(decode, encoded)
+        rows.append((name, sum(len(data) for data in encoded), t_dump, t_load, decoded == objects))
+    return rows
+
+
+def print_table(title, objects):
+    rows = benchmark(objects)
+    baseline = rows[0][1] or 1
+    print(f"{title}（{len(objects)} 条）")
+    print(f"{'格式':<16} {'大小(KB)':>10} {'相对':>7} {'编码(ms)':>10} {'解码(ms)':>10} 一致")
+    for name, size, t_dump, t_load, identical in rows:
+        print(f"{name:<16} {size / 1024:>10.1f} {size / baseline:>7.1%} "
+              f"{t_dump * 1000:>10.1f} {t_load * 1000:>10.1f} {'是' if identical else '否'}")
+    print()
+
+
+def load_patients(paths):
+    patients = []
+    for path in paths:
+        try:
+            data = serialization.loads_json(Path(path).read_bytes())
+        except (OSError, ValueError) as e:
+            print(f"跳过 {path}: {e}")
+            continue
+        # processed_files.json 等登记文件不是患者文件
+        if isinstance(data, dict) and "程控记录" in data:
+            patients.append(data)
+    return patients
+
+
+def load_cached_sections():
+    """提取缓存中的全部提取结果（缓存不存在时为空）"""
+    if not EXTRACT_CACHE_FILE.exists():
+        return []
+    conn = sqlite3.connect(str(EXTRACT_CACHE_FILE))
+    try:
+        rows = conn.execute("SELECT sections FROM extractions").fetchall()
+    finally:
+        conn.close()
+    sections = []
+    for (value,) in rows:
+        try:
+            sections.append(serialization.loads(value))
+        except ValueError:
+            continue
+    return sections
+
+
+def main():
+    paths = sys.argv[1:] or sorted(PATIENT_RECORDS_DIR.glob("*.json"))
+    patients = load_patients(paths)
+    sections = [] if sys.argv[1:] else load_cached_sections()
+    if not patients and not sections:
+        print("没有可用的数据：请先运行 main.py 生成患者文件，或指定患者 JSON 文件")
+        return
+
+    print(f"JSON 库: {serialization.json_backend()}，二进制格式: {serialization.binary_codec()}")
+    missing = [name for name, module in (("orjson", orjson), ("msgpack", msgpack), ("zstandard", zstandard))
+               if module is None]
+    if missing:
+        print(f"未安装 {', '.join(missing)}，相应格式不参与对比")
+    print()
+    if patients:
+        print_table("患者文件", patients)
+    if sections:
+        print_table("提取缓存", sections)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,41 +3,266 @@
 从匹配报告中提取所有文件的数据
 """
 
+import os
 import csv
 import warnings
 import sys
 from pathlib import Path
+from collections import Counter
+from itertools import count
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # 添加 backend 目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from config import MATCHING_REPORT_FILE
-from core.extractors import process_file
+from config import MATCHING_REPORT_FILE, EXTRACT_BATCH_SIZE
+from core.extractors import extract_file_planned, build_record
+from core.extract_cache import ExtractCache, extractor_version
+from core.plans import PlanStore
+from core.file_tracker import lookup_file_hashes
+from core import profiling
 
 
-def extract_all_data():
+def _init_worker():
+    """子进程初始化：与主进程一样屏蔽 openpyxl/xlrd 的警告"""
+    warnings.simplefilter("ignore")
+
+
+def _extract_task(filepath, handler_options, layouts, profile=False):
     """
-    从匹配报告中提取所有文件的数据
-    返回: 提取的数据列表（内存管道，不写入文件）
+    提取单个文件（子进程任务）
+    返回 (sections, layout, 剖析数据)；profile 为 False 时剖析数据为 None
     """
-    if not MATCHING_REPORT_FILE.exists():
-        print(f"错误: 匹配报告不存在 ({MATCHING_REPORT_FILE})")
-        print("请先运行 match_templates.py")
-        return []
-    
+    if not profile:
+        return extract_file_planned(filepath, handler_options, layouts) + (None,)
+    profiling.begin_file()
+    sections, layout = extract_file_planned(filepath, handler_options, layouts)
+    return sections, layout, profiling.end_file()
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _template_of(file):
+    template = file.get("Matched Template", "N/A")
+    return None if template == "N/A" else template
+
+
+def _observe(plans, file, layout):
+    template = _template_of(file)
+    if plans is not None and template and layout is not None:
+        plans.observe(template, layout)
+
+
+def _layouts(plans, file):
+    template = _template_of(file)
+    return plans.active(template) if plans is not None and template else []
+
+
+def _progress(done, total):
+    if done % 50 == 0:
+        print(f"已处理 {done}/{total}...")
+
+
+def _extract_parallel(executor, files, handler_options, plans=None, on_done=None):
+    """
+    多进程提取一批文件
+    大文件优先调度，避免单个慢文件拖到最后；结果按传入顺序返回
+    提取计划在提交时确定，本批学到的版式从下一批起生效
+    on_done: 每完成一个文件调用一次（打印进度）
+    """
+    order = sorted(range(len(files)), key=lambda i: _file_size(files[i]["Full Path"]), reverse=True)
+    results = [None] * len(files)
+    planned = 0
+
+    futures = {
+        executor.submit(_extract_task, files[i]["Full Path"], handler_options,
+                        _layouts(plans, files[i]), profiling.ENABLED): i
+        for i in order
+    }
+    for future in as_completed(futures):
+        i = futures[future]
+        results[i], layout, profile = future.result()
+        _observe(plans, files[i], layout)
+        profiling.record_file(files[i], profile)
+        if layout is None and "error" not in results[i]:
+            planned += 1
+        if on_done:
+            on_done()
+
+    return results, planned
+
+
+def _extract_sequential(files, handler_options, plans=None, on_done=None):
+    results = []
+    planned = 0
+    for file in files:
+        sections, layout, profile = _extract_task(file["Full Path"], handler_options, _layouts(plans, file),
+                                                  profiling.ENABLED)
+        _observe(plans, file, layout)
+        profiling.record_file(file, profile)
+        if layout is None and "error" not in sections:
+            planned += 1
+        results.append(sections)
+        if on_done:
+            on_done()
+    return results, planned
+
+
+def iter_extracted_data(files, workers=1, handler_options=None, use_cache=True, use_plans=True,
+                        stats=None, batch_size=EXTRACT_BATCH_SIZE):
+    """
+    逐批提取并产出记录，顺序与 files 相同
+    同一时间只有一批文件的提取结果在内存中，供流式管道使用
+    batch_size 为 None 时全部文件作为一批：所有待解析文件统一按大小优先调度，没有逐批等待最慢文件的停顿，
+    供结果本来就全部留在内存中的非流式提取使用
+    内容哈希相同的文件（复制到多个目录的同一份报告）只提取一次，各副本共用提取结果，
+    仍各自产出记录（保留各自的路径），重复的随访在分组时合并
+    stats: 传入字典时累计 cached（缓存命中）、parsed（解析）、planned（按计划解析）、duplicates（重复副本）计数
+    """
+    if stats is None:
+        stats = {}
+    for key in ("cached", "parsed", "planned", "duplicates"):
+        stats.setdefault(key, 0)
+
+    # 扫描清单行自带哈希；来自匹配报告 CSV 的行需要查文件索引
+    missing = [i for i, file in enumerate(files) if not file.get("Hash")]
+    hashes = [file.get("Hash") for file in files]
+    if missing:
+        for i, file_hash in zip(missing, lookup_file_hashes([files[i]["Full Path"] for i in missing])):
+            hashes[i] = file_hash
+    # 只为后面还有副本的哈希保留提取结果，内存占用不随文件总数增长
+    remaining = Counter(h for h in hashes if h)
+    shared = {}
+
+    cache = ExtractCache() if use_cache else None
+    plans = PlanStore(extractor_version()) if use_plans else None
+    parallel = workers and workers > 1
+    if batch_size is None:
+        batch_size = max(len(files), 1)
+    elif parallel:
+        batch_size = max(batch_size, workers * 8)
+    executor = None
+
+    try:
+        for start in range(0, len(files), batch_size):
+            batch = files[start:start + batch_size]
+            batch_hashes = hashes[start:start + batch_size]
+            sections = [None] * len(batch)
+            # 前面批次或本批内已出现过的内容只取第一份：copies 为 (副本位置, 第一份位置)
+            first = {}
+            copies = []
+            unique = []
+            for i, h in enumerate(batch_hashes):
+                if h in shared:
+                    sections[i] = shared[h]
+                elif h and h in first:
+                    copies.append((i, first[h]))
+                else:
+                    if h:
+                        first[h] = i
+                    unique.append(i)
+            stats["duplicates"] += len(batch) - len(unique)
+
+            if cache:
+                cached = profiling.timed("cache_get", cache.get_many, [batch_hashes[i] for i in unique])
+                for i in unique:
+                    sections[i] = cached.get(batch_hashes[i])
+            pending = [i for i in unique if sections[i] is None]
+            todo = [batch[i] for i in pending]
+
+            # 进度按全部文件计：本批命中缓存的与重复副本视为已处理
+            done = count(start + len(batch) - len(todo) + 1)
+            on_done = lambda: _progress(next(done), len(files))
+            if parallel and len(todo) > 1:
+                if executor is None:
+                    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+                extracted, planned = _extract_parallel(executor, todo, handler_options, plans, on_done)
+            else:
+                extracted, planned = _extract_sequential(todo, handler_options, plans, on_done)
+
+            for i, result in zip(pending, extracted):
+                sections[i] = result
+            for i, source in copies:
+                sections[i] = sections[source]
+            if cache:
+                profiling.timed("cache_put", cache.put_many, [(batch_hashes[i], sections[i]) for i in pending])
+            stats["cached"] += len(unique) - len(todo)
+            stats["parsed"] += len(todo)
+            stats["planned"] += planned
+
+            for i, h in enumerate(batch_hashes):
+                if not h:
+                    continue
+                remaining[h] -= 1
+                if remaining[h]:
+                    shared[h] = sections[i]
+                else:
+                    shared.pop(h, None)
+
+            for s, file in zip(sections, batch):
+                yield profiling.timed("build_record", build_record, s, file["Full Path"], file["Filename"])
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if cache:
+            cache.close()
+        if plans is not None and stats["parsed"]:
+            plans.save()
+
+
+def print_extract_stats(stats, use_cache=True, use_plans=True):
+    """打印缓存命中、重复副本与提取计划的统计"""
+    if stats.get("duplicates"):
+        print(f"内容重复的副本 {stats['duplicates']} 个，每份内容只提取一次")
+    if use_cache:
+        print(f"缓存命中 {stats['cached']}，解析 {stats['parsed']} 个文件")
+    if use_plans and stats["parsed"]:
+        print(f"按提取计划解析 {stats['planned']}/{stats['parsed']} 个文件")
+
+
+def load_matched_files():
+    """从匹配报告中读取匹配成功的文件行"""
     with open(MATCHING_REPORT_FILE, "r", encoding="utf-8-sig") as f:
         reader = csv.DictReader(f)
-        files = [
+        return [
             r for r in reader
             if "Match" in r["Status"] and not r["Filename"].startswith("~$")
         ]
 
-    print(f"开始全量提取，共 {len(files)} 个文件...")
-    
-    json_output = []
-    for i, file in enumerate(files):
-        if (i + 1) % 50 == 0:
-            print(f"已处理 {i + 1}/{len(files)}...")
-        json_output.append(process_file(file["Full Path"], file["Filename"]))
+
+def extract_all_data(workers=1, handler_options=None, use_cache=True, files=None, use_plans=True):
+    """
+    从匹配报告中提取所有文件的数据
+    files: 待提取的清单行/匹配报告行，默认读取匹配报告中全部匹配成功的文件
+    workers: 并行进程数，1 表示单进程顺序提取
+    handler_options: 传给 get_handler 的处理器选项（如 {"streaming": True}）
+    use_cache: 是否使用提取缓存（内容与提取逻辑未变的文件直接复用上次结果）
+    use_plans: 是否使用按模板学习的提取计划（版式校验通过的文件按坐标提取）
+    返回: 提取的数据列表（内存管道，不写入文件）
+    """
+    if files is None:
+        if not MATCHING_REPORT_FILE.exists():
+            print(f"错误: 匹配报告不存在 ({MATCHING_REPORT_FILE})")
+            print("请先运行 match_templates.py")
+            return []
+        files = load_matched_files()
+        mode = "全量提取"
+    else:
+        mode = "提取"
+
+    print(f"开始{mode}，共 {len(files)} 个文件...")
+    if workers and workers > 1:
+        print(f"使用 {workers} 个进程并行提取...")
+
+    stats = {}
+    json_output = list(iter_extracted_data(files, workers=workers, handler_options=handler_options,
+                                           use_cache=use_cache, use_plans=use_plans, stats=stats,
+                                           batch_size=None))
+    print_extract_stats(stats, use_cache, use_plans)
 
     print(f"数据提取完成，共 {len(json_output)} 条记录。")
     return json_output
@@ -0,0 +1,468 @@
+"""
+合成报告生成脚本
+按 data/templates.json 中每个模板的标签顺序生成虚构患者的 .xls / .xlsx 程控报告，
+用于在没有临床数据的环境中测试和基准测量整条流水线
+
+报告版式与真实报告一致：蓝色标签单元格、基本工作参数 / 抗心动过速参数 / 测试参数 / 事件记录 各区域、
+合并单元格（标题、型号、结论）和签名行日期（中文日期、Excel 日期序列号或日期格式单元格）；
+每位患者随机分配模板并有多次随访，电池电压、导线阈值与阻抗随时间漂移，少数患者带异常值
+
+用法:
+    python scripts/generate_reports.py 输出目录                  # 默认 1000 个文件
+    python scripts/generate_reports.py 输出目录 -n 10000 -w 8    # 1 万个文件，8 进程生成
+    python scripts/generate_reports.py 输出目录 --xls-ratio 0    # 全部生成 .xlsx
+"""
+
+import json
+import random
+import argparse
+import warnings
+import sys
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import openpyxl
+import xlwt
+from openpyxl.styles import PatternFill
+from openpyxl.styles.colors import Color
+
+# 添加 backend 目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import TEMPLATES_FILE, Z2_COL_HEADERS, Z3_COL_HEADERS, ZAT_COL_HEADERS
+
+# 处理器识别的蓝色：.xlsx 为主题色 4，.xls 为调色板下标 31（ice_blue）
+XLSX_BLUE = PatternFill(patternType="solid", fgColor=Color(theme=4, tint=0.6))
+XLS_BLUE = xlwt.easyxf("pattern: pattern solid, fore_colour ice_blue")
+XLS_DATE = xlwt.easyxf(num_format_str="YYYY/M/D")
+
+# 表格行标题（腔室）
+CHAMBER_ROWS = {"心房", "右心室", "左心室", "心室", "传导束", "内膜"}
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾萧田董潘袁蔡蒋余于杜叶程魏苏吕丁任卢姚沈钟姜崔谭陆范汪廖石金韦贾夏付方邹熊白孟秦邱侯江尹薛闫段雷龙黎史陶贺毛郝顾龚邵万覃武钱戴严欧莫孔向常汤康易乔赖"
+GIVEN = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华建国红玉兰凤云志海燕文斌晨宇鹏飞"
+
+MODELS = {
+    "美敦力": ["Azure XT DR", "Adapta ADDR01", "Attesta DR", "Cobalt XT", "Visia AF"],
+    "美敦力Micra AV": ["Micra AV MC1AVR1"],
+    "雅培": ["Assurity PM2272", "Endurity PM1162", "Gallant HF", "Quadra Assura"],
+    "百多力": ["Edora 8 DR-T", "Enitra 8", "Amvia Sky", "Rivacor 7"],
+    "波科": ["Accolade EL DR", "Proponent MRI", "Resonate HF"],
+    "创领": ["Reply 200 DR", "Kora 250 DR"],
+    "传导束起搏": ["Azure XT DR", "Attesta DR"],
+}
+MODES = {
+    "起搏器报告单": ["DDD", "DDDR", "AAI", "VVI", "VVIR"],
+    "CRT-P报告单": ["DDD", "DDDR"],
+    "CRT-D报告单": ["DDD", "DDDR"],
+    "ICD报告单": ["DDD", "VVI"],
+    "EV-ICD报告单": ["VVI"],
+}
+CONCLUSIONS = ["起搏器功能正常", "起搏器功能正常，参数未调整", "电池电量正常，导线参数稳定", "已调整输出参数，建议按期随访"]
+
+
+# --- 版式 ---
+
+def _starts_with(label, headers):
+    return any(label.startswith(h) for h in headers)
+
+
+def split_template(labels):
+    """
+    模板标签序列 -> 各区域：
+    header / basic(kv, cols, rows, extra) / antitachy(cols, rows) / test(kv, cols, rows, extra) / events
+    """
+    i_basic = labels.index("模式")
+    i_test = next(i for i, label in enumerate(labels) if label.startswith("电池电压"))
+    basic, test = labels[i_basic:i_test], labels[i_test:]
+
+    antitachy = None
+    if "分区" in basic:
+        k = basic.index("分区")
+        basic, at = basic[:k], basic[k:]
+        antitachy = {"cols": at[:len(ZAT_COL_HEADERS)], "rows": at[len(ZAT_COL_HEADERS):]}
+
+    def table(part, col_headers):
+        def is_column(label):
+            return _starts_with(label, col_headers) or "%" in label
+
+        start = next((i for i, label in enumerate(part) if _starts_with(label, col_headers)), len(part))
+        kv, rest = part[:start], part[start:]
+        end = next((i for i, label in enumerate(rest) if not is_column(label)), len(rest))
+        cols, rest = rest[:end], rest[end:]
+        rows = []
+        while rest and rest[0] in CHAMBER_ROWS:
+            rows.append(rest.pop(0))
+        return kv, cols, rows, rest
+
+    b_kv, b_cols, b_rows, b_extra = table(basic, Z2_COL_HEADERS)
+    t_kv, t_cols, t_rows, t_rest = table(test, Z3_COL_HEADERS)
+    # 表格之后的阻抗类标签（如 EV-ICD 的电极间阻抗）属于测试参数，其余为事件记录
+    t_extra = [label for label in t_rest if "阻抗" in label]
+    events = [label for label in t_rest if "阻抗" not in label]
+    return {
+        "header": labels[:i_basic],
+        "basic": (b_kv, b_cols, b_rows, b_extra),
+        "antitachy": antitachy,
+        "test": (t_kv, t_cols, t_rows, t_extra),
+        "events": events,
+    }
+
+
+class XlsxWriter:
+    def __init__(self):
+        self.book = openpyxl.Workbook()
+        self.sheet = self.book.active
+
+    def label(self, r, c, text):
+        self.sheet.cell(row=r + 1, column=c + 1, value=text).fill = XLSX_BLUE
+
+    def value(self, r, c, value):
+        if value is None or value == "":
+            return
+        cell = self.sheet.cell(row=r + 1, column=c + 1, value=value)
+        if isinstance(value, datetime):
+            cell.number_format = "yyyy/m/d"
+
+    def merge(self, r, c1, c2, value):
+        self.sheet.merge_cells(start_row=r + 1, start_column=c1 + 1, end_row=r + 1, end_column=c2 + 1)
+        self.value(r, c1, value)
+
+    def save(self, path):
+        self.book.save(path)
+
+
+class XlsWriter:
+    def __init__(self):
+        self.book = xlwt.Workbook(encoding="utf-8")
+        self.sheet = self.book.add_sheet("Sheet1")
+
+    def label(self, r, c, text):
+        self.sheet.write(r, c, text, XLS_BLUE)
+
+    def value(self, r, c, value):
+        if value is None or value == "":
+            return
+        if isinstance(value, datetime):
+            self.sheet.write(r, c, value, XLS_DATE)
+        else:
+            self.sheet.write(r, c, value)
+
+    def merge(self, r, c1, c2, value):
+        self.sheet.write_merge(r, r, c1, c2, value)
+
+    def save(self, path):
+        self.book.save(path)
+
+
+# --- 数值 ---
+
+class Patient:
+    """一位虚构患者：固定的基线参数，随访时按年漂移"""
+
+    def __init__(self, rnd, reg_id, template_name, template):
+        self.rnd = rnd
+        self.reg_id = reg_id
+        self.template_name = template_name
+        self.type = template["type"]
+        self.brand = template["brand"]
+        self.name = rnd.choice(SURNAMES) + rnd.choice(GIVEN) + rnd.choice(["", rnd.choice(GIVEN)])
+        self.sex = rnd.choice("男女")
+        self.age = rnd.randint(35, 92)
+        self.model = rnd.choice(MODELS.get(self.brand, ["DR"]))
+        self.mode = rnd.choice(MODES.get(self.type, ["DDD"]))
+        self.implant = date(2012, 1, 1) + timedelta(days=rnd.randint(0, 11 * 365))
+        self.voltage = rnd.uniform(2.95, 3.15)
+        self.decline = rnd.uniform(0.01, 0.08) * (4 if rnd.random() < 0.03 else 1)  # V/年，少数耗电快
+        self.impedance = {ch: rnd.uniform(350, 900) for ch in CHAMBER_ROWS}
+        self.threshold = {ch: rnd.choice([0.5, 0.625, 0.75, 1.0, 1.25]) for ch in CHAMBER_ROWS}
+        self.lead_fault = rnd.choice(sorted(CHAMBER_ROWS)) if rnd.random() < 0.02 else None
+
+    def visit_dates(self, count):
+        dates = []
+        current = self.implant + timedelta(days=self.rnd.randint(30, 120))
+        for _ in range(count):
+            dates.append(current)
+            current += timedelta(days=self.rnd.randint(90, 400))
+        return dates
+
+    def format_date(self, d):
+        style = self.rnd.randint(0, 3)
+        if style == 0:
+            return f"{d.year}年{d.month}月{d.day}日"
+        if style == 1:
+            return float((d - date(1899, 12, 30)).days)
+        if style == 2:
+            return f"{d.year}/{d.month:02d}/{d.day:02d}"
+        return f"{d.year}.{d.month}.{d.day}"
+
+    def header_value(self, label):
+        values = {
+            "姓名": self.name, "性别": self.sex, "登记号": self.reg_id,
+            "品牌": self.brand.replace("Micra AV", ""), "型号": self.model,
+        }
+        if label in values:
+            return values[label]
+        if label.startswith("年龄"):
+            return float(self.age)
+        if label == "植入日期":
+            return self.format_date(self.implant)
+        return ""
+
+    def setting_value(self, label):
+        rnd = self.rnd
+        if label == "模式":
+            return self.mode
+        if "频率" in label:
+            if "上限" in label or "检测" in label:
+                return float(rnd.choice([120, 130, 140, 150, 170]))
+            return float(rnd.choice([50, 55, 60, 70]))
+        if "间期" in label:
+            return float(rnd.choice([150, 180, 200, 250]))
+        if "时间" in label:
+            return f"{rnd.randint(5, 30)}s"
+        return rnd.choice(["开", "关", "自动", "监测"])
+
+    def table_value(self, column, chamber, years):
+        rnd = self.rnd
+        if column.startswith("输出电压"):
+            return rnd.choice([2.0, 2.5, 3.0, 3.5])
+        if column.startswith(("输出脉宽", "脉宽")):
+            return 0.4
+        if column.startswith("阈值管理"):
+            return rnd.choice(["开", "关"])
+        if column.startswith("感知灵敏度"):
+            return rnd.choice([0.3, 0.5, 0.9, 2.8])
+        if "极性" in column:
+            return rnd.choice(["双极", "双极", "单极"])
+        if column.startswith("阈值"):
+            value = self.threshold[chamber] + 0.05 * years + rnd.choice([0, 0, 0.125, -0.125])
+            if chamber == self.lead_fault and years > 3:
+                value += 2.0
+            return "<0.5" if value < 0.5 else round(value, 2)
+        if column.startswith("感知"):
+            return rnd.choice([">12", ">20", round(rnd.uniform(0.8, 15), 1)])
+        if "阻抗" in column:
+            value = self.impedance[chamber] + rnd.uniform(-40, 40) - 8 * years
+            if chamber == self.lead_fault and years > 3:
+                value = rnd.choice([150.0, 2600.0])
+            return float(round(value))
+        if "%" in column:
+            return rnd.choice(["<1", float(rnd.randint(1, 99)), 100.0])
+        return ""
+
+    def test_value(self, label, years):
+        rnd = self.rnd
+        if label.startswith("电池电压"):
+            return round(max(self.voltage - self.decline * years + rnd.uniform(-0.01, 0.01), 2.2), 2)
+        if label.startswith("电池阻抗"):
+            return float(round(100 + 150 * years + rnd.uniform(0, 80)))
+        if "寿命" in label:
+            left = max((self.voltage - self.decline * years - 2.6) / self.decline, 0)
+            return f"{int(left)}年" + (f"{int(left % 1 * 12)}个月" if rnd.random() < 0.5 else "")
+        if "阻抗" in label:
+            return float(rnd.randint(40, 90))
+        return ""
+
+    def event_value(self, label):
+        rnd = self.rnd
+        if label.endswith("次数"):
+            return float(rnd.choice([0, 0, 0, rnd.randint(1, 40)]))
+        if label.startswith("持续"):
+            return rnd.choice([f"{rnd.randint(1, 59)}秒", f"{rnd.randint(1, 59)}分钟", f"{rnd.randint(1, 12)}小时"])
+        if "负荷" in label:
+            return rnd.choice(["<0.1", "<1", round(rnd.uniform(0, 30), 1)])
+        if "%" in label:
+            return round(rnd.uniform(0, 10), 1)
+        if label == "治疗类型":
+            return rnd.choice(["无", "ATP", "电击"])
+        if "说明" in label or label == "其余事件":
+            return rnd.choice(["无", "偶发室早", "短阵房速", "未见明显异常"])
+        if label == "建议下次程控时间":
+            return rnd.choice(["半年后", "一年后", "3个月后"])
+        return ""
+
+
+def align_impedance(kv, cols):
+    """
+    表格列按范围内第一个包含列名的单元格定位，电池阻抗标签在阻抗表头之前出现，
+    因此把它排在与阻抗列对齐的位置（每行 3 组键值，第 k 组标签位于第 2k 列）
+    """
+    column = next((i + 1 for i, label in enumerate(cols) if label.startswith("阻抗")), None)
+    label = next((label for label in kv if "阻抗" in label), None)
+    if column is None or label is None or column % 2 or column // 2 >= len(kv):
+        return kv
+    kv = [k for k in kv if k != label]
+    kv.insert(column // 2, label)
+    return kv
+
+
+def write_report(path, patient, layout, visit_date):
+    """按版式写出一次随访的报告"""
+    rnd = patient.rnd
+    years = (visit_date - patient.implant).days / 365.25
+    sheet = XlsWriter() if path.endswith(".xls") else XlsxWriter()
+
+    def kv_rows(r, labels, value_of, per_row=3):
+        for i, label in enumerate(labels):
+            row, slot = r + i // per_row, i % per_row
+            sheet.label(row, slot * 2, label)
+            value = value_of(label)
+            if label == "型号" and (slot == per_row - 1 or i == len(labels) - 1):
+                sheet.merge(row, slot * 2 + 1, slot * 2 + 2, value)
+            else:
+                sheet.value(row, slot * 2 + 1, value)
+        return r + (len(labels) + per_row - 1) // per_row
+
+    def table_rows(r, cols, rows, value_of):
+        for i, column in enumerate(cols):
+            sheet.label(r, i + 1, column)
+        for chamber in rows:
+            r += 1
+            sheet.label(r, 0, chamber)
+            for i, column in enumerate(cols):
+                sheet.value(r, i + 1, value_of(column, chamber))
+        return r + 1
+
+    sheet.merge(0, 0, 7, f"{patient.brand}{patient.type}")
+    r = kv_rows(2 + rnd.randint(0, 1), layout["header"], patient.header_value)
+
+    r += 1
+    sheet.value(r, 0, "基本工作参数")
+    kv, cols, rows, extra = layout["basic"]
+    r = kv_rows(r + 1, kv, patient.setting_value)
+    r = table_rows(r, cols, rows, lambda column, chamber: patient.table_value(column, chamber, years))
+    r = kv_rows(r, extra, patient.setting_value)
+
+    if layout["antitachy"]:
+        r += 1
+        sheet.value(r, 0, "抗心动过速参数")
+        r += 1
+        at_cols, at_rows = layout["antitachy"]["cols"], layout["antitachy"]["rows"]
+        for i, column in enumerate(at_cols):
+            sheet.label(r, i * 2, column)
+        for zone in at_rows:
+            r += 1
+            sheet.label(r, 0, zone)
+            # 检测频率/治疗有时写在相邻的合并单元格里
+            sheet.value(r, 2 + rnd.randint(0, 1), float(rnd.randint(150, 240)))
+            sheet.value(r, 4 + rnd.randint(0, 1), rnd.choice(["ATP×3, 35J×6", "监测", "关", "35J×8"]))
+        r += 1
+
+    r += 1
+    sheet.value(r, 0, "测试参数")
+    kv, cols, rows, extra = layout["test"]
+    r = kv_rows(r + 1, align_impedance(kv, cols), lambda label: patient.test_value(label, years))
+    r = table_rows(r, cols, rows, lambda column, chamber: patient.table_value(column, chamber, years))
+    r = kv_rows(r, extra, lambda label: patient.test_value(label, years))
+
+    r += 1
+    sheet.value(r, 0, "事件记录")
+    r += 1
+    events = layout["events"]
+    body = [label for label in events if label not in ("建议下次程控时间", "备注", "结论")]
+    i = 0
+    while i < len(body):
+        # 一行一组：计数标签后跟持续时间、治疗类型等附属标签
+        group = [body[i]]
+        i += 1
+        while i < len(body) and body[i] in ("持续最长时间", "治疗类型") and len(group) < 3:
+            group.append(body[i])
+            i += 1
+        for slot, label in enumerate(group):
+            sheet.label(r, slot * 2, label)
+            sheet.value(r, slot * 2 + 1, patient.event_value(label))
+        r += 1
+    for label in ("建议下次程控时间", "备注"):
+        if label in events:
+            sheet.label(r, 0, label)
+            sheet.merge(r, 1, 7, patient.event_value(label))
+            r += 1
+    sheet.label(r, 0, "结论")
+    sheet.merge(r, 1, 7, rnd.choice(CONCLUSIONS))
+
+    # 签名行：与结论之间可能隔几行空行；日期为中文日期、Excel 序列号或日期格式单元格
+    r += 1 + rnd.randint(0, 3)
+    sheet.value(r, 0, f"医生签名：{rnd.choice(SURNAMES)}医生")
+    style = rnd.randint(0, 2)
+    if style == 0:
+        sheet.value(r, 4, f"{visit_date.year}年{visit_date.month}月{visit_date.day}日")
+    elif style == 1:
+        sheet.value(r, 4, float((visit_date - date(1899, 12, 30)).days))
+    else:
+        sheet.value(r, 4, datetime(visit_date.year, visit_date.month, visit_date.day))
+    sheet.save(path)
+
+
+# --- 语料 ---
+
+def plan_corpus(templates, files, seed, max_visits):
+    """确定每位患者的模板与随访次数：[(患者序号, 模板名, 随访次数)]，总随访数恰为 files"""
+    rnd = random.Random(seed)
+    names = sorted(templates)
+    plan = []
+    total = 0
+    while total < files:
+        visits = min(rnd.randint(1, max_visits), files - total)
+        plan.append((len(plan), rnd.choice(names), visits))
+        total += visits
+    return plan
+
+
+def _file_name(patient, visit, extension):
+    """与真实文件名相同的格式，模板匹配按文件名中的品牌与类型识别"""
+    suffix = f"({visit})" if visit else ""
+    return f"{patient.name}{patient.type}（{patient.brand}）{suffix}{extension}"
+
+
+def generate_patient(args):
+    """生成一位患者的全部随访报告，返回写出的文件数"""
+    out_dir, templates, seed, index, template_name, visits, xls_ratio = args
+    warnings.simplefilter("ignore")
+    rnd = random.Random(seed * 1_000_003 + index)
+    template = templates[template_name]
+    patient = Patient(rnd, str(100000 + index), template_name, template)
+    layout = split_template(template["labels"])
+    for visit, visit_date in enumerate(patient.visit_dates(visits)):
+        folder = Path(out_dir) / f"{visit_date.year}" / f"{visit_date.year}{visit_date.month:02d}"
+        folder.mkdir(parents=True, exist_ok=True)
+        extension = ".xls" if rnd.random() < xls_ratio else ".xlsx"
+        write_report(str(folder / _file_name(patient, visit, extension)), patient, layout, visit_date)
+    return visits
+
+
+def generate_corpus(out_dir, files=1000, seed=7, max_visits=6, xls_ratio=0.5, workers=1):
+    """生成 files 个报告文件到 out_dir，返回 (文件数, 患者数)"""
+    with open(TEMPLATES_FILE, "r", encoding="utf-8") as f:
+        templates = json.load(f)
+    plan = plan_corpus(templates, files, seed, max_visits)
+    tasks = [(str(out_dir), templates, seed, index, name, visits, xls_ratio) for index, name, visits in plan]
+
+    written = 0
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for count in executor.map(generate_patient, tasks, chunksize=16):
+                written += count
+    else:
+        for task in tasks:
+            written += generate_patient(task)
+    return written, len(plan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按模板生成合成程控报告")
+    parser.add_argument("out_dir", help="输出目录（可直接作为 01_data_repository）")
+    parser.add_argument("--files", "-n", type=int, default=1000, help="报告文件数（默认 %(default)s）")
+    parser.add_argument("--seed", type=int, default=7, help="随机种子（相同参数生成相同内容）")
+    parser.add_argument("--max-visits", type=int, default=6, help="每位患者最多随访次数（默认 %(default)s）")
+    parser.add_argument("--xls-ratio", type=float, default=0.5, help=".xls 文件所占比例（默认 %(default)s）")
+    parser.add_argument("--workers", "-w", type=int, default=1, help="生成进程数（默认 1）")
+    args = parser.parse_args()
+
+    written, patients = generate_corpus(args.out_dir, args.files, args.seed, args.max_visits,
+                                        args.xls_ratio, args.workers)
+    print(f"已生成 {patients} 位患者的 {written} 个报告文件: {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
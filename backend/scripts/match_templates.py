@@ -11,7 +11,8 @@ from pathlib import Path
 
 # 添加 backend 目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from config import DATA_REPOSITORY, TEMPLATES_FILE, MATCHING_REPORT_FILE
+from config import TEMPLATES_FILE, MATCHING_REPORT_FILE, WRITE_MATCHING_REPORT
+from core.manifest import build_manifest
 
 
 def load_templates(json_path):
@@ -93,47 +94,89 @@ def find_best_template(filename, templates_data):
     return None, target_brand, target_type
 
 
-def match_all_files():
-    """匹配所有文件并生成报告"""
-    templates = load_templates(TEMPLATES_FILE)
-    print(f"已加载 {len(templates)} 个模板。")
+REPORT_HEADERS = ["Filename", "Full Path", "Detected Brand", "Detected Type", "Matched Template", "Status"]
+
+
+def match_file(full_path, filename, templates):
+    """匹配单个文件，返回匹配报告中的一行"""
+    matched_template, brand, dtype = find_best_template(filename, templates)
     
-    file_records = []
+    status = "Match" if matched_template else "No Match"
     
-    for root, dirs, files in os.walk(DATA_REPOSITORY):
-        for f in files:
-            if not f.lower().endswith(('.xls', '.xlsx')):
-                continue
-            if f.startswith('~$'):  # 跳过临时文件
-                continue
-                
-            full_path = os.path.join(root, f)
-            matched_template, brand, dtype = find_best_template(f, templates)
-            
-            status = "Match" if matched_template else "No Match"
-            
-            if "VITATRON" in f.upper() and brand == "美敦力":
-                status = "Match (Vitatron->Medtronic)"
-            
-            file_records.append({
-                "Filename": f,
-                "Full Path": full_path,  # 使用绝对路径，避免目录切换问题
-                "Detected Brand": brand,
-                "Detected Type": dtype,
-                "Matched Template": matched_template if matched_template else "N/A",
-                "Status": status
-            })
-
-    # 写入 CSV
-    headers = ["Filename", "Full Path", "Detected Brand", "Detected Type", "Matched Template", "Status"]
+    if "VITATRON" in filename.upper() and brand == "美敦力":
+        status = "Match (Vitatron->Medtronic)"
     
+    return {
+        "Filename": filename,
+        "Full Path": full_path,  # 使用绝对路径，避免目录切换问题
+        "Detected Brand": brand,
+        "Detected Type": dtype,
+        "Matched Template": matched_template if matched_template else "N/A",
+        "Status": status
+    }
+
+
+def load_matching_report():
+    """读取匹配报告，返回全部行（报告不存在时返回空列表）"""
+    if not MATCHING_REPORT_FILE.exists():
+        return []
+    with open(MATCHING_REPORT_FILE, "r", encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
+
+
+def write_matching_report(file_records):
+    """写入匹配报告 CSV"""
     with open(MATCHING_REPORT_FILE, 'w', newline='', encoding='utf-8-sig') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=headers)
+        # 清单行带有哈希、大小等额外列，报告中只写匹配相关的列
+        writer = csv.DictWriter(csvfile, fieldnames=REPORT_HEADERS, extrasaction='ignore')
         writer.writeheader()
         writer.writerows(file_records)
-        
+
+
+def match_manifest(manifest, templates=None):
+    """为清单行补充匹配结果（原地更新），返回清单"""
+    if templates is None:
+        templates = load_templates(TEMPLATES_FILE)
+    for row in manifest:
+        row.update(match_file(row["Full Path"], row["Filename"], templates))
+    return manifest
+
+
+def update_matching_report(added_rows, removed_paths):
+    """
+    增量更新匹配报告：移除 removed_paths（及重新匹配的 added_rows）对应行，追加 added_rows
+    added_rows: 已经过 match_manifest 的清单行
+    报告不存在时（如上次全量处理未写出报告）不做增量更新
+    """
+    if not MATCHING_REPORT_FILE.exists():
+        return
+    replaced = {os.path.normpath(p) for p in removed_paths}
+    replaced |= {os.path.normpath(r["Full Path"]) for r in added_rows}
+    rows = [
+        r for r in load_matching_report()
+        if os.path.normpath(r["Full Path"]) not in replaced
+    ]
+    write_matching_report(rows + list(added_rows))
+
+
+def match_all_files(manifest=None, write_report=WRITE_MATCHING_REPORT):
+    """
+    匹配所有文件并生成报告
+    manifest: 扫描清单，不传则现场遍历数据仓库（只匹配文件名，不计算哈希）
+    write_report: 是否写出匹配报告 CSV
+    返回补充了匹配结果的清单
+    """
+    templates = load_templates(TEMPLATES_FILE)
+    print(f"已加载 {len(templates)} 个模板。")
+    
+    if manifest is None:
+        manifest = build_manifest(hash_files=False)
+    file_records = match_manifest(manifest, templates)
+
     print(f"处理完成。共处理 {len(file_records)} 个文件。")
-    print(f"报告已保存到 {MATCHING_REPORT_FILE}")
+    if write_report:
+        write_matching_report(file_records)
+        print(f"报告已保存到 {MATCHING_REPORT_FILE}")
     
     # 统计
     matched_count = sum(1 for r in file_records if "Match" in r["Status"])
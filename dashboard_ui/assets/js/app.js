@@ -6,10 +6,28 @@
 let allPatients = [];
 let currentPatient = null;
 let currentTab = 'overview';
+let detailRequest = 0; // Latest click wins when chunks load out of order
+
+// Virtualized patient list: only the rows in view (plus a margin) exist in the DOM
+const LIST_OVERSCAN = 10;
+let listedPatients = [];
+let listRowHeight = 0; // Measured from the first rendered row
+let listFrame = 0;
+let activeFileName = null;
+
+// Cohort screening (data/screening.js): registration id -> [{ rule, value, date }]
+let screeningFlags = {};
+let screeningLabels = {};
+
+// Record chunks loaded so far: chunk id -> { file_name: patient view model }
+const loadedChunks = {};
+const pendingChunks = {};
 
 // Elements
 const elList = document.getElementById('patientList');
 const elSearch = document.getElementById('patientSearch');
+const elFilter = document.getElementById('screenFilter');
+const elFilterBox = document.getElementById('screenFilterBox');
 const elCount = document.getElementById('patientCount');
 const elEmpty = document.getElementById('emptyState');
 const elDetail = document.getElementById('patientDetail');
@@ -32,30 +50,91 @@ document.addEventListener('DOMContentLoaded', () => {
 function loadIndex() {
     try {
         if (!window.PACEMAKER_DATA) {
-            throw new Error('Data bundle not found. Please run dashboard_ui/scripts/generate_data.py');
+            throw new Error('Data index not found. Please run dashboard_ui/scripts/generate_data.py');
+        }
+        // Single-file bundles with raw records inline are no longer supported: the page only renders
+        // the precomputed view models in record chunks
+        if (window.PACEMAKER_DATA.records) {
+            throw new Error('data/index.js is an old single-file bundle. Please re-run dashboard_ui/scripts/generate_data.py');
         }
         allPatients = window.PACEMAKER_DATA.index;
+        if (window.initSearch && window.initSearch(allPatients)) {
+            elSearch.placeholder = '搜索姓名、拼音首字母、登记号或型号...';
+        }
+        loadScreening();
         renderList(allPatients);
     } catch (err) {
         console.error(err);
-        elList.innerHTML = `<div class="error" style="padding:20px; color:var(--accent-rose)">Error loading data.<br>Make sure data_bundle.js exists.<br>${err.message}</div>`;
+        elList.innerHTML = `<div class="error" style="padding:20px; color:var(--accent-rose)">Error loading data.<br>Make sure data/index.js exists.<br>${err.message}</div>`;
     }
 }
 
-function loadPatientDetails(filename) {
+function loadScreening() {
+    const screening = window.PACEMAKER_SCREENING;
+    if (!screening) return; // Screening has not been run; the filter stays hidden
+
+    screeningFlags = screening.flags || {};
+    (screening.rules || []).forEach(rule => {
+        screeningLabels[rule.id] = rule.label;
+        if (!rule.count) return;
+        const option = document.createElement('option');
+        option.value = rule.id;
+        option.textContent = `${rule.label} (${rule.count})`;
+        elFilter.appendChild(option);
+    });
+    elFilterBox.classList.remove('hidden');
+}
+
+// Chunk scripts call this with their records (script tags work over file://, fetch does not)
+window.PACEMAKER_LOAD_CHUNK = function (chunkId, records) {
+    loadedChunks[chunkId] = records;
+};
+
+function loadChunk(chunkId) {
+    if (loadedChunks[chunkId]) return Promise.resolve(loadedChunks[chunkId]);
+    if (pendingChunks[chunkId]) return pendingChunks[chunkId];
+
+    const dir = window.PACEMAKER_DATA.chunk_dir || 'data/records';
+    const name = `chunk_${String(chunkId).padStart(3, '0')}.js`;
+
+    pendingChunks[chunkId] = new Promise((resolve, reject) => {
+        const script = document.createElement('script');
+        script.src = `${dir}/${name}`;
+        script.onload = () => {
+            delete pendingChunks[chunkId];
+            script.remove();
+            if (loadedChunks[chunkId]) resolve(loadedChunks[chunkId]);
+            else reject(new Error(`Chunk ${name} did not register any records`));
+        };
+        script.onerror = () => {
+            delete pendingChunks[chunkId];
+            script.remove();
+            reject(new Error(`Could not load ${name}`));
+        };
+        document.head.appendChild(script);
+    });
+    return pendingChunks[chunkId];
+}
+
+function loadPatientRecord(patient) {
+    return loadChunk(patient.chunk).then(records => records[patient.file_name]);
+}
+
+async function loadPatientDetails(patient) {
+    const request = ++detailRequest;
     try {
-        // Fetch from global object instead of file fetch
-        const data = window.PACEMAKER_DATA.records[filename];
+        const data = await loadPatientRecord(patient);
+        if (request !== detailRequest) return; // A newer selection is already loading
 
         if (!data) throw new Error('Record not found in bundle');
 
-        // Parse and Normalize Data
-        currentPatient = parsePatientData(data);
+        // Chunks carry precomputed view models (scripts/generate_data.py), rendered as-is
+        currentPatient = data;
         renderPatient(currentPatient);
 
         // Update Charts
         if (window.updateCharts) {
-            window.updateCharts(currentPatient.history);
+            window.updateCharts(currentPatient.series);
         }
 
         // Show UI
@@ -68,191 +147,92 @@ function loadPatientDetails(filename) {
     }
 }
 
-// --- Data Parsing ---
-
-function parsePatientData(json) {
-    const rawRecords = json['程控记录'] || [];
-
-    // Convert records to a cleaner format
-    const history = rawRecords.map(r => {
-        const h = r.header || {};
-        const basic = r.basic_params || {};
-        const test = r.test_params || {};
-        const meas = basic.measurements || {};
-        const thresh = test.threshold_tests || {};
-        const batt = test.battery_and_leads || {};
-        const events = r.events_and_footer || {};
-        const meta = r.meta || {};
-        const footerMeta = r.footer_meta || {};
-
-        // Helper to safe parse floats
-        const f = (val) => {
-            if (!val) return null;
-            const num = parseFloat(val);
-            return isNaN(num) ? null : num;
-        };
-
-        // Priority: footer_meta.程控日期 > meta.程控日期 > fallback to implant date
-        const rawVisitDate = footerMeta['程控日期'] || meta['程控日期'] || null;
-        const rawImplantDate = h['植入日期'] || null;
-
-        return {
-            // Visit (program control) date
-            dateStr: rawVisitDate ? formatDate(rawVisitDate) : 'Unknown',
-            timestamp: rawVisitDate ? parseToTimestamp(rawVisitDate) : 0,
-            // Implant date (separate)
-            implantDateStr: rawImplantDate ? formatDate(rawImplantDate) : '--',
-            header: h,
-            mode: basic.settings?.['模式'] || '--',
-            lowerRate: basic.settings?.['低限频率（次/分）'] || '--',
-            upperRate: basic.settings?.['上限跟踪频率（次/分）'] || '--',
-
-            // Battery
-            battery: {
-                voltage: f(batt['电池电压（V）']),
-                life: batt['预估寿命'] || '--',
-                status: batt['电池状态'] || 'OK'
-            },
-
-            // Events - Deep extraction from all possible field names
-            events: {
-                // Mode Switch / AMS
-                ams_count: events['模式转换次数'] || events['房室传导模式转换（%）'] || events['运动模式转换（%）'] || null,
-                ams_duration: events['持续最长时间'] || null,
-
-                // AT/AF Load
-                ataf_load: events['AT/AF负荷%'] || events['AT/AF负荷'] || null,
-                ataf_count: events['AT/AF事件次数'] || null,
-                ataf_desc: events['快心房率事件说明'] || events['AT/AF事件说明'] || null,
-
-                // VT/Fast Ventricular
-                vt_count: events['快心室率次数'] || events['快心室率事件次数'] || null,
-                vt_desc: events['快心室率事件说明'] || events['快心室率说明'] || null,
-
-                // Other
-                other: events['其余事件'] || events['其他事件'] || null,
-
-                // Footer
-                conclusion: events['结论'] || '无记录',
-                next_visit: events['建议下次程控时间'] || '未指定'
-            },
-
-            // Thresholds (V) - Keep raw string for display (may contain > < symbols)
-            rv_threshold: thresh['右心室_阈值'] || '--',
-            lv_threshold: thresh['左心室_阈值'] || '--',
-            ra_threshold: thresh['心房_阈值'] || '--',
-
-            // Impedance (Ohms) - Keep raw string
-            rv_impedance: thresh['右心室_阻抗'] || '--',
-            lv_impedance: thresh['左心室_阻抗'] || '--',
-            ra_impedance: thresh['心房_阻抗'] || '--',
-
-            // Sensing (mV) - Keep raw string
-            rv_sense: thresh['右心室_感知'] || '--',
-            lv_sense: thresh['左心室_感知'] || '--',
-            ra_sense: thresh['心房_感知'] || '--',
-
-            // Output settings from measurements
-            rv_output: meas['右心室_输出电压'] ? `${meas['右心室_输出电压']}V/${meas['右心室_输出脉宽'] || '?'}ms` : '--',
-            ra_output: meas['心房_输出电压'] ? `${meas['心房_输出电压']}V/${meas['心房_输出脉宽'] || '?'}ms` : '--',
-            lv_output: meas['左心室_输出电压'] ? `${meas['左心室_输出电压']}V/${meas['左心室_输出脉宽'] || '?'}ms` : '--',
-
-            measurement_raw: meas,
-            settings_raw: basic.settings || {},
-            thresholds_raw: thresh,
-            battery_raw: batt,
-            events_raw: events,
-            header_raw: h,
-            footer_meta_raw: footerMeta
-        };
-    });
-
-    // Sort by Date Descending
-    history.sort((a, b) => b.timestamp - a.timestamp);
-
-    // Get latest brand/model
-    const latestRec = history.length > 0 ? history[0] : null;
-
-    return {
-        id: json['登记号'],
-        name: json['姓名'],
-        brand: latestRec ? latestRec.header['品牌'] : 'Unknown',
-        model: latestRec ? latestRec.header['型号'] : 'Unknown',
-        implantDate: latestRec ? latestRec.implantDateStr : '--',
-        history: history,
-        file_name: json.file_name // Pass through for reference
-    };
-}
+// --- UI Rendering ---
 
-// Helper: Excel Serial Date to JS Date
-function parseToTimestamp(dateInput) {
-    if (!dateInput) return 0;
+function renderList(patients) {
+    listedPatients = patients;
+    elCount.textContent = patients.length;
 
-    // Check if it's an Excel serial number (e.g. 44894)
-    if (/^\d{5}$/.test(dateInput)) {
-        // Excel base date is Dec 30, 1899
-        const date = new Date((dateInput - 25569) * 86400 * 1000);
-        return date.getTime();
+    let spacer = elList.querySelector('.patient-list-spacer');
+    if (!spacer) {
+        elList.innerHTML = '<div class="patient-list-spacer"><div class="patient-list-window"></div></div>';
+        spacer = elList.firstElementChild;
+        spacer.firstElementChild.addEventListener('click', onListClick);
+        elList.addEventListener('scroll', () => {
+            if (!listFrame) listFrame = requestAnimationFrame(renderListWindow);
+        });
     }
-
-    // Try standard parsing
-    let str = String(dateInput).replace(/\./g, '-').replace(/年|月/g, '-').replace(/日|号/g, '');
-    const ts = Date.parse(str);
-    return isNaN(ts) ? 0 : ts;
+    elList.scrollTop = 0;
+    renderListWindow();
 }
 
-function formatDate(dateInput) {
-    if (!dateInput) return 'Unknown Date';
+function renderListWindow() {
+    listFrame = 0;
+    const spacer = elList.querySelector('.patient-list-spacer');
+    const win = spacer.firstElementChild;
 
-    let dateObj;
+    const rowHeight = listRowHeight || 70; // First pass renders a guess, then measures
+    const first = Math.max(0, Math.floor(elList.scrollTop / rowHeight) - LIST_OVERSCAN);
+    const last = Math.min(listedPatients.length, Math.ceil((elList.scrollTop + elList.clientHeight) / rowHeight) + LIST_OVERSCAN);
 
-    // Excel Serial
-    if (/^\d{5}$/.test(dateInput)) {
-        dateObj = new Date((dateInput - 25569) * 86400 * 1000);
-    } else {
-        // Standard String
-        let str = String(dateInput).replace(/\./g, '-').replace(/年|月/g, '-').replace(/日|号/g, '');
-        const ts = Date.parse(str);
-        if (isNaN(ts)) return dateInput; // Return original if parse fails
-        dateObj = new Date(ts);
-    }
+    win.innerHTML = listedPatients.slice(first, last).map((p, i) => {
+        const flags = screeningFlags[p.id] || [];
+        const flagTitle = flags.map(f => screeningLabels[f.rule] || f.rule).join('\n');
+        return `
+            <div class="patient-item${p.file_name === activeFileName ? ' active' : ''}" data-row="${first + i}">
+                <div class="patient-avatar">${p.name[0]}</div>
+                <div class="patient-meta">
+                    <span class="patient-name">${p.name}</span>
+                    <span class="patient-id">ID: ${p.id}</span>
+                </div>
+                ${flags.length ? `<span class="patient-flags" title="${flagTitle}">⚠ ${flags.length}</span>` : ''}
+            </div>
+        `;
+    }).join('');
+    win.style.transform = `translateY(${first * rowHeight}px)`;
 
-    const y = dateObj.getFullYear();
-    const m = String(dateObj.getMonth() + 1).padStart(2, '0');
-    const d = String(dateObj.getDate()).padStart(2, '0');
-    return `${y}-${m}-${d}`;
+    if (!listRowHeight && win.firstElementChild) {
+        const item = win.firstElementChild;
+        listRowHeight = item.offsetHeight + parseFloat(getComputedStyle(item).marginBottom);
+        renderListWindow();
+        return;
+    }
+    spacer.style.height = `${listedPatients.length * rowHeight}px`;
 }
 
-// --- UI Rendering ---
+function onListClick(e) {
+    const item = e.target.closest('.patient-item');
+    if (!item) return;
+    const patient = listedPatients[Number(item.dataset.row)];
 
-function renderList(patients) {
-    elList.innerHTML = '';
-    elCount.textContent = patients.length;
+    // Highlight active
+    activeFileName = patient.file_name;
+    elList.querySelectorAll('.patient-item').forEach(i => i.classList.remove('active'));
+    item.classList.add('active');
 
-    patients.forEach(p => {
-        const item = document.createElement('div');
-        item.className = 'patient-item';
-        item.innerHTML = `
-            <div class="patient-avatar">${p.name[0]}</div>
-            <div class="patient-meta">
-                <span class="patient-name">${p.name}</span>
-                <span class="patient-id">ID: ${p.id}</span>
-            </div>
-        `;
-        item.addEventListener('click', () => {
-            // Highlight active
-            document.querySelectorAll('.patient-item').forEach(i => i.classList.remove('active'));
-            item.classList.add('active');
-
-            loadPatientDetails(p.file_name);
-        });
-        elList.appendChild(item);
-    });
+    loadPatientDetails(patient);
 }
 
+// Detail sections of a visit, in the order generate_data.py emits them
+const SECTION_TITLES = [
+    '📋 患者/设备信息',
+    '⚙️ 起搏参数',
+    '📊 输出设置',
+    '🔋 电池信息',
+    '🔌 阈值测试',
+    '⚠️ 事件与结论',
+    '📝 签名信息'
+];
+
+const BATTERY_COLORS = {
+    low: 'var(--accent-rose)',
+    warn: 'var(--accent-amber)',
+    ok: 'var(--accent-teal)'
+};
+
 function renderPatient(patient) {
-    // Use first record (sorted DESC, so this is the latest)
-    const lat = patient.history && patient.history.length > 0 ? patient.history[0] : null;
+    // Latest visit summary, precomputed by generate_data.py
+    const lat = patient.overview;
     if (!lat) return;
 
     // Header
@@ -264,16 +244,22 @@ function renderPatient(patient) {
 
     // Overview Tab
     // Battery
-    const v = lat.battery.voltage;
-    document.getElementById('batStatus').textContent = v !== null ? v.toFixed(2) : '--';
-    const batLife = lat.battery.life;
-    document.getElementById('batLife').textContent = batLife ? `预估剩余: ${batLife}` : '预估剩余: --';
-    const batInd = document.getElementById('batIndicator');
-
-    // Simple Battery Color Logic
-    if (v && v < 2.6) batInd.style.backgroundColor = 'var(--accent-rose)';
-    else if (v && v < 2.8) batInd.style.backgroundColor = 'var(--accent-amber)';
-    else batInd.style.backgroundColor = 'var(--accent-teal)';
+    document.getElementById('batStatus').textContent = lat.voltage;
+    document.getElementById('batLife').textContent = `预估剩余: ${lat.life || '--'}`;
+
+    // Batch ERI forecast (data/forecast.js), precomputed for the whole cohort at ETL time
+    const elForecast = document.getElementById('batForecast');
+    const forecast = window.PACEMAKER_FORECAST && window.PACEMAKER_FORECAST.patients[patient.id];
+    if (forecast) {
+        const methods = { reached: '已达 ERI', voltage_trend: '电压趋势', device_estimate: '设备预估' };
+        elForecast.textContent = forecast.method === 'reached'
+            ? `已于 ${forecast.eri_date} 达到 ERI`
+            : `预测 ERI: ${forecast.eri_date}（${methods[forecast.method]}，置信度${forecast.level}）`;
+        elForecast.classList.remove('hidden');
+    } else {
+        elForecast.classList.add('hidden');
+    }
+    document.getElementById('batIndicator').style.backgroundColor = BATTERY_COLORS[lat.batteryLevel];
 
     // Mode
     document.getElementById('pacingMode').textContent = lat.mode;
@@ -281,69 +267,28 @@ function renderPatient(patient) {
     document.getElementById('upperRate').textContent = lat.upperRate;
 
     // Summary Card
-    document.getElementById('visitConclusion').textContent = lat.events.conclusion || '无记录';
-    document.getElementById('nextVisitDate').textContent = lat.events.next_visit || '未指定';
+    document.getElementById('visitConclusion').textContent = lat.conclusion;
+    document.getElementById('nextVisitDate').textContent = lat.nextVisit;
 
-    // Events Card - using new deep extracted fields
-    const ev = lat.events;
+    // Events Card
+    document.getElementById('amsSwitch').textContent = lat.ams;
+    document.getElementById('atafLoad').textContent = lat.ataf;
+    document.getElementById('vtEvents').textContent = lat.vt;
+    document.getElementById('otherEvents').textContent = lat.other;
 
-    // AMS / Mode Switch
-    let amsDisplay = '无';
-    if (ev.ams_count) {
-        amsDisplay = ev.ams_count;
-        if (ev.ams_duration) amsDisplay += ` (最长 ${ev.ams_duration})`;
-    }
-    document.getElementById('amsSwitch').textContent = amsDisplay;
-
-    // AT/AF Load
-    let atafDisplay = '无';
-    if (ev.ataf_load) {
-        atafDisplay = `${ev.ataf_load}%`;
-        if (ev.ataf_desc) atafDisplay += ` - ${ev.ataf_desc}`;
-    } else if (ev.ataf_count) {
-        atafDisplay = `${ev.ataf_count} 次`;
-        if (ev.ataf_desc) atafDisplay += ` - ${ev.ataf_desc}`;
-    }
-    document.getElementById('atafLoad').textContent = atafDisplay;
-
-    // VT / Fast Ventricular Rate
-    let vtDisplay = '无';
-    if (ev.vt_count) {
-        vtDisplay = `${ev.vt_count} 次`;
-        if (ev.vt_desc) vtDisplay += ` - ${ev.vt_desc}`;
-    } else if (ev.vt_desc) {
-        vtDisplay = ev.vt_desc;
-    }
-    document.getElementById('vtEvents').textContent = vtDisplay;
-
-    // Other Events
-    const otherVal = ev.other;
-    document.getElementById('otherEvents').textContent = otherVal || '无';
-
-    // Lead Table
+    // Lead Table (chambers without any value are already left out)
     const tbody = document.getElementById('leadTableBody');
     tbody.innerHTML = '';
-
-    const chambers = [
-        { name: 'RA (右房)', imp: lat.ra_impedance, sens: lat.ra_sense, thr: lat.ra_threshold, out: lat.ra_output },
-        { name: 'RV (右室)', imp: lat.rv_impedance, sens: lat.rv_sense, thr: lat.rv_threshold, out: lat.rv_output },
-        { name: 'LV (左室)', imp: lat.lv_impedance, sens: lat.lv_sense, thr: lat.lv_threshold, out: lat.lv_output }
-    ];
-
-    chambers.forEach(c => {
-        // Show row if any value exists and is not just '--'
-        const hasData = (c.imp && c.imp !== '--') || (c.sens && c.sens !== '--') || (c.thr && c.thr !== '--') || (c.out && c.out !== '--');
-        if (hasData) {
-            const tr = document.createElement('tr');
-            tr.innerHTML = `
-                <td>${c.name}</td>
-                <td>${c.imp || '--'}</td>
-                <td>${c.sens || '--'}</td>
-                <td>${c.thr || '--'}</td>
-                <td>${c.out || '--'}</td>
-            `;
-            tbody.appendChild(tr);
-        }
+    lat.leads.forEach(c => {
+        const tr = document.createElement('tr');
+        tr.innerHTML = `
+            <td>${c.name}</td>
+            <td>${c.imp}</td>
+            <td>${c.sens}</td>
+            <td>${c.thr}</td>
+            <td>${c.out}</td>
+        `;
+        tbody.appendChild(tr);
     });
 
     // Records Timeline (Detailed)
@@ -357,6 +302,14 @@ function renderPatient(patient) {
         // Unique ID for accordion
         const collapseId = `rec-${index}`;
 
+        const sections = rec.sections.map((rows, i) => `
+                <div class="json-section">
+                    <h4 class="section-title">${SECTION_TITLES[i]}</h4>
+                    <div class="kv-grid">
+                        ${renderKeyValue(rows)}
+                    </div>
+                </div>`).join('');
+
         div.innerHTML = `
             <div class="history-header" onclick="toggleHistory('${collapseId}')">
                 <div class="history-main-meta">
@@ -364,100 +317,29 @@ function renderPatient(patient) {
                     <span class="badge mode-badge">${rec.mode}</span>
                 </div>
                 <div class="history-sub-meta">
-                    <span>${rec.battery.voltage ? '电池: ' + rec.battery.voltage + 'V' : ''}</span>
+                    <span>${rec.battery}</span>
                     <span class="arrow-icon">▼</span>
                 </div>
             </div>
-            
+
             <div id="${collapseId}" class="history-body hidden">
-                <!-- 严格按照JSON结构展示 -->
-                
-                <!-- 1. header - 患者/设备信息 -->
-                <div class="json-section">
-                    <h4 class="section-title">📋 患者/设备信息</h4>
-                    <div class="kv-grid">
-                        ${renderKeyValue(rec.header_raw)}
-                    </div>
-                </div>
-                
-                <!-- 2. basic_params.settings - 起搏参数 -->
-                <div class="json-section">
-                    <h4 class="section-title">⚙️ 起搏参数</h4>
-                    <div class="kv-grid">
-                        ${renderKeyValue(rec.settings_raw)}
-                    </div>
-                </div>
-                
-                <!-- 3. basic_params.measurements - 输出设置 -->
-                <div class="json-section">
-                    <h4 class="section-title">📊 输出设置</h4>
-                    <div class="kv-grid">
-                        ${renderKeyValue(rec.measurement_raw)}
-                    </div>
-                </div>
-                
-                <!-- 4. test_params.battery_and_leads - 电池与导线 -->
-                <div class="json-section">
-                    <h4 class="section-title">🔋 电池信息</h4>
-                    <div class="kv-grid">
-                        ${renderKeyValue(rec.battery_raw)}
-                    </div>
-                </div>
-                
-                <!-- 5. test_params.threshold_tests - 阈值测试 -->
-                <div class="json-section">
-                    <h4 class="section-title">🔌 阈值测试</h4>
-                    <div class="kv-grid">
-                        ${renderKeyValue(rec.thresholds_raw)}
-                    </div>
-                </div>
-                
-                <!-- 6. events_and_footer - 事件与结论 -->
-                <div class="json-section">
-                    <h4 class="section-title">⚠️ 事件与结论</h4>
-                    <div class="kv-grid">
-                        ${renderKeyValue(rec.events_raw)}
-                    </div>
-                </div>
-                
-                <!-- 7. footer_meta - 签名信息 -->
-                <div class="json-section">
-                    <h4 class="section-title">📝 签名信息</h4>
-                    <div class="kv-grid">
-                        ${renderKeyValue(rec.footer_meta_raw || {})}
-                    </div>
-                </div>
+                ${sections}
             </div>
         `;
         timeline.appendChild(div);
     });
 }
 
-// Helper to render key-value pairs
-function renderKeyValue(obj) {
-    if (!obj || Object.keys(obj).length === 0) return '<span class="text-muted text-sm">No data</span>';
-
-    return Object.entries(obj).map(([k, v]) => {
-        if (v === null || v === undefined || v === '' || v === '/') return '';
-
-        let displayVal = v;
+// Helper to render [label, value] rows (labels cleaned and dates formatted at build time)
+function renderKeyValue(rows) {
+    if (!rows || rows.length === 0) return '<span class="text-muted text-sm">No data</span>';
 
-        // Format date fields
-        if (k.includes('日期') || k.includes('时间')) {
-            displayVal = formatDate(v);
-        } else if (typeof v === 'object') {
-            displayVal = `<pre style="margin:0; font-size:0.75rem">${JSON.stringify(v, null, 2)}</pre>`;
-        }
-
-        // Clean up keys for display
-        const label = k.replace(/（.*?）/g, '').replace(/_/g, ' ');
-        return `
+    return rows.map(([label, value]) => `
             <div class="kv-row">
                 <span class="kv-key">${label}</span>
-                <span class="kv-val">${displayVal}</span>
+                <span class="kv-val">${value}</span>
             </div>
-        `;
-    }).join('');
+        `).join('');
 }
 
 // Global toggle function
@@ -488,13 +370,17 @@ function setupEventListeners() {
         });
     });
 
-    // Search
-    elSearch.addEventListener('input', (e) => {
-        const term = e.target.value.toLowerCase().trim();
-        const filtered = allPatients.filter(p =>
-            (p.name && p.name.toLowerCase().includes(term)) ||
-            (p.id && String(p.id).toLowerCase().includes(term))
-        );
-        renderList(filtered);
-    });
+    // Search + screening filter
+    elSearch.addEventListener('input', applyFilters);
+    elFilter.addEventListener('change', applyFilters);
+}
+
+function applyFilters() {
+    const rows = window.searchPatients ? window.searchPatients(elSearch.value) : null;
+    const rule = elFilter.value;
+    let filtered = rows ? rows.map(i => allPatients[i]) : allPatients;
+    if (rule) {
+        filtered = filtered.filter(p => (screeningFlags[p.id] || []).some(f => f.rule === rule));
+    }
+    renderList(filtered);
 }
@@ -32,24 +32,45 @@ function initCharts() {
         options: getChartOptions('导线阻抗 (Ω)')
     });
 }
-// ...
-// Update Threshold Chart
-thresholdChartInstance.data.labels = labels;
-thresholdChartInstance.data.datasets = [
-    createDataset('RA (右房) 阈值', raThr, '#f59e0b'),
-    createDataset('RV (右室) 阈值', rvThr, '#06b6d4'),
-    createDataset('LV (左室) 阈值', lvThr, '#14b8a6')
-].filter(ds => ds.data.some(v => v !== null)); // Remove empty datasets
-thresholdChartInstance.update();
+function getChartOptions(title) {
+    return {
+        responsive: true,
+        maintainAspectRatio: false,
+        spanGaps: true, // Visits without a measurement leave gaps; connect across them
+        interaction: { mode: 'index', intersect: false },
+        plugins: {
+            legend: { labels: { color: chartConfig.color.text } },
+            title: { display: true, text: title, color: chartConfig.color.text }
+        },
+        scales: {
+            x: { grid: { color: chartConfig.color.grid }, ticks: { color: chartConfig.color.text } },
+            y: { grid: { color: chartConfig.color.grid }, ticks: { color: chartConfig.color.text } }
+        }
+    };
+}
+
+const CHAMBER_SERIES = [
+    { key: 'RA', name: 'RA (右房)', color: '#f59e0b' },
+    { key: 'RV', name: 'RV (右室)', color: '#06b6d4' },
+    { key: 'LV', name: 'LV (左室)', color: '#14b8a6' }
+];
+
+// series: { labels, timestamps, threshold: { RA, RV, LV }, impedance: { ... } }, oldest first,
+// precomputed by scripts/generate_data.py; chambers without any value are absent
+function updateCharts(series) {
+    const datasets = (values, suffix) => CHAMBER_SERIES
+        .filter(c => values[c.key])
+        .map(c => createDataset(`${c.name} ${suffix}`, values[c.key], c.color));
+
+    // Update Threshold Chart
+    thresholdChartInstance.data.labels = series.labels;
+    thresholdChartInstance.data.datasets = datasets(series.threshold, '阈值');
+    thresholdChartInstance.update();
 
-// Update Impedance Chart
-impedanceChartInstance.data.labels = labels;
-impedanceChartInstance.data.datasets = [
-    createDataset('RA (右房) 阻抗', raImp, '#f59e0b'),
-    createDataset('RV (右室) 阻抗', rvImp, '#06b6d4'),
-    createDataset('LV (左室) 阻抗', lvImp, '#14b8a6')
-].filter(ds => ds.data.some(v => v !== null));
-impedanceChartInstance.update();
+    // Update Impedance Chart
+    impedanceChartInstance.data.labels = series.labels;
+    impedanceChartInstance.data.datasets = datasets(series.impedance, '阻抗');
+    impedanceChartInstance.update();
 }
 
 function createDataset(label, data, color) {
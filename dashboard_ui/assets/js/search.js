@@ -0,0 +1,85 @@
+/**
+ * search.js - Patient search over the prebuilt index (data/search.js, built by scripts/generate_data.py)
+ */
+
+// { keys: [lowercase key per index row], postings: { bigram: [delta-encoded rows] }, pinyin }
+let searchIndex = null;
+// Postings decoded so far: bigram -> Int32Array of ascending row positions
+const decodedPostings = {};
+
+function initSearch(patients) {
+    const data = window.PACEMAKER_SEARCH;
+    if (data && data.keys.length === patients.length) {
+        searchIndex = data;
+    } else {
+        // search.js missing or from another run than index.js: substring scan over the same fields
+        searchIndex = {
+            keys: patients.map(p => [p.name, p.id, p.brand, p.model]
+                .filter(Boolean).map(f => String(f).toLowerCase().trim()).join('\n')),
+            postings: null
+        };
+    }
+    return searchIndex.pinyin === true;
+}
+
+function postingList(gram) {
+    if (!decodedPostings[gram]) {
+        const deltas = searchIndex.postings[gram];
+        if (!deltas) return null;
+        const rows = new Int32Array(deltas.length);
+        let row = 0;
+        for (let i = 0; i < deltas.length; i++) {
+            row += deltas[i];
+            rows[i] = row;
+        }
+        decodedPostings[gram] = rows;
+    }
+    return decodedPostings[gram];
+}
+
+function intersect(a, b) {
+    const out = [];
+    let i = 0, j = 0;
+    while (i < a.length && j < b.length) {
+        if (a[i] === b[j]) { out.push(a[i]); i++; j++; }
+        else if (a[i] < b[j]) i++;
+        else j++;
+    }
+    return out;
+}
+
+// Rows whose key contains every bigram of the term; null means "no narrowing possible"
+function candidateRows(term) {
+    if (!searchIndex.postings || term.length < 2) return null;
+
+    const lists = [];
+    for (let i = 0; i < term.length - 1; i++) {
+        const list = postingList(term.slice(i, i + 2));
+        if (!list) return [];
+        lists.push(list);
+    }
+    lists.sort((a, b) => a.length - b.length);
+    return lists.slice(1).reduce((rows, list) => rows.length ? intersect(rows, list) : rows, Array.from(lists[0]));
+}
+
+// Index row positions matching the term (ascending), or null for an empty term
+function searchPatients(term) {
+    term = term.toLowerCase().trim();
+    if (!term || !searchIndex) return null;
+
+    const keys = searchIndex.keys;
+    const candidates = candidateRows(term);
+    if (candidates === null) {
+        const rows = [];
+        for (let i = 0; i < keys.length; i++) {
+            if (keys[i].includes(term)) rows.push(i);
+        }
+        return rows;
+    }
+    // Bigrams may come from different places in the key; confirm the whole term
+    return candidates.filter(i => keys[i].includes(term));
+}
+
+// Expose to window
+window.initSearch = initSearch;
+window.searchPatients = searchPatients;
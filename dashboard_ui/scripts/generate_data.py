@@ -1,79 +1,571 @@
 
 import os
-import json
+import re
+import sys
 import glob
+import zlib
+import hashlib
+import argparse
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+try:
+    from pypinyin import lazy_pinyin, Style  # Optional: pinyin initials for Chinese names in search
+except ImportError:
+    lazy_pinyin = None
+
 # Paths
 # .../dashboard_ui/scripts/generate_data.py -> .../Pacemarker_Dashboard
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+# JSON goes through the backend serializer (orjson when installed, per config.JSON_BACKEND)
+sys.path.insert(0, str(BASE_DIR / 'backend'))
+from core.serialization import dumps_json, loads_json
 PATIENT_RECORDS_DIR = BASE_DIR / 'patient_records'
 OUTPUT_DIR = BASE_DIR / 'dashboard_ui' / 'data'
-OUTPUT_FILE = OUTPUT_DIR / 'data_bundle.js'
+INDEX_FILE = OUTPUT_DIR / 'index.js'
+SEARCH_FILE = OUTPUT_DIR / 'search.js'
+CHUNKS_DIR = OUTPUT_DIR / 'records'
+LEGACY_BUNDLE_FILE = OUTPUT_DIR / 'data_bundle.js'
+
+# Cohort analytics written by `backend/main.py --screen / --forecast`: source -> (script, global name)
+ANALYTICS_DIR = PATIENT_RECORDS_DIR / 'analytics'
+ANALYTICS_EXPORTS = [
+    (ANALYTICS_DIR / 'screening.json', OUTPUT_DIR / 'screening.js', 'PACEMAKER_SCREENING'),
+    (ANALYTICS_DIR / 'battery_forecast.json', OUTPUT_DIR / 'forecast.js', 'PACEMAKER_FORECAST'),
+]
+
+# Sidecar manifest: file name -> size/mtime/content hash -> index row, used to skip unchanged patients
+MANIFEST_FILE = OUTPUT_DIR / '.bundle_manifest.json'
+# Bumped when the chunk record format changes, so old chunks are rebuilt (2: per-patient view models)
+MANIFEST_VERSION = 2
+
+# Records are split into hash buckets so the page only parses the index up front.
+# The bucket of a patient depends only on its file name, so it never moves between runs.
+DEFAULT_CHUNK_COUNT = 256
+
+CHUNK_PREFIX = 'window.PACEMAKER_LOAD_CHUNK('
+
+
+def chunk_of(file_name, chunk_count):
+    return zlib.crc32(file_name.encode('utf-8')) % chunk_count
+
+
+def chunk_name(chunk_id):
+    return f"chunk_{chunk_id:03d}.js"
+
+
+def build_index_row(file_name, data, chunk_count):
+    registration_id = data.get('登记号', 'Unknown')
+    name = data.get('姓名', 'Unknown')
+    record_count = data.get('程控次数', 0)
+
+    latest_record = {}
+    if data.get('程控记录'):
+        latest_record = data['程控记录'][-1]
+
+    header = latest_record.get('header', {})
+    return {
+        'id': str(registration_id), # Ensure string
+        'name': name,
+        'count': record_count,
+        'brand': header.get('品牌', 'Unknown'),
+        'model': header.get('型号', 'Unknown'),
+        'implant_date': header.get('植入日期', ''),
+        'file_name': file_name,
+        'chunk': chunk_of(file_name, chunk_count)
+    }
+
+
+# --- Search index ---
+# One lowercase key string per index row (name, id, brand, model, pinyin initials, newline-separated)
+# plus bigram postings: gram -> delta-encoded row positions. The page intersects the postings of the
+# query's bigrams and confirms candidates with a substring check on their key, instead of scanning
+# every patient on each keystroke.
+
+SEARCH_SEPARATOR = '\n'  # Cannot be typed into the search box, so matches never span two fields
+
+
+def name_initials(name):
+    if lazy_pinyin is None or not name:
+        return ''
+    return ''.join(lazy_pinyin(name, style=Style.FIRST_LETTER))
+
+
+def search_fields(row):
+    fields = [row['name'], row['id'], row['brand'], row['model'], name_initials(row['name'])]
+    return [str(f).lower().strip() for f in fields if f]
+
+
+def build_search_index(index_rows):
+    keys = []
+    postings = {}
+    for position, row in enumerate(index_rows):
+        fields = search_fields(row)
+        keys.append(SEARCH_SEPARATOR.join(fields))
+        for field in fields:
+            for i in range(len(field) - 1):
+                positions = postings.setdefault(field[i:i + 2], [])
+                if not positions or positions[-1] != position:
+                    positions.append(position)
+
+    # Positions are ascending, so gaps keep the common grams (digits, brands) small
+    encoded = {}
+    for gram, positions in postings.items():
+        encoded[gram] = [positions[0]] + [b - a for a, b in zip(positions, positions[1:])]
+    return {'keys': keys, 'postings': encoded, 'pinyin': lazy_pinyin is not None}
+
+
+# --- View models ---
+# Chunks carry one ready-to-render view model per patient, so selecting a patient in the page
+# needs no parsing: dates are formatted, history is sorted newest first, the overview card
+# strings are built and the chart series are laid out here, once per changed patient.
+
+CHAMBERS = [('RA', '心房', 'RA (右房)'), ('RV', '右心室', 'RV (右室)'), ('LV', '左心室', 'LV (左室)')]
+
+_EXCEL_SERIAL = re.compile(r'^\d{5}$')
+_YMD = re.compile(r'^(\d{4})[-/](\d{1,2})[-/](\d{1,2})(?:[ T].*)?$')
+_LEADING_NUMBER = re.compile(r'^\s*[-+]?(?:\d+\.?\d*|\.\d+)')
+_LABEL_UNIT = re.compile(r'（.*?）')
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def parse_date_text(value):
+    """Excel serial or Y-M-D style date (年/月/日, dots, slashes) -> datetime, else None"""
+    text = str(value).strip()
+    if _EXCEL_SERIAL.match(text):
+        return datetime(1899, 12, 30, tzinfo=timezone.utc) + timedelta(days=int(text))
+    text = text.replace('.', '-').replace('年', '-').replace('月', '-').replace('日', '').replace('号', '')
+    match = _YMD.match(text)
+    if match:
+        try:
+            return datetime(*map(int, match.groups()), tzinfo=timezone.utc)
+        except ValueError:
+            return None
+    return None
+
+
+def format_date(value):
+    date = parse_date_text(value)
+    return date.strftime('%Y-%m-%d') if date else value
+
+
+def to_float(value):
+    """parseFloat semantics: leading number of the string, else None"""
+    if value is None or value == '':
+        return None
+    match = _LEADING_NUMBER.match(str(value))
+    return float(match.group(0)) if match else None
+
+
+def js_number(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def numeric(record, section, values, label):
+    """Value normalized by the backend ETL if present, else parsed from the raw string"""
+    entry = record.get('normalized', {}).get(section, {}).get(label)
+    if entry and isinstance(entry.get('value'), (int, float)):
+        return entry['value']
+    return to_float(values.get(label))
+
+
+def first_of(values, *labels):
+    for label in labels:
+        if values.get(label):
+            return values[label]
+    return None
+
+
+def find_prefix(values, *prefixes):
+    for label, value in values.items():
+        if value and label.startswith(prefixes):
+            return value
+    return None
+
+
+def display_rows(values):
+    """[label, display value] pairs for the record detail view (empty and '/' values dropped)"""
+    rows = []
+    for key, value in (values or {}).items():
+        if value is None or value == '' or value == '/':
+            continue
+        if '日期' in key or '时间' in key:
+            value = format_date(value)
+        elif isinstance(value, (dict, list)):
+            value = dumps_json(value, pretty=True).decode('utf-8')
+        rows.append([_LABEL_UNIT.sub('', key).replace('_', ' '), value])
+    return rows
 
-def generate_bundle():
-    print(f"Base Dir: {BASE_DIR}")
-    if not OUTPUT_DIR.exists():
-        OUTPUT_DIR.mkdir(parents=True)
 
-    patient_files = glob.glob(str(PATIENT_RECORDS_DIR / '*.json'))
-    
-    index_data = []
-    records_map = {}
+def build_visit(record):
+    header = record.get('header', {})
+    basic = record.get('basic_params', {})
+    settings = basic.get('settings', {})
+    meas = basic.get('measurements', {})
+    test = record.get('test_params', {})
+    thresh = test.get('threshold_tests', {})
+    batt = test.get('battery_and_leads', {})
+    events = record.get('events_and_footer', {})
+    footer_meta = record.get('footer_meta', {})
 
-    print(f"Scanning {len(patient_files)} files in {PATIENT_RECORDS_DIR}...")
+    raw_date = footer_meta.get('程控日期') or record.get('meta', {}).get('程控日期')
+    normalized_date = record.get('normalized', {}).get('footer_meta', {}).get('程控日期')
+    date = None
+    if normalized_date:
+        date = datetime.fromisoformat(normalized_date['value']).replace(tzinfo=timezone.utc)
+    elif raw_date:
+        date = parse_date_text(raw_date)
 
-    for file_path in patient_files:
+    voltage_label = next((k for k in batt if k.startswith('电池电压')), '电池电压（V）')
+    voltage = numeric(record, 'battery_and_leads', batt, voltage_label)
+
+    leads = []
+    threshold = {}
+    impedance = {}
+    for code, chamber, name in CHAMBERS:
+        volts = meas.get(f'{chamber}_输出电压')
+        lead = {
+            'name': name,
+            'imp': thresh.get(f'{chamber}_阻抗') or '--',
+            'sens': thresh.get(f'{chamber}_感知') or '--',
+            'thr': thresh.get(f'{chamber}_阈值') or '--',
+            'out': f"{volts}V/{meas.get(f'{chamber}_输出脉宽') or '?'}ms" if volts else '--',
+        }
+        if any(lead[k] != '--' for k in ('imp', 'sens', 'thr', 'out')):
+            leads.append(lead)
+        threshold[code] = numeric(record, 'threshold_tests', thresh, f'{chamber}_阈值')
+        impedance[code] = numeric(record, 'threshold_tests', thresh, f'{chamber}_阻抗')
+
+    return {
+        'dateStr': date.strftime('%Y-%m-%d') if date else (raw_date or 'Unknown'),
+        'timestamp': int((date - _EPOCH).total_seconds() * 1000) if date else 0,
+        'implantDateStr': format_date(header['植入日期']) if header.get('植入日期') else '--',
+        'brand': header.get('品牌'),
+        'model': header.get('型号'),
+        'mode': settings.get('模式') or '--',
+        'lowerRate': settings.get('低限频率（次/分）') or '--',
+        'upperRate': settings.get('上限跟踪频率（次/分）') or '--',
+        'voltage': voltage,
+        'life': find_prefix(batt, '电池预估寿命', '预估寿命'),
+        'events': events,
+        'leads': leads,
+        'threshold': threshold,
+        'impedance': impedance,
+        'sections': [display_rows(v) for v in (header, settings, meas, batt, thresh, events, footer_meta)],
+    }
+
+
+def event_summary(events):
+    """Overview card strings for mode switches, AT/AF, VT and other events"""
+    ams_count = first_of(events, '模式转换次数', '房室传导模式转换（%）', '运动模式转换（%）')
+    ams = '无'
+    if ams_count:
+        ams = ams_count
+        if events.get('持续最长时间'):
+            ams += f" (最长 {events['持续最长时间']})"
+
+    ataf_load = first_of(events, 'AT/AF负荷%', 'AT/AF负荷')
+    ataf_count = events.get('AT/AF事件次数')
+    ataf_desc = first_of(events, '快心房率事件说明', 'AT/AF事件说明')
+    ataf = '无'
+    if ataf_load:
+        ataf = f'{ataf_load}%'
+    elif ataf_count:
+        ataf = f'{ataf_count} 次'
+    if ataf != '无' and ataf_desc:
+        ataf += f' - {ataf_desc}'
+
+    vt_count = first_of(events, '快心室率次数', '快心室率事件次数')
+    vt_desc = first_of(events, '快心室率事件说明', '快心室率说明')
+    vt = '无'
+    if vt_count:
+        vt = f'{vt_count} 次' + (f' - {vt_desc}' if vt_desc else '')
+    elif vt_desc:
+        vt = vt_desc
+
+    return {
+        'ams': ams,
+        'ataf': ataf,
+        'vt': vt,
+        'other': first_of(events, '其余事件', '其他事件') or '无',
+        'conclusion': events.get('结论') or '无记录',
+        'nextVisit': events.get('建议下次程控时间') or '未指定',
+    }
+
+
+def build_view_model(data):
+    """Patient JSON -> everything the detail page renders"""
+    visits = [build_visit(r) for r in data.get('程控记录', [])]
+    visits.sort(key=lambda v: -v['timestamp'])  # Newest first; stable for equal dates
+    latest = visits[0] if visits else None
+
+    overview = None
+    if latest:
+        voltage = latest['voltage']
+        level = 'ok'
+        if voltage and voltage < 2.6:
+            level = 'low'
+        elif voltage and voltage < 2.8:
+            level = 'warn'
+        overview = {
+            'voltage': f'{voltage:.2f}' if voltage is not None else '--',
+            'batteryLevel': level,
+            'life': latest['life'],
+            'mode': latest['mode'],
+            'lowerRate': latest['lowerRate'],
+            'upperRate': latest['upperRate'],
+            'leads': latest['leads'],
+            **event_summary(latest['events']),
+        }
+
+    # Chart series run oldest to newest; chambers without any value are left out
+    chronological = visits[::-1]
+    series = {'labels': [v['dateStr'] for v in chronological], 'timestamps': [v['timestamp'] for v in chronological]}
+    for kind in ('threshold', 'impedance'):
+        series[kind] = {}
+        for code, _, _ in CHAMBERS:
+            values = [v[kind][code] for v in chronological]
+            if any(x is not None for x in values):
+                series[kind][code] = values
+
+    return {
+        'id': data.get('登记号'),
+        'name': data.get('姓名'),
+        'brand': latest['brand'] if latest else 'Unknown',
+        'model': latest['model'] if latest else 'Unknown',
+        'implantDate': latest['implantDateStr'] if latest else '--',
+        'overview': overview,
+        'history': [
+            {
+                'dateStr': v['dateStr'],
+                'mode': v['mode'],
+                'battery': f"电池: {js_number(v['voltage'])}V" if v['voltage'] else '',
+                'sections': v['sections'],
+            }
+            for v in visits
+        ],
+        'series': series,
+    }
+
+
+def write_js(path, content):
+    # Write next to the target and rename, so the page never sees a half-written script
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(chunk_count, pretty=False):
+    """Previous run's manifest, or an empty one if missing or built with other settings"""
+    empty = {'version': MANIFEST_VERSION, 'chunk_count': chunk_count, 'pretty': pretty, 'files': {}}
+    if not MANIFEST_FILE.exists():
+        return empty
+    try:
+        with open(MANIFEST_FILE, 'rb') as f:
+            manifest = loads_json(f.read())
+    except (OSError, ValueError):
+        return empty
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('chunk_count') != chunk_count:
+        return empty
+    if manifest.get('pretty', False) != pretty:
+        return empty
+    return manifest
+
+
+def read_chunk(chunk_id):
+    """Records currently stored in a chunk file ({} if missing or unreadable)"""
+    path = CHUNKS_DIR / chunk_name(chunk_id)
+    try:
+        text = path.read_text(encoding='utf-8')
+        payload = text[len(CHUNK_PREFIX):].split(', ', 1)[1].rsplit(');', 1)[0]
+        return loads_json(payload)
+    except (OSError, ValueError, IndexError):
+        return {}
+
+
+def scan_patient_files(old_files, chunk_count):
+    """
+    Compare patient_records with the manifest.
+    Files whose size and mtime are unchanged are not opened; changed ones are re-read only
+    if their content hash differs. Returns (files, changed records, dirty chunk ids).
+    """
+    files = {}
+    changed = {}
+    dirty = set()
+
+    for file_path in glob.glob(str(PATIENT_RECORDS_DIR / '*.json')):
+        file_name = os.path.basename(file_path)
+        if file_name.startswith('.'):
+            continue  # Temporary files of an in-progress write
         try:
-            filename = os.path.basename(file_path)
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-                # Store full record
-                records_map[filename] = data
-                
-                # Extract Index Info
-                registration_id = data.get('登记号', 'Unknown')
-                name = data.get('姓名', 'Unknown')
-                record_count = data.get('程控次数', 0)
-                
-                latest_record = {}
-                if data.get('程控记录'):
-                    latest_record = data['程控记录'][-1]
-                
-                header = latest_record.get('header', {})
-                brand = header.get('品牌', 'Unknown')
-                model = header.get('型号', 'Unknown')
-                implant_date = header.get('植入日期', '')
-                
-                index_data.append({
-                    'id': str(registration_id), # Ensure string
-                    'name': name,
-                    'count': record_count,
-                    'brand': brand,
-                    'model': model,
-                    'implant_date': implant_date,
-                    'file_name': filename
-                })
+            st = os.stat(file_path)
+            old = old_files.get(file_name)
+            if old and old['size'] == st.st_size and old['mtime'] == st.st_mtime_ns:
+                files[file_name] = old
+                continue
+
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+            digest = hashlib.md5(raw).hexdigest()
+            entry = {'size': st.st_size, 'mtime': st.st_mtime_ns, 'hash': digest, 'row': None}
+            if old and old['hash'] == digest:
+                entry['row'] = old['row']
+                files[file_name] = entry
+                continue
+
+            data = loads_json(raw)
+            # processed_files.json and other bookkeeping files live in the same folder
+            if isinstance(data, dict) and '程控记录' in data:
+                entry['row'] = build_index_row(file_name, data, chunk_count)
+                changed[file_name] = data
+                dirty.add(entry['row']['chunk'])
+            if old and old['row']:
+                dirty.add(old['row']['chunk'])
+            files[file_name] = entry
         except Exception as e:
             print(f"Error reading {file_path}: {e}")
 
+    # Deleted patients
+    for file_name, old in old_files.items():
+        if file_name not in files and old['row']:
+            dirty.add(old['row']['chunk'])
+
+    return files, changed, dirty
+
+
+def rebuild_chunk(chunk_id, members, changed, pretty=False):
+    """
+    Rewrite one chunk: view models of changed patients are built from this run's data,
+    unchanged ones are reused from the old chunk file
+    """
+    existing = None
+    records = {}
+    for file_name in sorted(members):
+        if file_name in changed:
+            records[file_name] = build_view_model(changed[file_name])
+            continue
+        if existing is None:
+            existing = read_chunk(chunk_id)
+        if file_name in existing:
+            records[file_name] = existing[file_name]
+        else:
+            with open(PATIENT_RECORDS_DIR / file_name, 'rb') as f:
+                records[file_name] = build_view_model(loads_json(f.read()))
+
+    path = CHUNKS_DIR / chunk_name(chunk_id)
+    if not records:
+        if path.exists():
+            path.unlink()
+        return
+    payload = dumps_json(records, pretty).decode('utf-8')
+    write_js(path, f"{CHUNK_PREFIX}{chunk_id}, {payload});")
+
+
+def write_analytics():
+    """
+    Copy backend analytics results into scripts the page can load.
+    index.html always includes them, so without results (--screen / --forecast not run) a stub
+    setting the global to null is written instead of leaving a missing script.
+    """
+    for source, target, name in ANALYTICS_EXPORTS:
+        if not source.exists():
+            write_js(target, f"window.{name} = null;")
+            continue
+        with open(source, 'rb') as f:
+            data = loads_json(f.read())
+        write_js(target, f"window.{name} = {dumps_json(data).decode('utf-8')};")
+        print(f"Analytics: {source.name} -> {target}")
+
+
+def generate_bundle(chunk_count=DEFAULT_CHUNK_COUNT, full=False, pretty=False):
+    """
+    Refresh the dashboard data scripts from patient_records.
+    Data is written as compact JSON; pretty indents the index and record chunks for reading by hand
+    (switching it rebuilds every chunk).
+    """
+    print(f"Base Dir: {BASE_DIR}")
+    CHUNKS_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Analytics are small and do not go through the manifest, so they are refreshed on every run
+    write_analytics()
+
+    manifest = {'version': MANIFEST_VERSION, 'chunk_count': chunk_count, 'pretty': pretty, 'files': {}}
+    if not full:
+        manifest = load_manifest(chunk_count, pretty)
+    old_files = manifest['files']
+    if not old_files:
+        full = True
+
+    print(f"Scanning {PATIENT_RECORDS_DIR}...")
+    files, changed, dirty = scan_patient_files(old_files, chunk_count)
+
+    members = {}
+    for file_name, entry in files.items():
+        if entry['row']:
+            members.setdefault(entry['row']['chunk'], []).append(file_name)
+
+    if full:
+        # Without a usable manifest every chunk is rebuilt
+        dirty = set(members)
+    else:
+        # Chunks that should exist but are missing on disk (e.g. deleted by hand)
+        dirty |= {c for c in members if not (CHUNKS_DIR / chunk_name(c)).exists()}
+
+    if not dirty and INDEX_FILE.exists() and SEARCH_FILE.exists():
+        # Bookkeeping files (processed_files.json) stay in the manifest without an index row but are not counted
+        patients = sum(1 for entry in files.values() if entry['row'])
+        print(f"No changes: {patients} patient files checked, dashboard data is up to date.")
+        manifest['files'] = files
+        write_js(MANIFEST_FILE, dumps_json(manifest).decode('utf-8'))
+        return
+
+    # Record chunks: each script hands its records to window.PACEMAKER_LOAD_CHUNK (works over file://)
+    for chunk_id in sorted(dirty):
+        rebuild_chunk(chunk_id, members.get(chunk_id, []), changed, pretty)
+
+    if full:
+        # Anything else in the folder is left over from an earlier run (deleted patients, other chunk count)
+        expected = {chunk_name(c) for c in members}
+        for stale in CHUNKS_DIR.glob('chunk_*.js'):
+            if stale.name not in expected:
+                stale.unlink()
+
     # Sort Index
+    index_data = [entry['row'] for entry in files.values() if entry['row']]
     index_data.sort(key=lambda x: x['id'])
 
-    # Create JS Bundle Content
-    # We assign to a global variable window.PACEMAKER_DATA
-    bundle_content = {
+    # Search positions refer to index rows, so both are rewritten together
+    search_index = build_search_index(index_data)
+    write_js(SEARCH_FILE, f"window.PACEMAKER_SEARCH = {dumps_json(search_index).decode('utf-8')};")
+    if lazy_pinyin is None:
+        print("Note: pypinyin is not installed, search by name initials is disabled (pip install pypinyin)")
+
+    # The index is written last so it never points at chunks that do not exist yet
+    index_content = {
         "index": index_data,
-        "records": records_map
+        "chunk_dir": "data/records"
     }
-    
-    js_content = f"window.PACEMAKER_DATA = {json.dumps(bundle_content, ensure_ascii=False)};"
+    write_js(INDEX_FILE, f"window.PACEMAKER_DATA = {dumps_json(index_content, pretty).decode('utf-8')};")
+
+    manifest['files'] = files
+    write_js(MANIFEST_FILE, dumps_json(manifest).decode('utf-8'))
+
+    if LEGACY_BUNDLE_FILE.exists():
+        LEGACY_BUNDLE_FILE.unlink()
 
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        f.write(js_content)
+    print(f"Successfully generated index with {len(index_data)} patients at: {INDEX_FILE}")
+    print(f"{len(changed)} patients changed, {len(dirty)} of {len(members)} chunks rewritten in: {CHUNKS_DIR}")
 
-    print(f"Successfully generated data bundle with {len(index_data)} patients at: {OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    generate_bundle()
+    parser = argparse.ArgumentParser(description='Generate dashboard data (index + record chunks)')
+    parser.add_argument('--chunks', type=int, default=DEFAULT_CHUNK_COUNT,
+                        help='number of record chunks (default %(default)s)')
+    parser.add_argument('--full', action='store_true',
+                        help='ignore the manifest and rebuild every chunk')
+    parser.add_argument('--pretty', action='store_true',
+                        help='indent the index and record chunks (larger, for reading by hand)')
+    args = parser.parse_args()
+    generate_bundle(chunk_count=max(1, args.chunks), full=args.full, pretty=args.pretty)